@@ -0,0 +1,143 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Loading schemas and configurations without blocking the caller.
+
+The functions in this module correspond to those of the same names in
+the ZConfig package, but return a Load object immediately.  The load
+runs in a thread of its own; included resources and imported
+components are fetched concurrently by a pool of `prefetch` threads.
+
+The result is retrieved with Load.result(), which can be given a
+timeout.  A load that times out or is cancelled raises
+ZConfig.ConfigurationError; loads are stopped when they next open a
+resource.  Callbacks registered with Load.addCallback() are called
+when the load finishes, which allows event-driven applications to be
+notified without waiting.
+"""
+
+import sys
+import threading
+
+import ZConfig
+import ZConfig.loader
+
+
+def loadSchema(url, prefetch=4):
+    loader = ZConfig.loader.SchemaLoader(prefetch=prefetch)
+    return Load(loader, loader.loadURL, url)
+
+def loadSchemaFile(file, url=None, prefetch=4):
+    loader = ZConfig.loader.SchemaLoader(prefetch=prefetch)
+    return Load(loader, loader.loadFile, file, url)
+
+def loadConfig(schema, url, overrides=(), lazy=False, compact=False,
+               prefetch=4):
+    loader = _get_config_loader(schema, overrides, lazy, compact, prefetch)
+    return Load(loader, loader.loadURL, url)
+
+def loadConfigFile(schema, file, url=None, overrides=(), lazy=False,
+                   compact=False, prefetch=4):
+    loader = _get_config_loader(schema, overrides, lazy, compact, prefetch)
+    return Load(loader, loader.loadFile, file, url)
+
+
+def _get_config_loader(schema, overrides, lazy, compact, prefetch):
+    loader = ZConfig.loader._get_config_loader(
+        schema, overrides, lazy, compact)
+    loader.prefetch = prefetch
+    return loader
+
+
+class Load:
+    """A load running in a separate thread."""
+
+    def __init__(self, loader, method, *args):
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._callbacks = []
+        self._cancelled = False
+        self._result = None
+        self._exc_info = None
+        t = threading.Thread(target=self._run, args=(method, args),
+                             name="ZConfig load")
+        t.setDaemon(True)
+        t.start()
+
+    def done(self):
+        """Return true if the load has finished."""
+        return self._done.isSet()
+
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """Cancel the load, returning false if it has already finished."""
+        self._lock.acquire()
+        try:
+            if self._done.isSet():
+                return False
+            self._cancelled = True
+            self.loader.cancelled = True
+            return True
+        finally:
+            self._lock.release()
+
+    def result(self, timeout=None):
+        """Return the result of the load, waiting for it if needed.
+
+        Exceptions raised by the load are re-raised.  If `timeout` is
+        given and the load hasn't finished within that many seconds,
+        it is cancelled.
+        """
+        self._done.wait(timeout)
+        if not self._done.isSet() and self.cancel():
+            raise ZConfig.ConfigurationError(
+                "timed out after %s seconds" % timeout)
+        if self._cancelled:
+            raise ZConfig.ConfigurationError("loading cancelled")
+        if self._exc_info is not None:
+            t, v, tb = self._exc_info
+            raise t, v, tb
+        return self._result
+
+    def addCallback(self, callback):
+        """Call `callback` with this object when the load finishes.
+
+        If the load has already finished, `callback` is called
+        immediately; otherwise it's called from the loading thread.
+        """
+        self._lock.acquire()
+        try:
+            if not self._done.isSet():
+                self._callbacks.append(callback)
+                return
+        finally:
+            self._lock.release()
+        callback(self)
+
+    def _run(self, method, args):
+        try:
+            self._result = method(*args)
+        except:
+            self._exc_info = sys.exc_info()
+        self._lock.acquire()
+        try:
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        finally:
+            self._lock.release()
+        for callback in callbacks:
+            callback(self)
@@ -19,6 +19,55 @@ import ZConfig.url
 from ZConfig.substitution import isname, substitute
 
 
+# token kinds; see tokenize()
+KEY = "key"
+START = "start"
+END = "end"
+DIRECTIVE = "directive"
+MALFORMED = "malformed"
+EOF = "eof"
+
+
+def tokenize(text):
+    """Return a list of tokens for the lines of a configuration text.
+
+    Each token is a tuple (lineno, kind, text, value).  The tokens
+    depend only on the text; substitutions, directives and sections are
+    handled by ZConfigParser.replay(), so the same list can be replayed
+    in different contexts.
+    """
+    # Lines are split on "\n" only, just as file.readline() would.
+    lines = text.split("\n")
+    if not lines[-1]:
+        del lines[-1]
+    return list(itertokens(lines))
+
+
+def itertokens(lines):
+    """Generate the tokens for an iterable of lines, such as a file."""
+    match = _line_rx.match
+    lineno = 0
+    for line in lines:
+        lineno += 1
+        line = line.strip()
+        m = match(line)
+        if m is None:
+            yield lineno, MALFORMED, line, None
+            continue
+        key, value, start, end, directive = m.group(
+            "key", "value", "start", "end", "directive")
+        if key is not None:
+            yield lineno, KEY, key, value or ''
+        elif start is not None:
+            yield lineno, START, start, None
+        elif end is not None:
+            yield lineno, END, end, None
+        elif directive is not None:
+            yield lineno, DIRECTIVE, directive, None
+        # anything else is a blank line or comment
+    yield lineno, EOF, None, None
+
+
 class ZConfigParser:
     __metaclass__ = type
     __slots__ = ('resource', 'context', 'lineno',
@@ -35,44 +84,42 @@ class ZConfigParser:
             defines = {}
         self.defines = defines
 
-    def nextline(self):
-        line = self.file.readline()
-        if line:
-            self.lineno += 1
-            return False, line.strip()
-        else:
-            return True, None
-
     def parse(self, section):
-        done, line = self.nextline()
-        while not done:
-            if line[:1] in ("", "#"):
-                # blank line or comment
-                pass
-
-            elif line[:2] == "</":
-                # section end
-                if line[-1] != ">":
-                    self.error("malformed section end")
-                section = self.end_section(section, line[2:-1])
-
-            elif line[0] == "<":
-                # section start
-                if line[-1] != ">":
-                    self.error("malformed section start")
-                section = self.start_section(section, line[1:-1])
-
-            elif line[0] == "%":
-                self.handle_directive(section, line[1:])
-
-            else:
-                self.handle_key_value(section, line)
-
-            done, line = self.nextline()
+        self.replay(tokenize(self.file.read()), section)
+
+    def replay(self, tokens, section):
+        """Process tokens returned by tokenize() for `section`."""
+        url = self.url
+        for lineno, kind, text, value in tokens:
+            self.lineno = lineno
+            if kind == KEY:
+                if "$" in value:
+                    value = self.replace(value)
+                try:
+                    section.addValue(text, value, (lineno, None, url))
+                except ZConfig.ConfigurationError, e:
+                    self.error(e[0])
+            elif kind == START:
+                section = self.start_section(section, text)
+            elif kind == END:
+                section = self.end_section(section, text)
+            elif kind == DIRECTIVE:
+                self.handle_directive(section, text)
+            elif kind == MALFORMED:
+                self.malformed(text)
 
         if self.stack:
             self.error("unclosed sections not allowed")
 
+    def malformed(self, line):
+        # Report a line that doesn't match _line_rx.
+        if line[:2] == "</":
+            self.error("malformed section end")
+        elif line[:1] == "<":
+            self.error("malformed section start")
+        else:
+            self.error("malformed configuration data")
+
     def start_section(self, section, rest):
         isempty = rest[-1:] == "/"
         if isempty:
@@ -112,20 +159,6 @@ class ZConfigParser:
             self.error(e[0])
         return prevsection
 
-    def handle_key_value(self, section, rest):
-        m = _keyvalue_rx.match(rest)
-        if not m:
-            self.error("malformed configuration data")
-        key, value = m.group('key', 'value')
-        if not value:
-            value = ''
-        else:
-            value = self.replace(value)
-        try:
-            section.addValue(key, value, (self.lineno, None, self.url))
-        except ZConfig.ConfigurationError, e:
-            self.error(e[0])
-
     def handle_directive(self, section, rest):
         m = _keyvalue_rx.match(rest)
         if not m:
@@ -189,6 +222,16 @@ import re
 _name_re = r"[^\s()]+"
 _keyvalue_rx = re.compile(r"(?P<key>%s)\s*(?P<value>[^\s].*)?$"
                           % _name_re)
+# Each stripped line is classified by a single match: key/value pairs,
+# section starts and ends, directives, and blank lines or comments.
+# Lines which don't match are malformed.
+_line_rx = re.compile(r"(?:(?P<key>[^\s()<%#][^\s()]*)"
+                      r"\s*(?P<value>[^\s].*)?"
+                      r"|</(?P<end>.*)>"
+                      r"|<(?P<start>.*)>"
+                      r"|%(?P<directive>.*)"
+                      r"|(?:#.*)?"
+                      r")$")
 _section_start_rx = re.compile(r"(?P<type>%s)"
                                r"(?:\s+(?P<name>%s))?"
                                r"$"
@@ -27,8 +27,10 @@ import ZConfig.matcher
 
 
 class ExtendedConfigLoader(ZConfig.loader.ConfigLoader):
-    def __init__(self, schema):
-        ZConfig.loader.ConfigLoader.__init__(self, schema)
+    def __init__(self, schema, lazy=False, compact=False, parse_cache=None,
+                 prefetch=0):
+        ZConfig.loader.ConfigLoader.__init__(self, schema, lazy, compact,
+                                             parse_cache, prefetch)
         self.clopts = []   # [(optpath, value, source-position), ...]
 
     def addOption(self, spec, pos=None):
@@ -159,8 +161,10 @@ class MatcherMixin:
         sm = ZConfig.matcher.BaseMatcher.createChildMatcher(self, type, name)
         bag = self.optionbag.get_section_info(type.name, name)
         if bag is not None:
+            lazy, compact, tracer = sm.lazy, sm.compact, sm.tracer
             sm = ExtendedSectionMatcher(
                 sm.info, sm.type, sm.name, sm.handlers)
+            sm.lazy, sm.compact, sm.tracer = lazy, compact, tracer
             sm.set_optionbag(bag)
         return sm
 
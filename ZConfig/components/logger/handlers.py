@@ -99,6 +99,12 @@ class FileHandlerFactory(HandlerFactory):
         old_files = self.section.old_files
         when = self.section.when
         interval = self.section.interval
+        buffered = (self.section.buffer_size or self.section.buffer_records
+                    or self.section.flush_interval)
+        if buffered and path in ("STDERR", "STDOUT"):
+            raise ValueError("cannot buffer " + path)
+        if buffered and (when or max_bytes or old_files or interval):
+            raise ValueError("cannot buffer a log file that is rotated")
         if path == "STDERR":
             if max_bytes or old_files:
                 raise ValueError("cannot rotate STDERR")
@@ -124,6 +130,12 @@ class FileHandlerFactory(HandlerFactory):
             else:
                 raise ValueError(
                     "max-bytes or when must be set for log rotation")
+        elif buffered:
+            handler = loghandler.BufferedFileHandler(
+                path, maxbytes=self.section.buffer_size,
+                maxrecords=self.section.buffer_records,
+                interval=self.section.flush_interval,
+                flushlevel=self.section.flush_level)
         else:
             handler = loghandler.FileHandler(path)
         return handler
@@ -202,6 +214,14 @@ class HTTPHandlerFactory(HandlerFactory):
     def create_loghandler(self):
         from ZConfig.components.logger import loghandler
         host, selector = self.section.url
+        if self.section.batch_size:
+            return loghandler.BatchingHTTPHandler(
+                "http://%s%s" % (host, selector),
+                maxrecords=self.section.batch_size,
+                maxsize=self.section.queue_size,
+                overflow=self.section.overflow,
+                timeout=self.section.timeout,
+                retries=self.section.retries)
         return loghandler.HTTPHandler(host, selector, self.section.method)
 
 class SMTPHandlerFactory(HandlerFactory):
@@ -224,8 +244,48 @@ class SMTPHandlerFactory(HandlerFactory):
             raise ValueError(
                 'Either both smtp-username and smtp-password or none must be '
                 'given')
+        if self.section.digest_window:
+            return loghandler.DigestSMTPHandler(
+                mailhost, self.section.fromaddr, self.section.toaddrs,
+                self.section.subject, kwargs.get('credentials'),
+                window=self.section.digest_window,
+                maxrecords=self.section.digest_max_records,
+                maxmessages=self.section.max_messages_per_hour)
         return loghandler.SMTPHandler(mailhost,
                                       self.section.fromaddr,
                                       self.section.toaddrs,
                                       self.section.subject,
                                       **kwargs)
+
+def overflow_policy(value):
+    from ZConfig.components.logger import loghandler
+    value = value.lower()
+    policies = loghandler.AsyncHandler.overflow_policies
+    if value not in policies:
+        raise ValueError("overflow must be one of " + ", ".join(policies))
+    return value
+
+class AsyncHandlerFactory(HandlerFactory):
+    def create(self):
+        from ZConfig.components.logger import loghandler
+        handlers = [factory() for factory in self.section.handlers]
+        handler = loghandler.AsyncHandler(handlers,
+                                          self.section.queue_size,
+                                          self.section.overflow)
+        handler.setLevel(self.section.level)
+        return handler
+
+    def getLevel(self):
+        # Records below the lowest level of the wrapped handlers are
+        # of no interest.
+        import logging
+        level = self.section.level
+        lowest = logging.NOTSET
+        for factory in self.section.handlers:
+            inner = factory.getLevel()
+            if inner != logging.NOTSET:
+                if lowest == logging.NOTSET:
+                    lowest = inner
+                else:
+                    lowest = min(lowest, inner)
+        return max(level, lowest)
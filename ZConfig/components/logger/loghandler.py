@@ -14,10 +14,15 @@
 """Handlers which can plug into a PEP 282 logger."""
 
 import os
-import sys
+import smtplib
+import threading
+import time
 import weakref
 
-from logging import Handler, StreamHandler
+from collections import deque
+
+from logging import Handler, LogRecord, StreamHandler, ERROR, WARNING
+from logging import makeLogRecord
 from logging.handlers import RotatingFileHandler as _RotatingFileHandler
 from logging.handlers import TimedRotatingFileHandler \
      as _TimedRotatingFileHandler
@@ -111,6 +116,124 @@ if os.name == "nt":
     FileHandler = Win32FileHandler
 
 
+class BufferedFileHandler(FileHandler):
+    """File handler which writes formatted records in batches.
+
+    Records are written when `maxbytes` bytes or `maxrecords` records
+    are waiting, when `interval` seconds have passed since the first
+    waiting record, or when a record at `flushlevel` or above arrives.
+    A limit of 0 is not used.  Waiting records are written before the
+    file is reopened or closed.
+
+    With an interval, a single thread, started with the first waiting
+    record, writes the records when their time is up.  After fork(),
+    the thread is started again in the child.
+    """
+
+    def __init__(self, filename, mode="a", maxbytes=0, maxrecords=0,
+                 interval=0, flushlevel=ERROR):
+        FileHandler.__init__(self, filename, mode)
+        self.maxbytes = maxbytes
+        self.maxrecords = maxrecords
+        self.interval = interval
+        self.flushlevel = flushlevel
+        self._buffer = []
+        self._size = 0
+        # time by which the waiting records are written, or None
+        self._deadline = None
+        self._flusher = None
+        self._pid = None
+        self._wakeup = threading.Condition(self.lock)
+        self._closed = False
+
+    def emit(self, record):
+        try:
+            text = "%s\n" % self.format(record)
+            if isinstance(text, unicode):
+                text = text.encode(getattr(self.stream, "encoding", None)
+                                   or "utf-8")
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+            return
+        self._buffer.append(text)
+        self._size += len(text)
+        if (record.levelno >= self.flushlevel
+            or (self.maxbytes and self._size >= self.maxbytes)
+            or (self.maxrecords and len(self._buffer) >= self.maxrecords)):
+            self.flush()
+        elif self.interval and self._deadline is None:
+            self._deadline = time.time() + self.interval
+            if self._flusher is None or self._pid != os.getpid():
+                # The thread doesn't survive fork(); start one for
+                # this process.
+                self._pid = os.getpid()
+                self._flusher = threading.Thread(
+                    target=self._run, name="ZConfig log file flusher")
+                self._flusher.setDaemon(True)
+                self._flusher.start()
+            else:
+                self._wakeup.notify()
+
+    def flush(self):
+        self.acquire()
+        try:
+            self._deadline = None
+            if self._buffer:
+                data = "".join(self._buffer)
+                del self._buffer[:]
+                self._size = 0
+                self.stream.write(data)
+            self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        # The thread isn't joined: logging.shutdown() calls close()
+        # holding the lock, which the thread needs to notice that the
+        # handler is closed.  It exits once it gets the lock.
+        self.acquire()
+        try:
+            self.flush()
+            self._closed = True
+            self._wakeup.notifyAll()
+        finally:
+            self.release()
+        FileHandler.close(self)
+
+    def reopen(self):
+        # Hold the lock so the thread can't write between the flush
+        # and the reopen.
+        self.acquire()
+        try:
+            self.flush()
+            FileHandler.reopen(self)
+        finally:
+            self.release()
+
+    def _run(self):
+        self.acquire()
+        try:
+            while not self._closed:
+                if self._deadline is None:
+                    self._wakeup.wait()
+                    continue
+                delay = self._deadline - time.time()
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+                try:
+                    self.flush()
+                except (KeyboardInterrupt, SystemExit):
+                    raise
+                except:
+                    # Don't let a failed write stop the thread.
+                    self._deadline = None
+        finally:
+            self.release()
+
+
 class RotatingFileHandler(_RotatingFileHandler):
 
     def __init__(self, *args, **kw):
@@ -150,19 +273,457 @@ class NullHandler(Handler):
         pass
 
 
+class DigestSMTPHandler(Handler):
+    """Handler which sends records by email, several to a message.
+
+    Records are collected for `window` seconds after the first of them
+    arrives, then sent using a single SMTP connection.  Records with
+    the same level, logger name and message are sent once, with the
+    number of repeats.  Each message holds at most `maxrecords`
+    records.  If `maxmessages` is set, at most that many messages are
+    sent per hour; records that would exceed the limit are dropped,
+    counted in `dropped`, and mentioned in the next message sent.
+    """
+
+    def __init__(self, mailhost, fromaddr, toaddrs, subject,
+                 credentials=None, window=60, maxrecords=100, maxmessages=0):
+        if maxrecords < 1:
+            raise ValueError("digest size must be at least 1")
+        Handler.__init__(self)
+        if isinstance(mailhost, tuple):
+            self.mailhost, self.mailport = mailhost
+        else:
+            self.mailhost, self.mailport = mailhost, None
+        if credentials:
+            self.username, self.password = credentials
+        else:
+            self.username = None
+        self.fromaddr = fromaddr
+        self.toaddrs = toaddrs
+        self.subject = subject
+        self.window = window
+        self.maxrecords = maxrecords
+        self.maxmessages = maxmessages
+        self.dropped = 0
+        self._entries = []   # [[record, text, repeats]]
+        self._index = {}     # (levelno, name, message) -> entry
+        self._timer = None
+        self._sent = deque() # times messages were sent, for the limit
+        self._unreported = 0 # dropped records not yet mentioned
+        self._sending = threading.Lock()
+
+    def emit(self, record):
+        try:
+            key = record.levelno, record.name, record.getMessage()
+            entry = self._index.get(key)
+            if entry is not None:
+                entry[2] += 1
+                return
+            entry = [record, self.format(record), 0]
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+            return
+        self._index[key] = entry
+        self._entries.append(entry)
+        if self._timer is None:
+            self._timer = threading.Timer(self.window, self.flush)
+            self._timer.setDaemon(True)
+            self._timer.start()
+
+    def flush(self):
+        """Send the collected records now."""
+        self.acquire()
+        try:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            entries = self._entries
+            self._entries = []
+            self._index = {}
+        finally:
+            self.release()
+        if not entries:
+            return
+        self._sending.acquire()
+        try:
+            self._send(entries)
+        finally:
+            self._sending.release()
+
+    def close(self):
+        self.flush()
+        Handler.close(self)
+
+    def _send(self, entries):
+        messages = []
+        for i in range(0, len(entries), self.maxrecords):
+            batch = entries[i:i+self.maxrecords]
+            if not self._allowed():
+                self.dropped += len(batch)
+                self._unreported += len(batch)
+                continue
+            messages.append((batch, self._message(batch)))
+            self._unreported = 0
+        if not messages:
+            return
+        try:
+            smtp = smtplib.SMTP(self.mailhost, self.mailport or 0)
+            try:
+                if self.username:
+                    smtp.login(self.username, self.password)
+                for batch, message in messages:
+                    smtp.sendmail(self.fromaddr, self.toaddrs, message)
+            finally:
+                smtp.quit()
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(messages[0][0][0][0])
+
+    def _allowed(self):
+        if not self.maxmessages:
+            return True
+        now = time.time()
+        sent = self._sent
+        while sent and sent[0] <= now - 3600:
+            sent.popleft()
+        if len(sent) >= self.maxmessages:
+            return False
+        sent.append(now)
+        return True
+
+    def _message(self, batch):
+        from email.Utils import formatdate
+        L = []
+        if self._unreported:
+            L.append("(%d records were not sent because too many messages"
+                     " were sent in the last hour)" % self._unreported)
+        for record, text, repeats in batch:
+            L.append(text)
+            if repeats:
+                L.append("(repeated %d more times)" % repeats)
+        return ("From: %s\r\nTo: %s\r\nSubject: %s\r\nDate: %s\r\n\r\n%s"
+                % (self.fromaddr, ",".join(self.toaddrs), self.subject,
+                   formatdate(), "\r\n".join(L)))
+
+
+class AsyncHandler(Handler):
+    """Handler which passes records to other handlers in another thread.
+
+    Records are put on a queue holding at most `maxsize` records; a
+    background thread takes them off and passes them to `handlers`.
+    `overflow` says what happens to a record when the queue is full:
+    with "block" the caller waits for room, "drop-oldest" discards the
+    oldest queued record, and "drop-newest" discards the new record.
+
+    The number of queued records is returned by qsize(); `maxdepth`
+    is the largest number queued at once, `handled` counts the records
+    passed on, and `dropped` those discarded.
+
+    The thread doesn't survive fork(); it's started again, with an
+    empty queue, when the handler is next used or reopened in the
+    child process.
+    """
+
+    overflow_policies = ("block", "drop-oldest", "drop-newest")
+
+    def __init__(self, handlers, maxsize=1000, overflow="block"):
+        if overflow not in self.overflow_policies:
+            raise ValueError("unknown overflow policy: " + `overflow`)
+        if maxsize < 1:
+            raise ValueError("queue size must be at least 1")
+        Handler.__init__(self)
+        self.handlers = handlers
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.maxdepth = 0
+        self.handled = 0
+        self.dropped = 0
+        self._closed = False
+        self._start()
+        self._wr = weakref.ref(self, _remove_from_reopenable)
+        _reopenable_handlers.append(self._wr)
+
+    def qsize(self):
+        return len(self._queue)
+
+    def emit(self, record):
+        # Merge the arguments into the message of a copy now, since
+        # they may change before the record is handled; other handlers
+        # still see the original record.
+        try:
+            msg = record.getMessage()
+            record = makeLogRecord(record.__dict__)
+            record.msg = msg
+            record.args = None
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+            return
+        self._checkpid()
+        cond = self._condition
+        cond.acquire()
+        try:
+            if not self._closed:
+                queue = self._queue
+                if len(queue) >= self.maxsize:
+                    if self.overflow == "drop-newest":
+                        self.dropped += 1
+                        return
+                    elif self.overflow == "drop-oldest":
+                        queue.popleft()
+                        self.dropped += 1
+                    else:
+                        while len(queue) >= self.maxsize and not self._closed:
+                            cond.wait()
+                if not self._closed:
+                    queue.append(record)
+                    self.maxdepth = max(self.maxdepth, len(queue))
+                    cond.notifyAll()
+                    return
+        finally:
+            cond.release()
+        # After close(), records are handled right away.
+        self._deliver([record])
+
+    def flush(self):
+        """Wait until the queued records are handled, and flush handlers."""
+        self._checkpid()
+        cond = self._condition
+        cond.acquire()
+        try:
+            while (self._queue or self._busy) and self._thread.isAlive():
+                cond.wait(0.1)
+        finally:
+            cond.release()
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self):
+        """Handle the queued records, stop the thread and close handlers."""
+        cond = self._condition
+        cond.acquire()
+        try:
+            self._closed = True
+            cond.notifyAll()
+        finally:
+            cond.release()
+        if self._thread is not threading.currentThread():
+            self._thread.join()
+        for handler in self.handlers:
+            handler.flush()
+            handler.close()
+        Handler.close(self)
+        _remove_from_reopenable(self._wr)
+
+    def reopen(self):
+        self._checkpid()
+        for handler in self.handlers:
+            # Handlers registered themselves are reopened by
+            # reopenFiles().
+            wr = getattr(handler, "_wr", None)
+            if wr is not None and wr in _reopenable_handlers:
+                continue
+            reopen = getattr(handler, "reopen", None)
+            if reopen is not None:
+                reopen()
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._queue = deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._busy = False
+        self._thread = threading.Thread(
+            target=self._run, name="ZConfig async log handler")
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def _checkpid(self):
+        if self._pid == os.getpid() or self._closed:
+            return
+        self.acquire()
+        try:
+            if self._pid != os.getpid():
+                # The thread didn't survive fork(); records queued
+                # before are handled by the parent process.
+                self._start()
+        finally:
+            self.release()
+
+    def _run(self):
+        cond = self._condition
+        queue = self._queue
+        while 1:
+            cond.acquire()
+            try:
+                while not queue and not self._closed:
+                    cond.wait()
+                if not queue:
+                    return
+                records = list(queue)
+                queue.clear()
+                self._busy = True
+                # wake up callers waiting for room
+                cond.notifyAll()
+            finally:
+                cond.release()
+            try:
+                self._deliver(records)
+            finally:
+                cond.acquire()
+                try:
+                    self._busy = False
+                    self.handled += len(records)
+                    cond.notifyAll()
+                finally:
+                    cond.release()
+
+    def _deliver(self, records):
+        for record in records:
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    try:
+                        handler.handle(record)
+                    except (KeyboardInterrupt, SystemExit):
+                        raise
+                    except:
+                        self.handleError(record)
+
+
+class BatchingHTTPHandler(AsyncHandler):
+    """Handler which POSTs records to a web server in batches.
+
+    Records are queued as by AsyncHandler; the background thread sends
+    the records waiting in the queue in one request, at most
+    `maxrecords` per request, as newline-delimited JSON objects built
+    by mapLogRecord().  Requests are made using a
+    ZConfig.transport.HTTPTransport, which keeps the connection open
+    and retries failed requests up to `retries` times; `timeout` is
+    the socket timeout for requests.
+    """
+
+    content_type = "application/x-ndjson"
+
+    def __init__(self, url, maxrecords=100, maxsize=1000, overflow="block",
+                 timeout=None, retries=2):
+        import ZConfig.transport
+        if maxrecords < 1:
+            raise ValueError("batch size must be at least 1")
+        self.url = url
+        self.maxrecords = maxrecords
+        self.transport = ZConfig.transport.HTTPTransport(
+            maxconnections=1, timeout=timeout, retries=retries)
+        AsyncHandler.__init__(self, [], maxsize, overflow)
+
+    def mapLogRecord(self, record):
+        """Return the JSON-serializable dictionary sent for `record`."""
+        return {
+            "name": record.name,
+            "levelname": record.levelname,
+            "levelno": record.levelno,
+            "created": record.created,
+            "pathname": record.pathname,
+            "lineno": record.lineno,
+            "process": record.process,
+            "thread": record.thread,
+            "message": self.format(record),
+            }
+
+    def close(self):
+        AsyncHandler.close(self)
+        self.transport.close()
+
+    def _start(self):
+        # Don't share connections opened by a parent process.
+        self.transport.close()
+        AsyncHandler._start(self)
+
+    def _deliver(self, records):
+        import urllib2
+        try:
+            import json
+        except ImportError:
+            # Python 2.5
+            import simplejson as json
+        for i in range(0, len(records), self.maxrecords):
+            batch = records[i:i+self.maxrecords]
+            try:
+                body = "".join([json.dumps(self.mapLogRecord(record)) + "\n"
+                                for record in batch])
+                req = urllib2.Request(self.url, body,
+                                      {"Content-Type": self.content_type})
+                self.transport.urlopen(req).close()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except:
+                self.handleError(batch[0])
+
+
 class StartupHandler(BufferingHandler):
     """Handler which stores messages in a buffer until later.
 
     This is useful at startup before we can know that we can safely
     write to a configuration-specified handler.
+
+    At most `capacity` records are kept.  `overflow` says which record
+    is discarded when the buffer is full: "drop-oldest" discards the
+    oldest buffered record, and "drop-newest" the new record.
+    `dropped` counts the records discarded.
     """
 
-    def __init__(self):
-        BufferingHandler.__init__(self, sys.maxint)
+    overflow_policies = ("drop-oldest", "drop-newest")
+
+    def __init__(self, capacity=10000, overflow="drop-oldest"):
+        if overflow not in self.overflow_policies:
+            raise ValueError("unknown overflow policy: " + `overflow`)
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        BufferingHandler.__init__(self, capacity)
+        self.buffer = deque()
+        self.overflow = overflow
+        self.dropped = 0
+        self._unreported = 0
 
     def shouldFlush(self, record):
         return False
 
+    def emit(self, record):
+        buffer = self.buffer
+        if len(buffer) >= self.capacity:
+            self.dropped += 1
+            self._unreported += 1
+            if self.overflow == "drop-newest":
+                return
+            buffer.popleft()
+        buffer.append(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            self.buffer.clear()
+        finally:
+            self.release()
+
     def flushBufferTo(self, target):
-        while self.buffer:
-            target.handle(self.buffer.pop(0))
+        """Pass the buffered records to `target`, oldest first.
+
+        If records were dropped since the last call, a warning saying
+        how many is passed to `target` first.
+        """
+        self.acquire()
+        try:
+            if self._unreported:
+                record = LogRecord(
+                    "ZConfig", WARNING, __file__, 0,
+                    "%d log records were dropped before logging was"
+                    " configured", (self._unreported,), None)
+                self._unreported = 0
+                target.handle(record)
+            buffer = self.buffer
+            while buffer:
+                target.handle(buffer.popleft())
+        finally:
+            self.release()
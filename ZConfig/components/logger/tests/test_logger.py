@@ -14,16 +14,21 @@
 
 """Tests for logging configuration via ZConfig."""
 
+import asyncore
 import cStringIO as StringIO
 import doctest
 import logging
 import os
+import smtpd
 import sys
 import tempfile
+import threading
+import time
 import unittest
 
 import ZConfig
 
+from ZConfig.tests.test_transport import LocalServer
 from ZConfig.components.logger import datatypes
 from ZConfig.components.logger import handlers
 from ZConfig.components.logger import loghandler
@@ -331,6 +336,28 @@ class TestConfig(LoggingTestBase):
         self.assertEqual(handler.method, "GET")
         self.assert_(isinstance(handler, loghandler.HTTPHandler))
 
+    def test_with_http_logger_batching(self):
+        logger = self.check_simple_logger("<eventlog>\n"
+                                          "  <http-logger>\n"
+                                          "    url http://example.com/log/\n"
+                                          "    batch-size 50\n"
+                                          "    queue-size 500\n"
+                                          "    overflow drop-newest\n"
+                                          "    timeout 5s\n"
+                                          "    retries 1\n"
+                                          "  </http-logger>\n"
+                                          "</eventlog>")
+        handler = logger.handlers[0]
+        self.assert_(isinstance(handler, loghandler.BatchingHTTPHandler))
+        self.assertEqual(handler.url, "http://example.com/log/")
+        self.assertEqual(handler.maxrecords, 50)
+        self.assertEqual(handler.maxsize, 500)
+        self.assertEqual(handler.overflow, "drop-newest")
+        self.assertEqual(handler.transport.timeout, 5)
+        self.assertEqual(handler.transport.retries, 1)
+        logger.removeHandler(handler)
+        handler.close()
+
     def test_with_email_notifier(self):
         logger = self.check_simple_logger("<eventlog>\n"
                                           "  <email-notifier>\n"
@@ -394,6 +421,113 @@ class TestConfig(LoggingTestBase):
                           "  </email-notifier>\n"
                           "</eventlog>")
 
+    def test_with_buffered_logfile(self):
+        fn = self.mktemp()
+        logger = self.check_simple_logger("<eventlog>\n"
+                                          "  <logfile>\n"
+                                          "    path %s\n"
+                                          "    format %%(message)s\n"
+                                          "    buffer-records 3\n"
+                                          "    flush-level critical\n"
+                                          "  </logfile>\n"
+                                          "</eventlog>" % fn)
+        logfile = logger.handlers[0]
+        self.assert_(isinstance(logfile, loghandler.BufferedFileHandler))
+        self.assertEqual(logfile.maxrecords, 3)
+        self.assertEqual(logfile.maxbytes, 0)
+        self.assertEqual(logfile.flushlevel, logging.CRITICAL)
+        logger.info("one")
+        logger.error("two")
+        self.assertEqual(open(fn).read(), "")
+        logger.info("three")
+        self.assertEqual(open(fn).read(), "one\ntwo\nthree\n")
+        logger.info("four")
+        logger.critical("five")
+        self.assertEqual(open(fn).read(), "one\ntwo\nthree\nfour\nfive\n")
+        logger.info("six")
+        logger.removeHandler(logfile)
+        logfile.close()
+        self.assert_(open(fn).read().endswith("five\nsix\n"))
+
+    def test_buffered_logfile_errors(self):
+        self.assertRaises(ValueError, self.check_simple_logger,
+                          "<eventlog>\n"
+                          "  <logfile>\n"
+                          "    path STDERR\n"
+                          "    buffer-size 64kb\n"
+                          "  </logfile>\n"
+                          "</eventlog>")
+        self.assertRaises(ValueError, self.check_simple_logger,
+                          "<eventlog>\n"
+                          "  <logfile>\n"
+                          "    path %s\n"
+                          "    flush-interval 5s\n"
+                          "    max-size 1mb\n"
+                          "    old-files 3\n"
+                          "  </logfile>\n"
+                          "</eventlog>" % self.mktemp())
+
+    def test_with_email_notifier_digest(self):
+        logger = self.check_simple_logger("<eventlog>\n"
+                                          "  <email-notifier>\n"
+                                          "    to sysadmin@example.com\n"
+                                          "    from zlog-user@example.com\n"
+                                          "    smtp-server mail:2525\n"
+                                          "    digest-window 5m\n"
+                                          "    digest-max-records 20\n"
+                                          "    max-messages-per-hour 6\n"
+                                          "  </email-notifier>\n"
+                                          "</eventlog>")
+        handler = logger.handlers[0]
+        self.assert_(isinstance(handler, loghandler.DigestSMTPHandler))
+        self.assertEqual((handler.mailhost, handler.mailport),
+                         ("mail", 2525))
+        self.assertEqual(handler.window, 300)
+        self.assertEqual(handler.maxrecords, 20)
+        self.assertEqual(handler.maxmessages, 6)
+
+    def test_email_notifier_digest_size(self):
+        self.assertRaises(ValueError, self.check_simple_logger,
+                          "<eventlog>\n"
+                          "  <email-notifier>\n"
+                          "    to sysadmin@example.com\n"
+                          "    from zlog-user@example.com\n"
+                          "    digest-window 5m\n"
+                          "    digest-max-records 0\n"
+                          "  </email-notifier>\n"
+                          "</eventlog>")
+
+    def test_overflow_policy(self):
+        convert = handlers.overflow_policy
+        self.assertEqual(convert("Block"), "block")
+        self.assertEqual(convert("drop-oldest"), "drop-oldest")
+        self.assertEqual(convert("drop-newest"), "drop-newest")
+        self.assertRaises(ValueError, convert, "drop")
+
+    def test_with_async(self):
+        fn = self.mktemp()
+        logger = self.check_simple_logger("<eventlog>\n"
+                                          "  <async>\n"
+                                          "    queue-size 10\n"
+                                          "    overflow drop-oldest\n"
+                                          "    <logfile>\n"
+                                          "      path %s\n"
+                                          "      format %%(message)s\n"
+                                          "    </logfile>\n"
+                                          "  </async>\n"
+                                          "</eventlog>" % fn)
+        handler = logger.handlers[0]
+        self.assert_(isinstance(handler, loghandler.AsyncHandler))
+        self.assertEqual(handler.maxsize, 10)
+        self.assertEqual(handler.overflow, "drop-oldest")
+        self.assert_(isinstance(handler.handlers[0], loghandler.FileHandler))
+        logger.warn("message %d", 1)
+        handler.flush()
+        self.assertEqual(open(fn).read(), "message 1\n")
+        logger.removeHandler(handler)
+        handler.close()
+        self.assertEqual(handler.handled, 1)
+
     def check_simple_logger(self, text, level=logging.INFO):
         conf = self.get_config(text)
         self.assert_(conf.eventlog is not None)
@@ -627,6 +761,549 @@ class TestReopeningRotatingLogfiles(TestReopeningLogfilesBase):
                 logger.removeHandler(handler)
                 handler.close()
 
+class TestBufferedFileHandler(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.fn = tempfile.mkstemp()
+        os.close(fd)
+        self.handlers = []
+
+    def tearDown(self):
+        for handler in self.handlers:
+            handler.close()
+        for fn in self.fn, self.fn + ".old":
+            if os.path.exists(fn):
+                os.unlink(fn)
+
+    def handler(self, **kw):
+        handler = loghandler.BufferedFileHandler(self.fn, **kw)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.handlers.append(handler)
+        return handler
+
+    def read(self):
+        return open(self.fn).read()
+
+    def test_byte_threshold(self):
+        handler = self.handler(maxbytes=10)
+        handler.handle(makeRecord("1234"))
+        self.assertEqual(self.read(), "")
+        handler.handle(makeRecord("5678"))
+        self.assertEqual(self.read(), "1234\n5678\n")
+
+    def wait_for(self, text):
+        for i in range(100):
+            if self.read() == text:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.read(), text)
+
+    def test_interval(self):
+        handler = self.handler(interval=0.05)
+        handler.handle(makeRecord("one"))
+        handler.handle(makeRecord("two"))
+        self.assertEqual(self.read(), "")
+        self.wait_for("one\ntwo\n")
+        flusher = handler._flusher
+        # the same thread is used for later records
+        handler.handle(makeRecord("three"))
+        self.wait_for("one\ntwo\nthree\n")
+        self.assert_(handler._flusher is flusher)
+        self.handlers.remove(handler)
+        handler.close()
+        flusher.join(5)
+        self.assert_(not flusher.isAlive())
+
+    def test_flusher_restarted_after_fork(self):
+        handler = self.handler(interval=0.05)
+        handler.handle(makeRecord("one"))
+        self.wait_for("one\n")
+        flusher = handler._flusher
+        # pretend the handler was inherited by a child process
+        handler._pid = -1
+        handler.handle(makeRecord("two"))
+        self.assert_(handler._flusher is not flusher)
+        self.assertEqual(handler._pid, os.getpid())
+        self.wait_for("one\ntwo\n")
+        self.handlers.remove(handler)
+        handler.close()
+        flusher.join(5)
+        self.assert_(not flusher.isAlive())
+
+    def test_close_holding_lock(self):
+        # logging.shutdown() holds the lock while closing handlers
+        handler = self.handler(interval=0.05)
+        handler.handle(makeRecord("one"))
+        self.wait_for("one\n")
+        flusher = handler._flusher
+        self.handlers.remove(handler)
+        def shutdown():
+            handler.acquire()
+            try:
+                handler.close()
+            finally:
+                handler.release()
+        t = threading.Thread(target=shutdown)
+        t.setDaemon(True)
+        t.start()
+        t.join(5)
+        self.assert_(not t.isAlive())
+        flusher.join(5)
+        self.assert_(not flusher.isAlive())
+
+    def test_flush_level(self):
+        handler = self.handler(maxrecords=100)
+        handler.handle(makeRecord("one"))
+        handler.handle(makeRecord("two", logging.ERROR))
+        self.assertEqual(self.read(), "one\ntwo\n")
+
+    def test_reopen(self):
+        handler = self.handler(maxrecords=100)
+        handler.handle(makeRecord("one"))
+        os.rename(self.fn, self.fn + ".old")
+        loghandler.reopenFiles()
+        handler.handle(makeRecord("two"))
+        handler.flush()
+        self.assertEqual(open(self.fn + ".old").read(), "one\n")
+        self.assertEqual(self.read(), "two\n")
+
+    def test_closeFiles(self):
+        handler = self.handler(maxrecords=100)
+        handler.handle(makeRecord("one"))
+        self.handlers.remove(handler)
+        loghandler.closeFiles()
+        self.assertEqual(self.read(), "one\n")
+
+
+class SMTPServer(smtpd.SMTPServer):
+    """Stand-in SMTP server, running in a separate thread."""
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ("127.0.0.1", 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.connections = 0
+        self.messages = []
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            asyncore.loop(0.01, count=1)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.close()
+        asyncore.close_all()
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        self.messages.append((mailfrom, rcpttos, data))
+
+
+class TestDigestSMTPHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.server = SMTPServer()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def handler(self, **kw):
+        handler = loghandler.DigestSMTPHandler(
+            ("127.0.0.1", self.server.port), "zlog@example.com",
+            ["admin@example.com", "pager@example.com"], "Errors", **kw)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        return handler
+
+    def wait(self, count):
+        for i in range(500):
+            if len(self.server.messages) >= count:
+                break
+            time.sleep(0.01)
+        return [data for mailfrom, rcpttos, data in self.server.messages]
+
+    def test_digest(self):
+        handler = self.handler(window=60)
+        for i in range(3):
+            handler.handle(makeRecord("disk full"))
+        handler.handle(makeRecord("disk %s", logging.ERROR, "full"))
+        handler.handle(makeRecord("other"))
+        self.assertEqual(self.server.messages, [])
+        handler.flush()
+        messages = self.wait(1)
+        self.assertEqual(len(messages), 1)
+        mailfrom, rcpttos, data = self.server.messages[0]
+        self.assertEqual(mailfrom, "zlog@example.com")
+        self.assertEqual(rcpttos, ["admin@example.com", "pager@example.com"])
+        self.assert_("Subject: Errors" in data)
+        self.assert_(data.endswith("INFO disk full\n"
+                                   "(repeated 2 more times)\n"
+                                   "ERROR disk full\n"
+                                   "INFO other"), data)
+
+    def test_window(self):
+        handler = self.handler(window=0.05)
+        handler.handle(makeRecord("one"))
+        handler.handle(makeRecord("two"))
+        messages = self.wait(1)
+        self.assertEqual(len(messages), 1)
+        self.assert_(messages[0].endswith("INFO one\nINFO two"))
+        self.assertEqual(handler._timer, None)
+
+    def test_one_connection_per_flush(self):
+        handler = self.handler(maxrecords=2)
+        for i in range(5):
+            handler.handle(makeRecord("message %d", logging.INFO, i))
+        handler.close()
+        messages = self.wait(3)
+        self.assertEqual(len(messages), 3)
+        self.assertEqual(self.server.connections, 1)
+        self.assert_(messages[2].endswith("INFO message 4"))
+
+    def test_rate_limit(self):
+        handler = self.handler(maxrecords=1, maxmessages=2)
+        for i in range(3):
+            handler.handle(makeRecord("message %d", logging.INFO, i))
+        handler.flush()
+        self.assertEqual(len(self.wait(2)), 2)
+        self.assertEqual(handler.dropped, 1)
+        handler._sent.clear()
+        handler.handle(makeRecord("later"))
+        handler.flush()
+        messages = self.wait(3)
+        self.assert_("(1 records were not sent" in messages[2])
+        self.assert_(messages[2].endswith("INFO later"))
+        handler.close()
+
+    def test_invalid_digest_size(self):
+        self.assertRaises(ValueError, self.handler, maxrecords=0)
+        self.assertRaises(ValueError, self.handler, maxrecords=-1)
+
+    def test_unreachable_server(self):
+        handler = self.handler()
+        handler.mailport = 1
+        errors = []
+        handler.handleError = errors.append
+        handler.handle(makeRecord("lost"))
+        handler.flush()
+        self.assertEqual([record.getMessage() for record in errors],
+                         ["lost"])
+
+
+class TestBatchingHTTPHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer()
+        self.server.documents["/log"] = ""
+
+    def tearDown(self):
+        self.server.stop()
+
+    def handler(self, path="/log", **kw):
+        handler = loghandler.BatchingHTTPHandler(self.server.url(path), **kw)
+        handler.transport.backoff = 0.001
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        return handler
+
+    def lines(self):
+        import json
+        L = []
+        for body in self.server.bodies:
+            self.assert_(body.endswith("\n"))
+            L.extend([json.loads(line) for line in body.splitlines()])
+        return L
+
+    def test_records(self):
+        handler = self.handler()
+        handler.handle(makeRecord("message %d", logging.WARN, 1))
+        handler.flush()
+        self.assertEqual(self.server.requests, ["/log"])
+        [d] = self.lines()
+        self.assertEqual(d["message"], "WARNING message 1")
+        self.assertEqual(d["levelname"], "WARNING")
+        self.assertEqual(d["levelno"], logging.WARN)
+        self.assertEqual(d["name"], "test")
+        handler.close()
+
+    def test_batches(self):
+        handler = self.handler(maxrecords=4)
+        self.server.delay = 0.2
+        for i in range(6):
+            handler.handle(makeRecord("message %d", logging.INFO, i))
+        handler.close()
+        # records queued while a request is made are sent together
+        self.assert_(len(self.server.bodies) <= 3)
+        for body in self.server.bodies:
+            self.assert_(body.count("\n") <= 4)
+        self.assertEqual([d["message"] for d in self.lines()],
+                         ["INFO message %d" % i for i in range(6)])
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(handler.handled, 6)
+
+    def test_sent_batches_not_retried(self):
+        handler = self.handler(retries=1)
+        errors = []
+        handler.handleError = errors.append
+        self.server.failures = 1
+        handler.handle(makeRecord("one"))
+        handler.flush()
+        self.assertEqual(len(self.server.bodies), 1)
+        self.assertEqual([record.getMessage() for record in errors], ["one"])
+        handler.handle(makeRecord("two"))
+        handler.close()
+        self.assertEqual(len(self.server.bodies), 2)
+        self.assertEqual(len(errors), 1)
+
+    def test_server_error(self):
+        handler = self.handler("/missing", retries=0)
+        errors = []
+        handler.handleError = errors.append
+        handler.handle(makeRecord("lost"))
+        handler.close()
+        self.assertEqual([record.getMessage() for record in errors],
+                         ["lost"])
+
+
+class TestStartupHandler(unittest.TestCase):
+
+    def fill(self, handler, count):
+        for i in range(count):
+            handler.handle(makeRecord("message %d", logging.INFO, i))
+
+    def drain(self, handler):
+        target = RecordingHandler()
+        handler.flushBufferTo(target)
+        return target.messages
+
+    def test_drain(self):
+        handler = loghandler.StartupHandler()
+        self.fill(handler, 3)
+        self.assertEqual(self.drain(handler),
+                         ["message 0", "message 1", "message 2"])
+        self.assertEqual(len(handler.buffer), 0)
+        self.assertEqual(handler.dropped, 0)
+
+    def test_drop_oldest(self):
+        handler = loghandler.StartupHandler(3)
+        self.fill(handler, 5)
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual(self.drain(handler), [
+            "2 log records were dropped before logging was configured",
+            "message 2", "message 3", "message 4"])
+        # the drop is only reported once
+        self.fill(handler, 1)
+        self.assertEqual(self.drain(handler), ["message 0"])
+        self.assertEqual(handler.dropped, 2)
+
+    def test_drop_newest(self):
+        handler = loghandler.StartupHandler(3, "drop-newest")
+        self.fill(handler, 5)
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual(self.drain(handler)[1:],
+                         ["message 0", "message 1", "message 2"])
+
+    def test_flush(self):
+        handler = loghandler.StartupHandler()
+        self.fill(handler, 2)
+        handler.close()
+        self.assertEqual(self.drain(handler), [])
+
+    def test_drain_while_logging(self):
+        handler = loghandler.StartupHandler(10)
+        self.fill(handler, 20)
+        target = RecordingHandler()
+        threads = []
+        def emit(record):
+            # another thread logs while the buffer is drained
+            t = threading.Thread(target=handler.handle,
+                                 args=(makeRecord("late"),))
+            threads.append(t)
+            t.start()
+            t.join(0.05)
+            target.messages.append(record.getMessage())
+        target.emit = emit
+        handler.flushBufferTo(target)
+        self.assertEqual(len(target.messages), 11)
+        self.assertEqual(target.messages[0],
+            "10 log records were dropped before logging was configured")
+        # the records logged meanwhile waited for the drain to finish
+        for t in threads:
+            t.join()
+        self.assertEqual(len(handler.buffer), 10)
+        self.assertEqual(handler.dropped, 11)
+
+    def test_errors(self):
+        self.assertRaises(ValueError, loghandler.StartupHandler, 0)
+        self.assertRaises(ValueError, loghandler.StartupHandler, 10, "block")
+
+
+class RecordingHandler(logging.Handler):
+    """Handler that keeps messages, waiting for `gate` if given."""
+
+    def __init__(self, gate=None):
+        logging.Handler.__init__(self)
+        self.gate = gate
+        self.messages = []
+
+    def emit(self, record):
+        if self.gate is not None:
+            self.gate.wait()
+        self.messages.append(record.getMessage())
+
+
+def makeRecord(msg, level=logging.INFO, *args):
+    return logging.LogRecord("test", level, __file__, 1, msg, args, None)
+
+
+class TestAsyncHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.gate = threading.Event()
+        self.inner = RecordingHandler(self.gate)
+
+    def tearDown(self):
+        self.gate.set()
+
+    def start(self, overflow):
+        # The first record is held by the thread until the gate opens;
+        # the queue then has room for two records.
+        handler = loghandler.AsyncHandler([self.inner], 2, overflow)
+        handler.handle(makeRecord("a"))
+        while handler.qsize():
+            time.sleep(0.001)
+        handler.handle(makeRecord("b"))
+        handler.handle(makeRecord("c"))
+        return handler
+
+    def test_records_handled_in_order(self):
+        self.gate.set()
+        handler = loghandler.AsyncHandler([self.inner])
+        for i in range(100):
+            handler.handle(makeRecord("%d", logging.INFO, i))
+        handler.flush()
+        self.assertEqual(self.inner.messages, map(str, range(100)))
+        self.assertEqual(handler.handled, 100)
+        self.assertEqual(handler.dropped, 0)
+        handler.close()
+
+    def test_inner_handler_level(self):
+        self.gate.set()
+        self.inner.setLevel(logging.ERROR)
+        handler = loghandler.AsyncHandler([self.inner])
+        handler.handle(makeRecord("info"))
+        handler.handle(makeRecord("error", logging.ERROR))
+        handler.close()
+        self.assertEqual(self.inner.messages, ["error"])
+
+    def test_drop_newest(self):
+        handler = self.start("drop-newest")
+        handler.handle(makeRecord("d"))
+        self.assertEqual(handler.qsize(), 2)
+        self.assertEqual(handler.maxdepth, 2)
+        self.assertEqual(handler.dropped, 1)
+        self.gate.set()
+        handler.close()
+        self.assertEqual(self.inner.messages, ["a", "b", "c"])
+
+    def test_drop_oldest(self):
+        handler = self.start("drop-oldest")
+        handler.handle(makeRecord("d"))
+        self.assertEqual(handler.dropped, 1)
+        self.gate.set()
+        handler.close()
+        self.assertEqual(self.inner.messages, ["a", "c", "d"])
+        self.assertEqual(handler.handled, 3)
+
+    def test_block(self):
+        handler = self.start("block")
+        t = threading.Thread(target=handler.handle, args=(makeRecord("d"),))
+        t.start()
+        t.join(0.05)
+        self.assert_(t.isAlive())
+        self.gate.set()
+        t.join()
+        handler.close()
+        self.assertEqual(self.inner.messages, ["a", "b", "c", "d"])
+        self.assertEqual(handler.dropped, 0)
+
+    def test_close_handles_queued_records(self):
+        handler = self.start("block")
+        self.gate.set()
+        handler.close()
+        self.assertEqual(self.inner.messages, ["a", "b", "c"])
+        self.assert_(not handler._thread.isAlive())
+        # records arriving later are handled right away
+        handler.handle(makeRecord("d"))
+        self.assertEqual(self.inner.messages, ["a", "b", "c", "d"])
+
+    def test_arguments_merged_when_queued(self):
+        self.gate.set()
+        handler = loghandler.AsyncHandler([self.inner])
+        L = [1]
+        handler.handle(makeRecord("%s", logging.INFO, L))
+        L.append(2)
+        handler.close()
+        self.assertEqual(self.inner.messages, ["[1]"])
+
+    def test_record_not_changed(self):
+        self.gate.set()
+        handler = loghandler.AsyncHandler([self.inner])
+        record = makeRecord("%s-%s", logging.INFO, "a", "b")
+        handler.handle(record)
+        handler.close()
+        self.assertEqual(self.inner.messages, ["a-b"])
+        self.assertEqual((record.msg, record.args), ("%s-%s", ("a", "b")))
+
+    def test_reopen(self):
+        self.gate.set()
+        fn = tempfile.mktemp()
+        try:
+            filehandler = loghandler.FileHandler(fn)
+            handler = loghandler.AsyncHandler([self.inner, filehandler])
+            self.assert_(handler._wr in loghandler._reopenable_handlers)
+            reopened = []
+            self.inner.reopen = lambda: reopened.append(1)
+            filehandler.reopen = lambda: reopened.append(2)
+            loghandler.reopenFiles()
+            # the file handler is reopened by reopenFiles() itself
+            reopened.sort()
+            self.assertEqual(reopened, [1, 2])
+            handler.close()
+            self.assert_(handler._wr not in loghandler._reopenable_handlers)
+            self.assert_(filehandler._wr not in loghandler._reopenable_handlers)
+        finally:
+            os.remove(fn)
+
+    def test_restarted_after_fork(self):
+        handler = self.start("block")
+        thread, cond, queue = (handler._thread, handler._condition,
+                               handler._queue)
+        # pretend the handler was inherited by a child process, where
+        # the thread and the records it was to handle don't exist
+        handler._pid = -1
+        handler.handle(makeRecord("d"))
+        self.assert_(handler._thread is not thread)
+        self.assertEqual(handler._pid, os.getpid())
+        cond.acquire()
+        queue.clear()
+        cond.release()
+        self.gate.set()
+        handler.close()
+        # stop the "parent" thread
+        cond.acquire()
+        cond.notifyAll()
+        cond.release()
+        thread.join()
+        self.inner.messages.sort()
+        self.assertEqual(self.inner.messages, ["a", "d"])
+
+
 def test_logger_convenience_function_and_ommiting_name_to_get_root_logger():
     """
 
@@ -683,6 +1360,11 @@ def test_suite():
     suite = unittest.TestSuite()
     suite.addTest(doctest.DocTestSuite())
     suite.addTest(unittest.makeSuite(TestConfig))
+    suite.addTest(unittest.makeSuite(TestBufferedFileHandler))
+    suite.addTest(unittest.makeSuite(TestAsyncHandler))
+    suite.addTest(unittest.makeSuite(TestDigestSMTPHandler))
+    suite.addTest(unittest.makeSuite(TestBatchingHTTPHandler))
+    suite.addTest(unittest.makeSuite(TestStartupHandler))
     if os.name != "nt":
         # Though log files can be closed and re-opened on Windows, these
         # tests expect to be able to move the underlying files out from
@@ -17,6 +17,8 @@ import os
 import re
 import sys
 import datetime
+import threading
+import time
 
 try:
     unicode
@@ -27,19 +29,98 @@ else:
 
 
 class MemoizedConversion:
-    """Conversion helper that caches the results of expensive conversions."""
+    """Conversion helper that caches the results of expensive conversions.
 
-    def __init__(self, conversion):
+    If `maxsize` is not None, at most that many results are kept; the
+    least recently used result is discarded first.  If `ttl` is not
+    None, results older than `ttl` seconds are converted again.  The
+    numbers of hits, misses and evictions are counted.
+    """
+
+    timer = time.time
+
+    def __init__(self, conversion, maxsize=None, ttl=None):
         self._memo = {}
         self._conversion = conversion
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Entries are [prev, next, value, result, time] lists in a
+        # circular list, most recently used at the end.
+        self._root = root = []
+        root[:] = [root, root, None, None, None]
 
     def __call__(self, value):
+        self._lock.acquire()
+        try:
+            entry = self._memo.get(value)
+            if entry is not None:
+                if (self.ttl is None
+                    or self.timer() - entry[4] < self.ttl):
+                    self._unlink(entry)
+                    self._append(entry)
+                    self.hits += 1
+                    return entry[3]
+                self._unlink(entry)
+                del self._memo[value]
+            self.misses += 1
+        finally:
+            self._lock.release()
+        v = self._conversion(value)
+        self._lock.acquire()
+        try:
+            entry = self._memo.get(value)
+            if entry is not None:
+                # converted by another thread meanwhile
+                self._unlink(entry)
+            entry = [None, None, value, v, self.timer()]
+            self._memo[value] = entry
+            self._append(entry)
+            if self.maxsize is not None:
+                while len(self._memo) > self.maxsize:
+                    oldest = self._root[1]
+                    self._unlink(oldest)
+                    del self._memo[oldest[2]]
+                    self.evictions += 1
+        finally:
+            self._lock.release()
+        return v
+
+    def __len__(self):
+        return len(self._memo)
+
+    def clear(self):
+        """Discard all cached results."""
+        self._lock.acquire()
         try:
-            return self._memo[value]
-        except KeyError:
-            v = self._conversion(value)
-            self._memo[value] = v
-            return v
+            self._memo.clear()
+            root = self._root
+            root[:] = [root, root, None, None, None]
+        finally:
+            self._lock.release()
+
+    def getStatistics(self):
+        """Return a mapping with the cache size and counters."""
+        return {"size": len(self._memo),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                }
+
+    def _append(self, entry):
+        root = self._root
+        last = root[0]
+        entry[0] = last
+        entry[1] = root
+        last[1] = root[0] = entry
+
+    def _unlink(self, entry):
+        prev, next = entry[0], entry[1]
+        prev[1] = next
+        next[0] = prev
 
 
 class RangeCheckedConversion:
@@ -405,6 +486,30 @@ stock_datatypes = {
     }
 
 
+# Objects found by Registry.search(), shared by all registries.
+_search_cache = {}
+_search_lock = threading.Lock()
+
+def clearSearchCache(name=None):
+    """Discard objects found by Registry.search().
+
+    If `name` is given, only that name and the names within it (such
+    as those in a reloaded module) are discarded.  Registries keep the
+    objects they have already found.
+    """
+    _search_lock.acquire()
+    try:
+        if name is None:
+            _search_cache.clear()
+        else:
+            prefix = name + "."
+            for key in _search_cache.keys():
+                if key == name or key.startswith(prefix):
+                    del _search_cache[key]
+    finally:
+        _search_lock.release()
+
+
 class Registry:
     def __init__(self, stock=None):
         if stock is None:
@@ -412,6 +517,8 @@ class Registry:
         self._stock = stock
         self._other = {}
         self._basic_key = None
+        # number of imports performed by search()
+        self.imports = 0
 
     def get(self, name):
         if '.' not in name:
@@ -429,6 +536,27 @@ class Registry:
                 t = self.search(name)
         return t
 
+    def memoize(self, name, maxsize=None, ttl=None):
+        """Cache the results of the conversion for the datatype `name`.
+
+        The conversion is replaced by a MemoizedConversion, which is
+        returned; its statistics can be examined later.  This affects
+        schema loaded after the call.
+        """
+        conversion = self.get(name)
+        if '.' not in name:
+            name = self.get("basic-key")(name)
+        if isinstance(conversion, MemoizedConversion):
+            conversion = conversion._conversion
+        memo = MemoizedConversion(conversion, maxsize, ttl)
+        if self._stock.has_key(name):
+            self._stock[name] = memo
+        else:
+            self._other[name] = memo
+        if name == "basic-key":
+            self._basic_key = None
+        return memo
+
     def register(self, name, conversion):
         if self._stock.has_key(name):
             raise ValueError("datatype name conflicts with built-in type: "
@@ -437,12 +565,45 @@ class Registry:
             raise ValueError("datatype name already registered: " + `name`)
         self._other[name] = conversion
 
+    def getName(self, conversion):
+        """Return the name `conversion` is known by, or None.
+
+        If there are several, the first in sorted order is returned.
+        """
+        L = []
+        for types in self._stock, self._other:
+            for name, t in types.items():
+                if t is conversion:
+                    L.append(name)
+        if L:
+            return min(L)
+        return None
+
     def search(self, name):
         if not "." in name:
             raise ValueError("unloadable datatype name: " + `name`)
+        _search_lock.acquire()
+        try:
+            package = _search_cache.get(name, _marker)
+        finally:
+            _search_lock.release()
+        if package is _marker:
+            # The lock isn't held while importing; the imported module
+            # may load schema itself.
+            package = self._import(name)
+            _search_lock.acquire()
+            try:
+                package = _search_cache.setdefault(name, package)
+            finally:
+                _search_lock.release()
+        self._other[name] = package
+        return package
+
+    def _import(self, name):
         components = name.split('.')
         start = components[0]
         g = {}
+        self.imports += 1
         package = __import__(start, g, g)
         modulenames = [start]
         for component in components[1:]:
@@ -451,6 +612,9 @@ class Registry:
                 package = getattr(package, component)
             except AttributeError:
                 n = '.'.join(modulenames)
+                self.imports += 1
                 package = __import__(n, g, g, component)
-        self._other[name] = package
         return package
+
+
+_marker = object()
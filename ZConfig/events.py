@@ -0,0 +1,237 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Event-based reading of configuration data.
+
+iterConfig() and iterConfigFile() return iterators of (event, data,
+position) tuples instead of building a configuration object:
+
+  START       data is (type, name)
+  VALUE       data is (key, value); value has had substitutions made
+  END         data is (type, name, value)
+  DIRECTIVE   data is (name, argument)
+
+position is a (lineno, colno, url) tuple.  Included resources are read
+as their %include directives are reached.
+
+When a schema is given, each section is checked and converted when it
+ends, and the converted value is the value of the END event; it is not
+retained by the containing section.  The last event has the type and
+name None and the converted top-level configuration as its value.
+"""
+
+from collections import deque
+
+import ZConfig
+import ZConfig.cfgparser
+import ZConfig.loader
+import ZConfig.matcher
+
+from ZConfig.cfgparser import DIRECTIVE, END, KEY, MALFORMED, START
+
+VALUE = "value"
+
+
+def iterConfig(url, schema=None):
+    return EventReader(schema).iterURL(url)
+
+def iterConfigFile(file, url=None, schema=None):
+    return EventReader(schema).iterFile(file, url)
+
+
+class EventReader(ZConfig.loader.ConfigLoader):
+    """Loader that generates parse events.
+
+    If a schema is used, the composite handler for the configuration
+    is available as the `handler` attribute once the events have been
+    consumed.
+    """
+
+    def __init__(self, schema=None):
+        if schema is not None:
+            ZConfig.loader.ConfigLoader.__init__(self, schema)
+        else:
+            ZConfig.loader.BaseLoader.__init__(self)
+            self.schema = None
+        self.handler = None
+        self._events = deque()
+        self._position = None
+        self._include = None
+
+    def iterURL(self, url):
+        url = self.normalizeURL(url)
+        return self.iterResource(self.openResource(url))
+
+    def iterFile(self, file, url=None):
+        if not url:
+            url = ZConfig.loader._url_from_file(file)
+        return self.iterResource(self.createResource(file, url))
+
+    def iterResource(self, resource):
+        """Generate the events for `resource`, closing it when done."""
+        if self.schema is None:
+            section = None
+        else:
+            section = self.createSchemaMatcher()
+        defines = {}
+        parser = ZConfig.cfgparser.ZConfigParser(resource, self, defines)
+        tokens = ZConfig.cfgparser.itertokens(resource.file)
+        stack = []   # [(parser, tokens), ...] for including resources
+        events = self._events
+        try:
+            while 1:
+                for lineno, kind, text, value in tokens:
+                    parser.lineno = lineno
+                    self._position = position = lineno, None, parser.url
+                    if kind == KEY:
+                        if "$" in value:
+                            value = parser.replace(value)
+                        if section is not None:
+                            try:
+                                section.addValue(text, value, position)
+                            except ZConfig.ConfigurationError, e:
+                                parser.error(e[0])
+                        yield VALUE, (text, value), position
+                        continue
+                    elif kind == START:
+                        section = parser.start_section(section, text)
+                    elif kind == END:
+                        section = parser.end_section(section, text)
+                    elif kind == DIRECTIVE:
+                        parser.handle_directive(section, text)
+                        m = ZConfig.cfgparser._keyvalue_rx.match(text)
+                        events.append((DIRECTIVE, m.group('key', 'value'),
+                                       position))
+                    elif kind == MALFORMED:
+                        parser.malformed(text)
+                    while events:
+                        yield events.popleft()
+                    if self._include is not None:
+                        url = self._include
+                        self._include = None
+                        stack.append((parser, tokens))
+                        r = self.openResource(url)
+                        parser = ZConfig.cfgparser.ZConfigParser(
+                            r, self, defines)
+                        tokens = ZConfig.cfgparser.itertokens(r.file)
+                        break
+                else:
+                    if parser.stack:
+                        parser.error("unclosed sections not allowed")
+                    parser.resource.close()
+                    if not stack:
+                        break
+                    parser, tokens = stack.pop()
+        finally:
+            # The resource being read may be an included one that's
+            # not on the stack.
+            parser.resource.close()
+            for including, tokens in stack:
+                including.resource.close()
+            resource.close()
+
+        if section is not None:
+            value = section.finish()
+            self.handler = ZConfig.loader.CompositeHandler(
+                section.handlers, self.schema)
+            yield END, (None, None, value), position
+
+    def createSchemaMatcher(self):
+        return StreamingSchemaMatcher(self.schema)
+
+    # config parser support API
+
+    def startSection(self, parent, type, name):
+        self._events.append((START, (type, name), self._position))
+        if self.schema is None:
+            return None
+        return ZConfig.loader.ConfigLoader.startSection(
+            self, parent, type, name)
+
+    def endSection(self, parent, type, name, matcher):
+        value = None
+        if matcher is not None:
+            value = matcher.finish()
+            st = matcher.type
+            try:
+                value = st.datatype(value)
+            except ValueError, e:
+                raise ZConfig.DataConversionError(e, value, self._position)
+            # The section is recorded as present, but its value is not
+            # kept by the parent.
+            parent.addSection(type, name, value)
+            ci = parent.type.getsectioninfo(type, name)
+            if ci.handler is not None:
+                parent.handlers.append((ci.handler, value))
+        self._events.append((END, (type, name, value), self._position))
+
+    def importSchemaComponent(self, pkgname):
+        if self.schema is not None:
+            ZConfig.loader.ConfigLoader.importSchemaComponent(self, pkgname)
+
+    def includeConfiguration(self, section, url, defines):
+        self._include = self.normalizeURL(url)
+
+
+class StreamingMatcherMixin:
+    """Matcher support that doesn't keep the values of sections.
+
+    The values of sections are replaced by placeholders so the number
+    of occurrences can still be checked; the section attributes of the
+    result are None for sections and empty lists for multisections.
+    """
+
+    def addSection(self, type, name, sectvalue):
+        ZConfig.matcher.BaseMatcher.addSection(self, type, name, _discarded)
+
+    def createChildMatcher(self, type, name):
+        sm = ZConfig.matcher.BaseMatcher.createChildMatcher(self, type, name)
+        return StreamingSectionMatcher(sm.info, sm.type, sm.name, sm.handlers)
+
+    def constuct(self):
+        values = self._values
+        for name, ci in self.type:
+            if ci.issection():
+                if ci.ismulti():
+                    values[ci.attribute] = []
+                else:
+                    values[ci.attribute] = None
+        # Handlers for sections have been registered by
+        # EventReader.endSection(); keep only those for keys.
+        handlers = self.handlers
+        self.handlers = []
+        try:
+            value = ZConfig.matcher.BaseMatcher.constuct(self)
+        finally:
+            added = self.handlers
+            self.handlers = handlers
+        infos = [ci for name, ci in self.type if ci.handler is not None]
+        for ci, item in zip(infos, added):
+            if not ci.issection():
+                handlers.append(item)
+        return value
+
+
+class StreamingSectionMatcher(StreamingMatcherMixin,
+                              ZConfig.matcher.SectionMatcher):
+    pass
+
+class StreamingSchemaMatcher(StreamingMatcherMixin,
+                             ZConfig.matcher.SchemaMatcher):
+    pass
+
+
+class _Discarded:
+    pass
+
+_discarded = _Discarded()
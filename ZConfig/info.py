@@ -296,7 +296,7 @@ class AbstractType:
 
     def hassubtype(self, name):
         """Return true iff this type has 'name' as a concrete manifestation."""
-        return name in self._subtypes.keys()
+        return self._subtypes.has_key(name)
 
     def getsubtypenames(self):
         """Return the names of all concrete types as a sorted list."""
@@ -309,6 +309,12 @@ class AbstractType:
 
 
 class SectionType:
+
+    # Lookup tables computed from _children on demand; see getkeyinfo().
+    _keyindex = None
+    _arbkeyinfo = None
+    _sectionindex = None
+
     def __init__(self, name, keytype, valuetype, datatype, registry, types):
         # name      - name of the section, or '*' or '+'
         # datatype  - type for the section itself
@@ -357,6 +363,13 @@ class SectionType:
         if key:
             self._keymap[key] = info
         self._children.append((key, info))
+        self._invalidate()
+
+    def _invalidate(self):
+        # Must be called whenever _children is modified.
+        self._keyindex = None
+        self._arbkeyinfo = None
+        self._sectionindex = None
 
     def addkey(self, keyinfo):
         self._add_child(keyinfo.name, keyinfo)
@@ -374,6 +387,32 @@ class SectionType:
         except KeyError:
             raise ZConfig.ConfigurationError("no key matching " + `key`)
 
+    def getkeyinfo(self, key):
+        """Return the (key, info) pair for the child matching a
+        configuration key, or None if no child matches.
+
+        `key` must already have been converted using the keytype.  The
+        child with the same name is returned if there is one, otherwise
+        the child that accepts arbitrary keys ('+'), if any.
+        """
+        if self._keyindex is None:
+            self._buildkeyindex()
+        try:
+            return self._keyindex[key]
+        except KeyError:
+            return self._arbkeyinfo
+
+    def _buildkeyindex(self):
+        index = {}
+        arbkeyinfo = None
+        for key, info in self._children:
+            if key and not index.has_key(key):
+                index[key] = key, info
+            if info.name == "+" and not info.issection():
+                arbkeyinfo = key, info
+        self._keyindex = index
+        self._arbkeyinfo = arbkeyinfo
+
     def getrequiredtypes(self):
         d = {}
         if self.name:
@@ -390,46 +429,72 @@ class SectionType:
         return d.keys()
 
     def getsectioninfo(self, type, name):
-        for key, info in self._children:
-            if key:
-                if key == name:
-                    if not info.issection():
-                        raise ZConfig.ConfigurationError(
-                            "section name %s already in use for key" % key)
-                    st = info.sectiontype
-                    if st.isabstract():
-                        try:
-                            st = st.getsubtype(type)
-                        except ZConfig.ConfigurationError:
-                            raise ZConfig.ConfigurationError(
-                                "section type %s not allowed for name %s"
-                                % (`type`, `key`))
-                    if not st.name == type:
-                        raise ZConfig.ConfigurationError(
-                            "name %s must be used for a %s section"
-                            % (`name`, `st.name`))
-                    return info
-            # else must be a sectiontype or an abstracttype:
-            elif info.sectiontype.name == type:
-                if not (name or info.allowUnnamed()):
-                    raise ZConfig.ConfigurationError(
-                        `type` + " sections must be named")
-                return info
-            elif info.sectiontype.isabstract():
-                st = info.sectiontype
-                if st.name == type:
-                    raise ZConfig.ConfigurationError(
-                        "cannot define section with an abstract type")
+        # The child used is the first (in schema order) that either
+        # has the name `name`, is an unnamed section of type `type`,
+        # or is an unnamed section of an abstract type implemented by
+        # `type`.  The index records the position of each child so the
+        # first of these can be found without scanning all children.
+        if self._sectionindex is None:
+            self._buildsectionindex()
+        bykey, bytype, abstract = self._sectionindex
+        found = None
+        if name:
+            found = bykey.get(name)
+        match = bytype.get(type)
+        if match is not None and (found is None or match[0] < found[0]):
+            found = match
+        for match in abstract:
+            if found is not None and match[0] > found[0]:
+                break
+            # subtypes can be added after the index is built, so these
+            # are checked each time
+            if match[2].sectiontype.hassubtype(type):
+                found = match
+                break
+        if found is None:
+            raise ZConfig.ConfigurationError(
+                "no matching section defined for type='%s', name='%s'" % (
+                type, name))
+        pos, key, info = found
+        if key:
+            if not info.issection():
+                raise ZConfig.ConfigurationError(
+                    "section name %s already in use for key" % key)
+            st = info.sectiontype
+            if st.isabstract():
                 try:
                     st = st.getsubtype(type)
                 except ZConfig.ConfigurationError:
-                    # not this one; maybe a different one
-                    pass
-                else:
-                    return info
-        raise ZConfig.ConfigurationError(
-            "no matching section defined for type='%s', name='%s'" % (
-            type, name))
+                    raise ZConfig.ConfigurationError(
+                        "section type %s not allowed for name %s"
+                        % (`type`, `key`))
+            if not st.name == type:
+                raise ZConfig.ConfigurationError(
+                    "name %s must be used for a %s section"
+                    % (`name`, `st.name`))
+        elif info.sectiontype.name == type:
+            if not (name or info.allowUnnamed()):
+                raise ZConfig.ConfigurationError(
+                    `type` + " sections must be named")
+        return info
+
+    def _buildsectionindex(self):
+        bykey = {}     # {key: (position, key, info)}
+        bytype = {}    # {type name: (position, None, info)}
+        abstract = []  # [(position, None, info), ...]
+        for i in range(len(self._children)):
+            key, info = self._children[i]
+            if key:
+                if not bykey.has_key(key):
+                    bykey[key] = i, key, info
+            else:
+                # must be a sectiontype or an abstracttype:
+                st = info.sectiontype
+                if not bytype.has_key(st.name):
+                    bytype[st.name] = i, None, info
+                if st.isabstract():
+                    abstract.append((i, None, info))
+        self._sectionindex = bykey, bytype, abstract
 
     def isabstract(self):
         return False
@@ -491,6 +556,7 @@ class SchemaType(SectionType):
                 info = copy.copy(info)
                 info.computedefault(t.keytype)
                 t._children[i] = (key, info)
+        t._invalidate()
         return t
 
     def addComponent(self, name):
@@ -511,4 +577,5 @@ def createDerivedSchema(base):
     new._attrmap.update(base._attrmap)
     new._keymap.update(base._keymap)
     new._types.update(base._types)
+    new._invalidate()
     return new
@@ -14,9 +14,11 @@
 """Schema loader utility."""
 
 import cStringIO
+import imp
 import os.path
 import re
 import sys
+import time
 import urllib
 import urllib2
 
@@ -28,6 +30,12 @@ import ZConfig.matcher
 import ZConfig.schema
 import ZConfig.url
 
+try:
+    from hashlib import sha1
+except ImportError:
+    # Python 2.4
+    from sha import new as sha1
+
 
 def loadSchema(url):
     return SchemaLoader().loadURL(url)
@@ -35,25 +43,45 @@ def loadSchema(url):
 def loadSchemaFile(file, url=None):
     return SchemaLoader().loadFile(file, url)
 
-def loadConfig(schema, url, overrides=()):
-    return _get_config_loader(schema, overrides).loadURL(url)
+def loadConfig(schema, url, overrides=(), lazy=False, compact=False):
+    loader = _get_config_loader(schema, overrides, lazy, compact)
+    return loader.loadURL(url)
 
-def loadConfigFile(schema, file, url=None, overrides=()):
-    return _get_config_loader(schema, overrides).loadFile(file, url)
+def loadConfigFile(schema, file, url=None, overrides=(), lazy=False,
+                   compact=False):
+    loader = _get_config_loader(schema, overrides, lazy, compact)
+    return loader.loadFile(file, url)
 
 
-def _get_config_loader(schema, overrides):
+def _get_config_loader(schema, overrides, lazy=False, compact=False):
     if overrides:
         from ZConfig import cmdline
-        loader = cmdline.ExtendedConfigLoader(schema)
+        loader = cmdline.ExtendedConfigLoader(schema, lazy, compact)
         for opt in overrides:
             loader.addOption(opt)
     else:
-        loader = ConfigLoader(schema)
+        loader = ConfigLoader(schema, lazy, compact)
     return loader
 
 
 class BaseLoader:
+
+    # A ZConfig.resourcecache.ResourceCache used for remote resources,
+    # or None.
+    resource_cache = None
+
+    # A ZConfig.transport.HTTPTransport used to fetch remote resources
+    # that aren't cached, or None to use urllib2.
+    transport = None
+
+    # Set to true to make the loader fail when it next opens a
+    # resource; used to cancel loads running in other threads.
+    cancelled = False
+
+    # Tracer notified as each resource is opened, parsed and matched,
+    # or None; see ZConfig.trace.
+    tracer = None
+
     def __init__(self):
         pass
 
@@ -84,20 +112,31 @@ class BaseLoader:
             "BaseLoader.loadResource() must be overridden by a subclass")
 
     def openResource(self, url):
+        if self.tracer is None:
+            return self._openResource(url)
+        t0 = time.time()
+        try:
+            return self._openResource(url)
+        finally:
+            self.tracer.span("open", t0, time.time(), str(url))
+
+    def _openResource(self, url):
         # ConfigurationError exceptions raised here should be
         # str()able to generate a message for an end user.
-        #
-        # XXX This should be replaced to use a local cache for remote
-        # resources.  The policy needs to support both re-retrieve on
-        # change and provide the cached resource when the remote
-        # resource is not accessible.
         url = str(url)
+        if self.cancelled:
+            raise ZConfig.ConfigurationError("loading cancelled", url)
         if url.startswith("package:"):
             _, package, filename = url.split(":", 2)
             file = openPackageResource(package, filename)
         else:
             try:
-                file = urllib2.urlopen(url)
+                if self.resource_cache is not None:
+                    file = self.resource_cache.urlopen(url)
+                elif self.transport is not None:
+                    file = self.transport.urlopen(url)
+                else:
+                    file = urllib2.urlopen(url)
             except urllib2.URLError, e:
                 # urllib2.URLError has a particularly hostile str(), so we
                 # generally don't want to pass it along to the user.
@@ -154,12 +193,8 @@ def openPackageResource(package, path):
     try:
         loader = pkg.__loader__
     except AttributeError:
-        relpath = os.path.join(*path.split("/"))
-        for dir in pkg.__path__:
-            filename = os.path.join(dir, relpath)
-            if os.path.exists(filename):
-                break
-        else:
+        filename = _findPackageResource(pkg, path)
+        if filename is None:
             raise ZConfig.SchemaResourceError("schema component not found",
                                               filename=path,
                                               package=package,
@@ -172,6 +207,37 @@ def openPackageResource(package, path):
         return cStringIO.StringIO(loader.get_data(loadpath))
 
 
+def _findPackageResource(pkg, path):
+    relpath = os.path.join(*path.split("/"))
+    for dir in pkg.__path__:
+        filename = os.path.join(dir, relpath)
+        if os.path.exists(filename):
+            return filename
+    return None
+
+
+def resourceFilename(url):
+    """Return the local filename for the resource at `url`, or None.
+
+    None is returned for remote resources and for package resources
+    that are not stored as plain files (such as those in ZIP archives).
+    """
+    url = str(url)
+    if url[:7].lower() == "file://":
+        return urllib.url2pathname(url[7:])
+    if url.startswith("package:"):
+        _, package, path = url.split(":", 2)
+        try:
+            __import__(package)
+        except ImportError:
+            return None
+        pkg = sys.modules[package]
+        if hasattr(pkg, "__loader__") or not hasattr(pkg, "__path__"):
+            return None
+        return _findPackageResource(pkg, path)
+    return None
+
+
 def _url_from_file(file):
     name = getattr(file, "name", None)
     if name and name[0] != "<" and name[-1] != ">":
@@ -181,21 +247,96 @@ def _url_from_file(file):
 
 
 class SchemaLoader(BaseLoader):
-    def __init__(self, registry=None):
+
+    # The ZConfig.prefetch.ComponentPrefetcher used while a schema is
+    # being loaded with prefetching enabled, or None.
+    prefetcher = None
+
+    def __init__(self, registry=None, cache=None, prefetch=0):
         if registry is None:
             registry = ZConfig.datatypes.Registry()
         BaseLoader.__init__(self)
         self.registry = registry
+        self.cache = cache
+        # number of threads used to fetch components, or 0
+        self.prefetch = prefetch
         self._cache = {}
+        # Dependency records for each schema loaded through the
+        # persistent cache, and a stack of lists of records for the
+        # schemas currently being parsed.
+        self._dependencies = {}
+        self._recording = []
 
     def loadResource(self, resource):
+        if (self.prefetch and self.prefetcher is None
+            and not imp.lock_held()):
+            # Workers import packages; that would deadlock if this
+            # thread (or another waiting for it) holds the import lock.
+            import ZConfig.prefetch
+            self.prefetcher = ZConfig.prefetch.ComponentPrefetcher(
+                self, self.prefetch)
+            try:
+                return self._loadResource(resource)
+            finally:
+                self.prefetcher.close()
+                self.prefetcher = None
+        return self._loadResource(resource)
+
+    def _loadResource(self, resource):
         if resource.url and self._cache.has_key(resource.url):
             schema = self._cache[resource.url]
+            if self._recording:
+                self._recordDependencies(
+                    self._dependencies.get(resource.url, ()))
+        elif resource.url and self.cache is not None:
+            schema = self._loadCachedResource(resource)
+            self._cache[resource.url] = schema
         else:
             schema = ZConfig.schema.parseResource(resource, self)
             self._cache[resource.url] = schema
         return schema
 
+    def openResource(self, url):
+        resource = BaseLoader.openResource(self, url)
+        if self._recording:
+            # Read the content now so the exact data that gets parsed
+            # is recorded as a dependency of the schema.
+            try:
+                data = resource.read()
+            finally:
+                resource.close()
+            self._recordDependencies([self.cache.describe(url, data)])
+            resource = self.createResource(cStringIO.StringIO(data), url)
+        return resource
+
+    def _loadCachedResource(self, resource):
+        url = resource.url
+        data = resource.read()
+        dependency = self.cache.describe(url, data)
+        entry = self.cache.load(url, dependency, self)
+        if entry is None:
+            self._recording.append([dependency])
+            try:
+                schema = ZConfig.schema.parseResource(
+                    self.createResource(cStringIO.StringIO(data), url), self)
+            finally:
+                dependencies = self._recording.pop()
+            self.cache.store(url, dependencies, schema, self.registry)
+        else:
+            schema, dependencies = entry
+        self._dependencies[url] = dependencies
+        if self._recording:
+            self._recordDependencies(dependencies)
+        return schema
+
+    def _recordDependencies(self, dependencies):
+        current = self._recording[-1]
+        known = [dep[0] for dep in current]
+        for dep in dependencies:
+            if dep[0] not in known:
+                current.append(dep)
+                known.append(dep[0])
+
     # schema parser support API
 
     def schemaComponentSource(self, package, file):
@@ -224,23 +365,69 @@ class SchemaLoader(BaseLoader):
 
 
 class ConfigLoader(BaseLoader):
-    def __init__(self, schema):
+
+    # The ZConfig.prefetch.IncludePrefetcher used while a configuration
+    # is being loaded with prefetching enabled, or None.
+    prefetcher = None
+
+    # The parser for the resource being parsed, when tracing.
+    _parser = None
+
+    def __init__(self, schema, lazy=False, compact=False, parse_cache=None,
+                 prefetch=0):
         if schema.isabstract():
             raise ZConfig.SchemaError(
                 "cannot check a configuration an abstract type")
         BaseLoader.__init__(self)
         self.schema = schema
+        self.lazy = lazy
+        self.compact = compact
+        if parse_cache is None:
+            # Resources included more than once are only tokenized once
+            # by this loader.
+            parse_cache = ParseCache()
+        self.parse_cache = parse_cache
+        # number of threads used to fetch included resources, or 0
+        self.prefetch = prefetch
         self._private_schema = False
 
     def loadResource(self, resource):
+        if self.prefetch and self.prefetcher is None:
+            import ZConfig.prefetch
+            self.prefetcher = ZConfig.prefetch.IncludePrefetcher(
+                self, self.prefetch)
+            try:
+                return self._loadResource(resource)
+            finally:
+                self.prefetcher.close()
+                self.prefetcher = None
+        return self._loadResource(resource)
+
+    def _loadResource(self, resource):
         sm = self.createSchemaMatcher()
+        sm.lazy = self.lazy
+        sm.compact = self.compact
+        sm.tracer = self.tracer
         self._parse_resource(sm, resource)
-        result = sm.finish(), CompositeHandler(sm.handlers, self.schema)
-        return result
+        if self.tracer is None:
+            value = sm.finish()
+        else:
+            t0 = time.time()
+            value = sm.finish()
+            self.tracer.span("section", t0, time.time(), resource.url)
+        return value, CompositeHandler(sm.handlers, self.schema)
 
     def createSchemaMatcher(self):
         return ZConfig.matcher.SchemaMatcher(self.schema)
 
+    def createSchemaLoader(self):
+        # Loader for the components named by %import directives.
+        loader = SchemaLoader(self.schema.registry)
+        loader.resource_cache = self.resource_cache
+        loader.transport = self.transport
+        loader.tracer = self.tracer
+        return loader
+
     # config parser support API
 
     def startSection(self, parent, type, name):
@@ -252,14 +439,20 @@ class ConfigLoader(BaseLoader):
         return parent.createChildMatcher(t, name)
 
     def endSection(self, parent, type, name, matcher):
-        sectvalue = matcher.finish()
+        if self.tracer is None:
+            sectvalue = matcher.finish()
+        else:
+            t0 = time.time()
+            sectvalue = matcher.finish()
+            self.tracer.span("section", t0, time.time(), self._parser.url,
+                             self._parser.lineno, type, name)
         parent.addSection(type, name, sectvalue)
 
     def importSchemaComponent(self, pkgname):
         schema = self.schema
         if not self._private_schema:
             # replace the schema with an extended schema on the first %import
-            self._loader = SchemaLoader(self.schema.registry)
+            self._loader = self.createSchemaLoader()
             schema = ZConfig.info.createDerivedSchema(self.schema)
             self._private_schema = True
             self.schema = schema
@@ -275,6 +468,18 @@ class ConfigLoader(BaseLoader):
 
     def includeConfiguration(self, section, url, defines):
         url = self.normalizeURL(url)
+        if self.prefetcher is not None:
+            fetched = self.prefetcher.get(url)
+            if fetched is not None:
+                data, key, tokens = fetched
+                if self.parse_cache.get(key) is None:
+                    self.parse_cache[key] = tokens
+                r = self.createResource(cStringIO.StringIO(data), url)
+                try:
+                    self._parse_resource(section, r, defines)
+                finally:
+                    r.close()
+                return
         r = self.openResource(url)
         try:
             self._parse_resource(section, r, defines)
@@ -284,8 +489,67 @@ class ConfigLoader(BaseLoader):
     # internal helper
 
     def _parse_resource(self, matcher, resource, defines=None):
+        if self.tracer is None:
+            self._parse_tokens(matcher, resource, defines)
+            return
+        previous = self._parser
+        t0 = time.time()
+        try:
+            self._parse_tokens(matcher, resource, defines)
+        finally:
+            self._parser = previous
+            self.tracer.span("parse", t0, time.time(), resource.url,
+                             type="config")
+
+    def _parse_tokens(self, matcher, resource, defines):
+        # The tokens for a resource don't depend on the defines in
+        # effect, so they can be replayed wherever the same text is
+        # included.
+        data = resource.read()
+        key = _parse_key(resource.url, data)
+        tokens = self.parse_cache.get(key)
+        if tokens is None:
+            tokens = ZConfig.cfgparser.tokenize(data)
+            self.parse_cache[key] = tokens
+        if self.prefetcher is not None:
+            self.prefetcher.scan(resource.url, tokens)
         parser = ZConfig.cfgparser.ZConfigParser(resource, self, defines)
-        parser.parse(matcher)
+        if self.tracer is not None:
+            self._parser = parser
+        parser.replay(tokens, matcher)
+
+
+def _parse_key(url, data):
+    # Key for the tokens of `data` in a parse cache.
+    if isinstance(data, unicode):
+        digest = sha1(data.encode("utf-8")).hexdigest()
+    else:
+        digest = sha1(data).hexdigest()
+    return url, digest
+
+
+class ParseCache:
+    """Tokens of configuration resources, for use by ConfigLoader.
+
+    Only the tokens for the latest content of each URL are kept, so a
+    cache shared by the loads of a long-running process doesn't grow
+    as the resources are edited.
+    """
+
+    def __init__(self):
+        self._entries = {}   # url -> (key, tokens)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key[0])
+        if entry is None or entry[0] != key:
+            return default
+        return entry[1]
+
+    def __setitem__(self, key, tokens):
+        self._entries[key[0]] = key, tokens
 
 
 class CompositeHandler:
@@ -293,8 +557,21 @@ class CompositeHandler:
     def __init__(self, handlers, schema):
         self._handlers = handlers
         self._convert = schema.registry.get("basic-key")
-
-    def __call__(self, handlermap):
+        # indexes of the entries of _handlers whose values are the same
+        # as in a previous configuration; see compareWith()
+        self._unchanged = {}
+
+    def __call__(self, handlermap, changed_only=False):
+        """Call the handlers in `handlermap` with their values.
+
+        If `changed_only` is true, handlers are only called for values
+        that differ from those of the configuration passed to
+        compareWith().
+        """
+        handlers = self._handlers
+        if changed_only:
+            handlers = [item for i, item in enumerate(handlers)
+                        if not self._unchanged.has_key(i)]
         d = {}
         for name, callback in handlermap.items():
             n = self._convert(name)
@@ -304,13 +581,13 @@ class CompositeHandler:
                     + `name`)
             d[n] = callback
         L = []
-        for handler, value in self._handlers:
+        for handler, value in handlers:
             if not d.has_key(handler):
                 L.append(handler)
         if L:
             raise ZConfig.ConfigurationError(
                 "undefined handlers: " + ", ".join(L))
-        for handler, value in self._handlers:
+        for handler, value in handlers:
             f = d[handler]
             if f is not None:
                 f(value)
@@ -318,6 +595,42 @@ class CompositeHandler:
     def __len__(self):
         return len(self._handlers)
 
+    def compareWith(self, previous):
+        """Note which handler values are unchanged from `previous`.
+
+        `previous` is the CompositeHandler of an earlier load of the
+        same configuration.  A value is unchanged if the same handler
+        had an identical or equal value in that configuration.
+        """
+        values = {}
+        for handler, value in previous._handlers:
+            values.setdefault(handler, []).append(value)
+        self._unchanged = {}
+        for i, (handler, value) in enumerate(self._handlers):
+            L = values.get(handler, ())
+            for j, old in enumerate(L):
+                if old is value or _equal(old, value):
+                    del L[j]
+                    self._unchanged[i] = True
+                    break
+
+    def getChangedHandlers(self):
+        """Return the names of handlers with changed values, in order."""
+        L = []
+        for i, (handler, value) in enumerate(self._handlers):
+            if not self._unchanged.has_key(i) and handler not in L:
+                L.append(handler)
+        return L
+
+
+def _equal(a, b):
+    # Values are arbitrary application objects; comparing them must
+    # not fail.
+    try:
+        return bool(a == b)
+    except Exception:
+        return False
+
 
 class Resource:
     def __init__(self, file, url):
@@ -13,12 +13,27 @@
 ##############################################################################
 """Utility that manages the binding of configuration data to a section."""
 
+import time
+
 import ZConfig
 
 from ZConfig.info import ValueInfo
 
 
 class BaseMatcher:
+
+    # If true, key values are converted when first accessed on the
+    # SectionValue rather than when the section is finished.
+    lazy = False
+
+    # If true, sections are represented by CompactSectionValue objects
+    # which don't keep a reference to the matcher.
+    compact = False
+
+    # Tracer notified of each datatype conversion, or None; see
+    # ZConfig.trace.
+    tracer = None
+
     def __init__(self, info, type, handlers):
         self.info = info
         self.type = type
@@ -33,6 +48,7 @@ class BaseMatcher:
             assert info.attribute is not None
             self._values[info.attribute] = v
         self._sectionnames = {}
+        self._pending = {}
         if handlers is None:
             handlers = []
         self.handlers = handlers
@@ -65,18 +81,11 @@ class BaseMatcher:
             realkey = self.type.keytype(key)
         except ValueError, e:
             raise ZConfig.DataConversionError(e, key, position)
-        arbkey_info = None
-        for i in range(len(self.type)):
-            k, ci = self.type[i]
-            if k == realkey:
-                break
-            if ci.name == "+" and not ci.issection():
-                arbkey_info = k, ci
-        else:
-            if arbkey_info is None:
-                raise ZConfig.ConfigurationError(
-                    `key` + " is not a known key name")
-            k, ci = arbkey_info
+        keyinfo = self.type.getkeyinfo(realkey)
+        if keyinfo is None:
+            raise ZConfig.ConfigurationError(
+                `key` + " is not a known key name")
+        k, ci = keyinfo
         if ci.issection():
             if ci.name:
                 extra = " in %s sections" % `self.type.name`
@@ -127,7 +136,11 @@ class BaseMatcher:
             raise ZConfig.ConfigurationError(
                 "%s is not an allowed name for %s sections"
                 % (`name`, `ci.sectiontype.name`))
-        return SectionMatcher(ci, type, name, self.handlers)
+        matcher = SectionMatcher(ci, type, name, self.handlers)
+        matcher.lazy = self.lazy
+        matcher.compact = self.compact
+        matcher.tracer = self.tracer
+        return matcher
 
     def finish(self):
         """Check the constraints of the section and convert to an application
@@ -178,53 +191,66 @@ class BaseMatcher:
         for name, ci in self.type:
             assert ci.attribute is not None
             attr = ci.attribute
-            if ci.ismulti():
-                if ci.issection():
+            if ci.issection():
+                if ci.ismulti():
                     v = []
                     for s in values[attr]:
                         if s is not None:
-                            st = s.getSectionDefinition()
-                            try:
-                                s = st.datatype(s)
-                            except ValueError, e:
-                                raise ZConfig.DataConversionError(
-                                    e, s, (-1, -1, None))
+                            s = self.convertSection(s)
                         v.append(s)
-                elif ci.name == '+':
-                    v = values[attr]
-                    for key, val in v.items():
-                        v[key] = [vi.convert(ci.datatype) for vi in val]
-                else:
-                    v = [vi.convert(ci.datatype) for vi in values[attr]]
-            elif ci.issection():
-                if values[attr] is not None:
-                    st = values[attr].getSectionDefinition()
-                    try:
-                        v = st.datatype(values[attr])
-                    except ValueError, e:
-                        raise ZConfig.DataConversionError(
-                            e, values[attr], (-1, -1, None))
+                elif values[attr] is not None:
+                    v = self.convertSection(values[attr])
                 else:
                     v = None
-            elif name == '+':
-                v = values[attr]
-                if not v:
-                    for key, val in ci.getdefault().items():
-                        v[key] = val.convert(ci.datatype)
-                else:
-                    for key, val in v.items():
-                        v[key] = val.convert(ci.datatype)
+            elif self.lazy and ci.handler is None:
+                # converted by the SectionValue when first used
+                self._pending[attr] = name, ci, values.pop(attr)
+                continue
+            elif self.tracer is not None:
+                v = self.traceConversion(name, ci, values[attr])
             else:
-                v = values[attr]
-                if v is not None:
-                    v = v.convert(ci.datatype)
+                v = convertValue(name, ci, values[attr])
             values[attr] = v
             if ci.handler is not None:
                 self.handlers.append((ci.handler, v))
         return self.createValue()
 
+    def convertSection(self, sectvalue):
+        """Apply the datatype of a section's type to the section value."""
+        st = sectvalue.getSectionDefinition()
+        if self.tracer is not None:
+            t0 = time.time()
+        try:
+            try:
+                return st.datatype(sectvalue)
+            except ValueError, e:
+                raise ZConfig.DataConversionError(
+                    e, sectvalue, (-1, -1, None))
+        finally:
+            if self.tracer is not None:
+                self.tracer.span(
+                    "convert", t0, time.time(), type=st.name,
+                    datatype=st.registry.getName(st.datatype))
+
+    def traceConversion(self, name, info, value):
+        """Convert a key's value(s) with convertValue(), timing it."""
+        url, line = _position(value)
+        t0 = time.time()
+        try:
+            return convertValue(name, info, value)
+        finally:
+            self.tracer.span(
+                "convert", t0, time.time(), url, line, self.type.name, name,
+                self.type.registry.getName(info.datatype))
+
     def createValue(self):
-        return SectionValue(self._values, None, self)
+        return self.createSectionValue(None)
+
+    def createSectionValue(self, name):
+        if self.compact:
+            return createCompactValue(self.type, self._values, name,
+                                      self._pending)
+        return SectionValue(self._values, name, self, self._pending)
 
 
 class SectionMatcher(BaseMatcher):
@@ -237,7 +263,7 @@ class SectionMatcher(BaseMatcher):
         BaseMatcher.__init__(self, info, type, handlers)
 
     def createValue(self):
-        return SectionValue(self._values, self.name, self)
+        return self.createSectionValue(self.name)
 
 
 class SchemaMatcher(BaseMatcher):
@@ -254,18 +280,96 @@ class SchemaMatcher(BaseMatcher):
         return v
 
 
+def convertValue(name, info, value):
+    """Convert the value(s) collected for the key `info`.
+
+    `name` is the key name from the schema, and `value` is a ValueInfo
+    object, a list of them, or a mapping of keys to either.
+    """
+    if info.ismulti():
+        if info.name == '+':
+            v = {}
+            for key, val in value.items():
+                v[key] = [vi.convert(info.datatype) for vi in val]
+        else:
+            v = [vi.convert(info.datatype) for vi in value]
+    elif name == '+':
+        if not value:
+            value = info.getdefault()
+        v = {}
+        for key, val in value.items():
+            v[key] = val.convert(info.datatype)
+    else:
+        v = value
+        if v is not None:
+            v = v.convert(info.datatype)
+    return v
+
+
+def _position(value):
+    # Return (url, line) of the first ValueInfo found in `value`, as
+    # passed to convertValue(), or (None, None).
+    while 1:
+        if isinstance(value, dict):
+            value = value.values()
+        if isinstance(value, list) and value:
+            value = value[0]
+        else:
+            break
+    if isinstance(value, ValueInfo) and value.position:
+        lineno, colno, url = value.position
+        return url, lineno
+    return None, None
+
+
+def validate(section):
+    """Convert all values of `section` not yet converted, including
+    those of nested sections.
+
+    This is a function rather than a method of section objects so it
+    doesn't take over a name schemas may use for attributes.
+    DataConversionError is raised for the first value that cannot be
+    converted.
+    """
+    for attr in section.getSectionAttributes():
+        v = getattr(section, attr)
+        if not isinstance(v, list):
+            v = [v]
+        for item in v:
+            if isinstance(item, (SectionValue, CompactSectionValue)):
+                validate(item)
+
+
 class SectionValue:
     """Generic 'bag-of-values' object for a section.
 
     Derived classes should always call the SectionValue constructor
     before attempting to modify self.
+
+    `pending` maps attribute names to (name, info, value) tuples for
+    keys that have not been converted yet; these are converted using
+    convertValue() when first accessed.
     """
 
-    def __init__(self, values, name, matcher):
+    def __init__(self, values, name, matcher, pending=None):
         self.__dict__.update(values)
         self._name = name
         self._matcher = matcher
-        self._attributes = tuple(values.keys())
+        attributes = values.keys()
+        if pending:
+            self._pending = pending
+            attributes.extend(pending.keys())
+        self._attributes = tuple(attributes)
+
+    def __getattr__(self, name):
+        # Only called for attributes not found in the instance dict.
+        pending = self.__dict__.get("_pending")
+        if pending and pending.has_key(name):
+            v = convertValue(*pending[name])
+            self.__dict__[name] = v
+            del pending[name]
+            return v
+        raise AttributeError(name)
 
     def __repr__(self):
         if self._name:
@@ -280,6 +384,9 @@ class SectionValue:
     def __str__(self):
         l = []
         attrnames = [s for s in self.__dict__.keys() if s[0] != "_"]
+        for k in self.__dict__.get("_pending", {}).keys():
+            if k not in attrnames:
+                attrnames.append(k)
         attrnames.sort()
         for k in attrnames:
             v = getattr(self, k)
@@ -300,3 +407,94 @@ class SectionValue:
 
     def getSectionAttributes(self):
         return self._attributes
+
+
+class CompactSectionValue(object):
+    """Memory-efficient alternative to SectionValue.
+
+    Instances store values in slots instead of an instance dictionary,
+    and do not keep a reference to the matcher that created them, so
+    getSectionMatcher() returns None.  Attributes not defined by the
+    schema cannot be added.  The classes used for specific sections
+    are created by createCompactValue().
+    """
+
+    __slots__ = '_name', '_type', '_pending'
+    _attributes = ()
+
+    def __getattr__(self, name):
+        # Only called for attributes with no value in their slot.
+        pending = self._pending
+        if pending and pending.has_key(name):
+            v = convertValue(*pending[name])
+            setattr(self, name, v)
+            del pending[name]
+            return v
+        raise AttributeError(name)
+
+    def __repr__(self):
+        if self._name:
+            name = `self._name`
+        else:
+            name = "at %#x" % id(self)
+        clsname = self.__class__.__name__
+        return "<%s for %s %s>" % (clsname, self._type.name, name)
+
+    def __str__(self):
+        l = []
+        attrnames = list(self._attributes)
+        attrnames.sort()
+        for k in attrnames:
+            v = getattr(self, k)
+            l.append('%-40s: %s' % (k, v))
+        return '\n'.join(l)
+
+    def getSectionName(self):
+        return self._name
+
+    def getSectionType(self):
+        return self._type.name
+
+    def getSectionDefinition(self):
+        return self._type
+
+    def getSectionMatcher(self):
+        return None
+
+    def getSectionAttributes(self):
+        return self._attributes
+
+
+_compact_classes = {}   # {attribute names: class}
+
+def createCompactValue(sectiontype, values, name, pending=None):
+    """Return a CompactSectionValue for a section of type `sectiontype`.
+
+    One class is created for each set of attribute names; all section
+    types with the same attributes share it.  SchemaError is raised if
+    an attribute name is used by CompactSectionValue itself, since the
+    slot would hide it.
+    """
+    attributes = values.keys()
+    if pending:
+        attributes.extend(pending.keys())
+    attributes.sort()
+    attributes = tuple(attributes)
+    cls = _compact_classes.get(attributes)
+    if cls is None:
+        for attr in attributes:
+            if hasattr(CompactSectionValue, attr):
+                raise ZConfig.SchemaError(
+                    "attribute name %s of section type %s is reserved"
+                    " for compact section values"
+                    % (`attr`, `sectiontype.name`))
+        cls = type("CompactSectionValue", (CompactSectionValue,),
+                    {"__slots__": attributes, "_attributes": attributes})
+        _compact_classes[attributes] = cls
+    ob = cls()
+    ob._name = name
+    ob._type = sectiontype
+    ob._pending = pending or None
+    for attr, v in values.items():
+        setattr(ob, attr, v)
+    return ob
@@ -0,0 +1,235 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Fetching of schema components and included resources in worker threads.
+
+A ComponentPrefetcher imports the package of each scheduled component,
+reads the component, and records its SAX events in a pool of threads.
+The schema parser replays the recorded events when it reaches the
+<import> element, so components are still added to the schema in
+document order.  Imports found in a component are scheduled as soon as
+they're seen.
+
+An IncludePrefetcher reads and tokenizes the resources named by the
+%include directives of a configuration resource.  Only directives that
+don't use substitutions are scheduled, since the defines in effect
+aren't known until the resource is processed.  The configuration
+loader still processes each resource when its %include is reached.
+
+Anything that goes wrong in a worker is ignored; the loader then
+fetches the resource itself, reporting errors exactly as it would
+without prefetching.
+"""
+
+import Queue
+import threading
+
+import ZConfig.cfgparser
+import ZConfig.loader
+import ZConfig.schema
+import ZConfig.url
+
+
+class Prefetcher:
+    """Pool of threads fetching resources identified by URL.
+
+    Subclasses implement _fetch(job), setting attributes of the job on
+    success.
+    """
+
+    def __init__(self, loader, threads=4):
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._jobs = {}   # url -> _Job
+        self._closed = False
+        self._queue = Queue.Queue()
+        self._threads = []
+        for i in range(threads):
+            t = threading.Thread(target=self._run,
+                                 name="ZConfig prefetch")
+            t.setDaemon(True)
+            t.start()
+            self._threads.append(t)
+
+    def close(self):
+        """Stop the worker threads, abandoning unfinished work."""
+        self._lock.acquire()
+        try:
+            self._closed = True
+        finally:
+            self._lock.release()
+        for t in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _schedule(self, job):
+        self._lock.acquire()
+        try:
+            if self._closed or self._jobs.has_key(job.url):
+                return
+            self._jobs[job.url] = job
+        finally:
+            self._lock.release()
+        self._queue.put(job)
+
+    def _wait(self, url):
+        # Return the finished job for `url`, or None if the caller
+        # should fetch the resource itself.
+        if self.loader.cancelled:
+            # Let the loader report it.
+            return None
+        self._lock.acquire()
+        try:
+            job = self._jobs.get(url)
+            if job is None:
+                return None
+            if not job.started:
+                # Not worth waiting for; later requests for the same
+                # resource won't wait either.
+                job.started = True
+                job.done.set()
+                return None
+        finally:
+            self._lock.release()
+        job.done.wait()
+        if job.failed:
+            return None
+        return job
+
+    def _run(self):
+        while 1:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._lock.acquire()
+            try:
+                if job.started or self._closed:
+                    continue
+                job.started = True
+            finally:
+                self._lock.release()
+            try:
+                try:
+                    self._fetch(job)
+                    job.failed = False
+                except Exception:
+                    pass
+            finally:
+                job.done.set()
+
+
+class ComponentPrefetcher(Prefetcher):
+
+    def schedule(self, package, file):
+        """Start fetching the component `file` from `package`."""
+        url = "package:%s:%s" % (package, file or "component.xml")
+        self._schedule(_Job(url, package=package, file=file))
+
+    def get(self, url):
+        """Return (events, systemid) for the component `url`, or None.
+
+        None is returned if the component wasn't scheduled, fetching
+        it failed, or no worker has started on it yet; the caller
+        should load the component itself.
+        """
+        job = self._wait(url)
+        if job is None:
+            return None
+        loader = self.loader
+        if loader._recording:
+            loader._recordDependencies([loader.cache.describe(url, job.data)])
+            # The resource would have been read into memory, so the
+            # parser would have had no system ID.
+            return job.events, None
+        return job.events, job.systemid
+
+    def _fetch(self, job):
+        loader = self.loader
+        loader.schemaComponentSource(job.package, job.file)
+        # The base implementation avoids recording dependencies from
+        # this thread; see get().
+        r = ZConfig.loader.BaseLoader.openResource(loader, job.url)
+        try:
+            data = r.read()
+            systemid = ZConfig.schema._systemId(r.file)
+        finally:
+            r.close()
+        job.events = ZConfig.schema.record(data, systemid, self.schedule)
+        job.data = data
+        job.systemid = systemid
+
+
+class IncludePrefetcher(Prefetcher):
+
+    def scan(self, url, tokens):
+        """Schedule the includes found in the tokens of resource `url`."""
+        match = ZConfig.cfgparser._keyvalue_rx.match
+        for lineno, kind, text, value in tokens:
+            if kind != ZConfig.cfgparser.DIRECTIVE:
+                continue
+            m = match(text)
+            if m is None or m.group("key") != "include":
+                continue
+            arg = (m.group("value") or "").strip()
+            if not arg or "$" in arg:
+                continue
+            try:
+                newurl = self.loader.normalizeURL(
+                    ZConfig.url.urljoin(url, arg))
+            except ZConfig.ConfigurationError:
+                continue
+            self._schedule(_Job(newurl))
+
+    def get(self, url):
+        """Return (data, key, tokens) for the resource `url`, or None.
+
+        `key` is the parse cache key for the resource.  None is
+        returned if the resource wasn't scheduled, fetching it failed,
+        or no worker has started on it yet.
+        """
+        job = self._wait(url)
+        if job is None:
+            return None
+        return job.data, job.key, job.tokens
+
+    def _fetch(self, job):
+        r = self.loader.openResource(job.url)
+        try:
+            data = r.read()
+        finally:
+            r.close()
+        key = ZConfig.loader._parse_key(job.url, data)
+        tokens = ZConfig.cfgparser.tokenize(data)
+        self.scan(job.url, tokens)
+        job.data = data
+        job.key = key
+        job.tokens = tokens
+
+
+class _Job:
+
+    started = False
+    failed = True
+    data = None
+    systemid = None
+    events = None
+    key = None
+    tokens = None
+
+    def __init__(self, url, package=None, file=None):
+        self.url = url
+        self.package = package
+        self.file = file
+        self.done = threading.Event()
@@ -0,0 +1,380 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Reloading configurations when the resources they're built from change.
+
+A Reloader loads a schema and a configuration, recording every
+resource read along the way: the schema and the components it imports,
+the configuration itself, included resources, and components imported
+with %import.  reload() checks those resources and loads the
+configuration again only if one of them changed; the schema is only
+loaded again if one of its own resources changed.
+
+Local files are checked using their modification time and size, and
+their content if those changed; other resources are read again and
+their content compared.  The comparison of the old and new
+configurations is returned by reload() as computed by diff().
+
+In incremental mode, each section is identified by a fingerprint of
+its type, name, key/value lines and the fingerprints of the sections
+it contains.  Sections with the same fingerprint as in the previous
+load are not matched again: the previous section value and its
+converted value are re-used.  The composite handler records which
+handler values are unchanged so only the others need to be applied.
+"""
+
+import cStringIO
+
+try:
+    from hashlib import sha1
+except ImportError:
+    # Python 2.4
+    from sha import new as sha1
+
+import ZConfig
+import ZConfig.cmdline
+import ZConfig.loader
+import ZConfig.matcher
+import ZConfig.schemacache
+
+
+class Reloader:
+
+    def __init__(self, schema_url, url, overrides=(), lazy=False,
+                 compact=False, incremental=False):
+        self.schema_url = schema_url
+        self.url = url
+        self.overrides = overrides
+        self.lazy = lazy
+        self.compact = compact
+        self.incremental = incremental
+        self.schema = None
+        self.config = None
+        self.handler = None
+        # MatchMemo for the current configuration in incremental mode
+        self.memo = None
+        # {url: dependency record} for the resources of the schema and
+        # of the configuration
+        self._schema_deps = {}
+        self._config_deps = {}
+
+    def load(self):
+        """Load the schema and configuration; return (config, handler)."""
+        schema, schema_deps = self._loadSchema()
+        config, handler, config_deps, memo = self._loadConfig(schema)
+        self.schema, self._schema_deps = schema, schema_deps
+        self._commit(config, handler, config_deps, memo)
+        return config, handler
+
+    def changed(self):
+        """Return a sorted list of the URLs of resources that changed."""
+        loader = ZConfig.loader.BaseLoader()
+        L = []
+        for deps in self._schema_deps, self._config_deps:
+            for url, dep in deps.items():
+                if url not in L and not ZConfig.schemacache.isCurrent(
+                    dep, loader):
+                    L.append(url)
+        L.sort()
+        return L
+
+    def reload(self):
+        """Reload the configuration if any of its resources changed.
+
+        None is returned if nothing changed.  Otherwise the return
+        value is (config, handler, changes), where changes is the
+        result of diff() for the old and new configurations.  The
+        handler has been compared with the previous one, so calling it
+        with changed_only set only applies changed values.  If
+        loading fails, the exception is propagated and the previous
+        configuration remains current.
+        """
+        changed = self.changed()
+        if not changed:
+            return None
+        schema, schema_deps = self.schema, self._schema_deps
+        for url in changed:
+            if schema_deps.has_key(url):
+                schema, schema_deps = self._loadSchema()
+                break
+        config, handler, config_deps, memo = self._loadConfig(schema)
+        old = self.config
+        handler.compareWith(self.handler)
+        self.schema, self._schema_deps = schema, schema_deps
+        self._commit(config, handler, config_deps, memo)
+        return config, handler, diff(old, config)
+
+    def createSchemaLoader(self):
+        return RecordingSchemaLoader()
+
+    def createConfigLoader(self, schema):
+        loader = RecordingConfigLoader(schema, self.lazy, self.compact)
+        for opt in self.overrides:
+            loader.addOption(opt)
+        return loader
+
+    def _loadSchema(self):
+        loader = self.createSchemaLoader()
+        schema = loader.loadURL(self.schema_url)
+        return schema, loader.dependencies
+
+    def _loadConfig(self, schema):
+        loader = self.createConfigLoader(schema)
+        memo = None
+        if self.incremental:
+            if self.memo is not None and schema is self.schema:
+                memo = MatchMemo(self.memo)
+            else:
+                memo = MatchMemo()
+            loader.memo = memo
+        config, handler = loader.loadURL(self.url)
+        if memo is not None:
+            memo.finish()
+        return config, handler, loader.dependencies, memo
+
+    def _commit(self, config, handler, config_deps, memo):
+        self.config = config
+        self.handler = handler
+        self._config_deps = config_deps
+        self.memo = memo
+
+
+def diff(old, new):
+    """Return a list of the differences between two configurations.
+
+    Each difference is a tuple (path, oldvalue, newvalue), where path
+    is a tuple of attribute names and list indexes leading from the
+    top-level section to the value.  Sections are compared attribute
+    by attribute; sections with different types or names, and other
+    values that don't compare equal, are reported as a whole.  A value
+    missing from one of the configurations is reported as None.
+    """
+    changes = []
+    _diff(old, new, (), changes)
+    return changes
+
+def _diff(old, new, path, changes):
+    if _issection(old) and _issection(new):
+        if (old.getSectionType() != new.getSectionType()
+            or old.getSectionName() != new.getSectionName()):
+            changes.append((path, old, new))
+            return
+        attributes = list(old.getSectionAttributes())
+        for attr in new.getSectionAttributes():
+            if attr not in attributes:
+                attributes.append(attr)
+        attributes.sort()
+        for attr in attributes:
+            _diff(getattr(old, attr, None), getattr(new, attr, None),
+                  path + (attr,), changes)
+    elif isinstance(old, list) and isinstance(new, list):
+        for i in range(max(len(old), len(new))):
+            _diff(_item(old, i), _item(new, i), path + (i,), changes)
+    elif _issection(old) or _issection(new) or old != new:
+        changes.append((path, old, new))
+
+def _issection(ob):
+    return isinstance(ob, (ZConfig.matcher.SectionValue,
+                           ZConfig.matcher.CompactSectionValue))
+
+def _item(L, i):
+    if i < len(L):
+        return L[i]
+    return None
+
+
+class MatchMemo:
+    """Sections built by one load, for re-use by the next."""
+
+    def __init__(self, previous=None):
+        if previous is None:
+            self._previous = {}
+        else:
+            self._previous = previous._sections
+        self._sections = {}   # fingerprint -> _Built
+        self._values = {}     # id(section value) -> _Built
+        self.built = 0
+        self.reused = 0
+
+    def finish(self):
+        # Don't keep the previous load's sections alive.
+        self._previous = {}
+        self._values = {}
+
+    def get(self, fingerprint):
+        """Return the _Built for an unchanged section, or None."""
+        # Each previous section is re-used at most once, so identical
+        # sections don't end up sharing a value.
+        built = self._previous.pop(fingerprint, None)
+        if built is not None:
+            self.reused += 1
+            self._add(fingerprint, built)
+        return built
+
+    def add(self, fingerprint, built):
+        self.built += 1
+        self._add(fingerprint, built)
+
+    def lookup(self, sectvalue):
+        """Return the _Built for a section value of this load, or None."""
+        return self._values.get(id(sectvalue))
+
+    def _add(self, fingerprint, built):
+        if not self._sections.has_key(fingerprint):
+            self._sections[fingerprint] = built
+        self._values[id(built.value)] = built
+
+
+class _Built:
+
+    def __init__(self, fingerprint, value, handlers):
+        self.fingerprint = fingerprint
+        self.value = value
+        self.handlers = handlers
+        # value returned by the datatype of the section type, once
+        # converted
+        self.converted = _marker
+
+
+_marker = object()
+
+
+class IncrementalMatcherMixin:
+    """Matcher support for re-using sections from a previous load."""
+
+    def _initIncremental(self, memo):
+        self.memo = memo
+        self._start = len(self.handlers)
+        self._lines = []
+
+    def addValue(self, key, value, position):
+        ZConfig.matcher.BaseMatcher.addValue(self, key, value, position)
+        self._lines.append(("key", key, value))
+
+    def addSection(self, type, name, sectvalue):
+        ZConfig.matcher.BaseMatcher.addSection(self, type, name, sectvalue)
+        built = self.memo.lookup(sectvalue)
+        self._lines.append(("section", type, name, built.fingerprint))
+
+    def createChildMatcher(self, type, name):
+        sm = ZConfig.matcher.BaseMatcher.createChildMatcher(self, type, name)
+        matcher = IncrementalSectionMatcher(sm.info, sm.type, sm.name,
+                                            sm.handlers, self.memo)
+        matcher.lazy = self.lazy
+        matcher.compact = self.compact
+        matcher.tracer = self.tracer
+        return matcher
+
+    def finish(self):
+        name = getattr(self, "name", None)
+        fingerprint = sha1(repr((self.type.name, name, self._lines))
+                           ).hexdigest()
+        built = self.memo.get(fingerprint)
+        if built is not None:
+            # The handlers of the sections this one contains are among
+            # those of the section; don't add them twice.
+            del self.handlers[self._start:]
+            self.handlers.extend(built.handlers)
+            return built.value
+        value = self.build()
+        self.memo.add(fingerprint, _Built(fingerprint, value,
+                                          self.handlers[self._start:]))
+        return value
+
+    def convertSection(self, sectvalue):
+        built = self.memo.lookup(sectvalue)
+        if built is not None and built.converted is not _marker:
+            return built.converted
+        v = ZConfig.matcher.BaseMatcher.convertSection(self, sectvalue)
+        if built is not None:
+            built.converted = v
+        return v
+
+
+class IncrementalSectionMatcher(IncrementalMatcherMixin,
+                                ZConfig.matcher.SectionMatcher):
+
+    def __init__(self, info, type, name, handlers, memo):
+        ZConfig.matcher.SectionMatcher.__init__(
+            self, info, type, name, handlers)
+        self._initIncremental(memo)
+
+    def build(self):
+        return ZConfig.matcher.SectionMatcher.finish(self)
+
+
+class IncrementalSchemaMatcher(IncrementalMatcherMixin,
+                               ZConfig.matcher.SchemaMatcher):
+
+    def __init__(self, schema, memo):
+        ZConfig.matcher.SchemaMatcher.__init__(self, schema)
+        self._initIncremental(memo)
+
+    def build(self):
+        return ZConfig.matcher.SchemaMatcher.finish(self)
+
+
+class RecordingMixin:
+    """Loader support that records each resource that's read.
+
+    The `dependencies` attribute maps the URL of each resource to a
+    dependency record as returned by
+    ZConfig.schemacache.describeResource().
+    """
+
+    def createResource(self, file, url):
+        if url:
+            data = file.read()
+            file.close()
+            self.dependencies[url] = ZConfig.schemacache.describeResource(
+                url, data)
+            file = cStringIO.StringIO(data)
+        return ZConfig.loader.BaseLoader.createResource(self, file, url)
+
+
+class RecordingSchemaLoader(RecordingMixin, ZConfig.loader.SchemaLoader):
+
+    def __init__(self, registry=None, dependencies=None):
+        ZConfig.loader.SchemaLoader.__init__(self, registry)
+        if dependencies is None:
+            dependencies = {}
+        self.dependencies = dependencies
+
+
+class RecordingConfigLoader(RecordingMixin,
+                            ZConfig.cmdline.ExtendedConfigLoader):
+
+    # MatchMemo used for incremental matching, or None
+    memo = None
+
+    def __init__(self, schema, lazy=False, compact=False):
+        ZConfig.cmdline.ExtendedConfigLoader.__init__(
+            self, schema, lazy, compact)
+        self.dependencies = {}
+
+    def createSchemaMatcher(self):
+        if self.memo is None or self.clopts:
+            # Sections changed by command-line options can't be
+            # fingerprinted from the configuration text alone.
+            return ZConfig.cmdline.ExtendedConfigLoader.createSchemaMatcher(
+                self)
+        return IncrementalSchemaMatcher(self.schema, self.memo)
+
+    def createSchemaLoader(self):
+        # Components found by %import are dependencies as well.
+        loader = RecordingSchemaLoader(self.schema.registry,
+                                       self.dependencies)
+        loader.resource_cache = self.resource_cache
+        loader.transport = self.transport
+        loader.tracer = self.tracer
+        return loader
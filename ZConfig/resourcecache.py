@@ -0,0 +1,221 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Local cache for remote resources.
+
+A `ResourceCache` keeps copies of resources retrieved over HTTP in a
+directory.  Cached copies are revalidated with the server using the
+ETag and Last-Modified headers supplied with the original response,
+and are used when the server cannot be reached.
+
+The total size of the cached data is bounded; the least recently used
+entries are discarded first.
+"""
+
+import cPickle
+import cStringIO
+import os
+import sys
+import tempfile
+import time
+import urllib2
+
+try:
+    from hashlib import sha1
+except ImportError:
+    # Python 2.4
+    from sha import new as sha1
+
+
+class ResourceCache:
+    """Directory-backed cache of remote resources."""
+
+    schemes = ("http", "https")
+
+    # A ZConfig.transport.HTTPTransport used for requests, or None to
+    # use urllib2.
+    transport = None
+
+    def __init__(self, directory, maxsize=10*1024*1024, max_age=0,
+                 serve_stale=True, timeout=None):
+        # directory   - where cached data is stored; created if needed
+        # maxsize     - maximum number of bytes of cached data
+        # max_age     - number of seconds a cached copy is used without
+        #               checking with the server
+        # serve_stale - use cached copies when the server can't be
+        #               reached or reports a server error
+        # timeout     - socket timeout for requests, or None
+        if timeout is not None and sys.version_info < (2, 6):
+            raise ValueError("socket timeouts require at least Python 2.6")
+        self.directory = os.path.abspath(directory)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.serve_stale = serve_stale
+        self.timeout = timeout
+
+    def urlopen(self, url):
+        """Return a file object for `url`.
+
+        Exceptions are the same as those raised by urllib2.urlopen().
+        """
+        scheme = url.split(":", 1)[0].lower()
+        if scheme not in self.schemes:
+            return urllib2.urlopen(url)
+        entry = self.getEntry(url)
+        if entry is not None:
+            meta, data = entry
+            if time.time() - meta["fetched"] < self.max_age:
+                self._touch(url)
+                return cStringIO.StringIO(data)
+        req = urllib2.Request(url)
+        if entry is not None:
+            if meta.get("etag"):
+                req.add_header("If-None-Match", meta["etag"])
+            if meta.get("last-modified"):
+                req.add_header("If-Modified-Since", meta["last-modified"])
+        try:
+            f = self._urlopen(req)
+        except urllib2.HTTPError, e:
+            if entry is None:
+                raise
+            if e.code == 304:
+                meta["fetched"] = time.time()
+                self._writeMeta(url, meta)
+                return cStringIO.StringIO(data)
+            if e.code >= 500 and self.serve_stale:
+                self._touch(url)
+                return cStringIO.StringIO(data)
+            raise
+        except (urllib2.URLError, IOError, OSError):
+            if entry is None or not self.serve_stale:
+                raise
+            self._touch(url)
+            return cStringIO.StringIO(data)
+        try:
+            data = f.read()
+            info = f.info()
+        finally:
+            f.close()
+        meta = {
+            "url": url,
+            "etag": info.getheader("ETag"),
+            "last-modified": info.getheader("Last-Modified"),
+            "fetched": time.time(),
+            }
+        self.store(url, meta, data)
+        return cStringIO.StringIO(data)
+
+    def getEntry(self, url):
+        """Return a (metadata, data) tuple for `url`, or None."""
+        base = self._basename(url)
+        try:
+            f = open(base + ".meta", "rb")
+            try:
+                meta = cPickle.load(f)
+            finally:
+                f.close()
+            f = open(base + ".data", "rb")
+            try:
+                data = f.read()
+            finally:
+                f.close()
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return None
+        if meta.get("url") != url:
+            return None
+        return meta, data
+
+    def store(self, url, meta, data):
+        if len(data) > self.maxsize:
+            self.discard(url)
+            return
+        base = self._basename(url)
+        self._write(base + ".data", data)
+        self._writeMeta(url, meta)
+        self.prune()
+
+    def discard(self, url):
+        base = self._basename(url)
+        for fn in (base + ".meta", base + ".data"):
+            if os.path.exists(fn):
+                os.remove(fn)
+
+    def prune(self):
+        """Remove least recently used entries until the cache fits in
+        maxsize bytes."""
+        entries = []
+        total = 0
+        for fn in os.listdir(self.directory):
+            if not fn.endswith(".data"):
+                continue
+            base = os.path.join(self.directory, fn[:-5])
+            try:
+                size = os.path.getsize(base + ".data")
+                used = os.path.getmtime(base + ".meta")
+            except os.error:
+                continue
+            entries.append((used, size, base))
+            total += size
+        entries.sort()
+        while total > self.maxsize and entries:
+            used, size, base = entries.pop(0)
+            for fn in (base + ".meta", base + ".data"):
+                if os.path.exists(fn):
+                    os.remove(fn)
+            total -= size
+
+    def getSize(self):
+        """Return the number of bytes of cached data."""
+        total = 0
+        for fn in os.listdir(self.directory):
+            if fn.endswith(".data"):
+                total += os.path.getsize(os.path.join(self.directory, fn))
+        return total
+
+    # internal helpers
+
+    def _urlopen(self, req):
+        if self.transport is not None:
+            return self.transport.urlopen(req)
+        if self.timeout is None:
+            return urllib2.urlopen(req)
+        else:
+            return urllib2.urlopen(req, timeout=self.timeout)
+
+    def _basename(self, url):
+        return os.path.join(self.directory, sha1(url).hexdigest())
+
+    def _touch(self, url):
+        # The modification time of the metadata file records when the
+        # entry was last used.
+        try:
+            os.utime(self._basename(url) + ".meta", None)
+        except os.error:
+            pass
+
+    def _writeMeta(self, url, meta):
+        self._write(self._basename(url) + ".meta",
+                    cPickle.dumps(meta, 2))
+
+    def _write(self, filename, data):
+        fd, tmpname = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        f = os.fdopen(fd, "wb")
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        if os.name == "nt" and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmpname, filename)
@@ -13,8 +13,11 @@
 ##############################################################################
 """Parser for ZConfig schemas."""
 
+import cStringIO
 import os
+import time
 import xml.sax
+import xml.sax.xmlreader
 
 import ZConfig
 
@@ -23,14 +26,155 @@ from ZConfig import url
 
 
 def parseResource(resource, loader):
+    tracer = getattr(loader, "tracer", None)
+    if tracer is None:
+        return _parseResource(resource, loader)
+    t0 = time.time()
+    try:
+        return _parseResource(resource, loader)
+    finally:
+        tracer.span("parse", t0, time.time(), resource.url, type="schema")
+
+
+def _parseResource(resource, loader):
     parser = SchemaParser(loader, resource.url)
-    xml.sax.parse(resource.file, parser)
+    prefetcher = getattr(loader, "prefetcher", None)
+    if prefetcher is None:
+        xml.sax.parse(resource.file, parser)
+    else:
+        # Record the document first so the components it imports can
+        # be fetched while it's processed.
+        data = resource.read()
+        systemid = _systemId(resource.file)
+        try:
+            events = record(data, systemid, prefetcher.schedule)
+        except xml.sax.SAXException:
+            # Report the error as parsing the document directly would.
+            _parse(data, systemid, parser)
+        else:
+            replay(events, systemid, parser)
     return parser._schema
 
 
 def parseComponent(resource, loader, schema):
     parser = ComponentParser(loader, resource.url, schema)
-    xml.sax.parse(resource.file, parser)
+    _parseFile(resource.file, parser, loader, resource.url, "component")
+
+
+def _parseFile(file, parser, loader, url, type):
+    # xml.sax.parse(), reporting a span to the loader's tracer.
+    tracer = getattr(loader, "tracer", None)
+    if tracer is None:
+        xml.sax.parse(file, parser)
+        return
+    t0 = time.time()
+    try:
+        xml.sax.parse(file, parser)
+    finally:
+        tracer.span("parse", t0, time.time(), url, type=type)
+
+
+def record(data, systemid, schedule):
+    """Return a list of the SAX events for the XML document `data`.
+
+    The list can be passed to replay().  `schedule` is called with the
+    package name and file of each <import package=...> element of the
+    document as it is seen.
+    """
+    recorder = _Recorder(schedule)
+    _parse(data, systemid, recorder)
+    return recorder.events
+
+
+def replay(events, systemid, handler):
+    """Send the events returned by record() to the content handler."""
+    locator = _Locator(systemid)
+    handler.setDocumentLocator(locator)
+    for method, args, position in events:
+        locator.position = position
+        getattr(handler, method)(*args)
+
+
+def _parse(data, systemid, handler):
+    source = xml.sax.xmlreader.InputSource()
+    source.setByteStream(cStringIO.StringIO(data))
+    source.setSystemId(systemid)
+    xml.sax.parse(source, handler)
+
+
+def _systemId(file):
+    # The system ID xml.sax.parse() would use for `file`.
+    name = getattr(file, "name", None)
+    if isinstance(name, str):
+        return name
+    return None
+
+
+class _Recorder(xml.sax.ContentHandler):
+
+    def __init__(self, schedule):
+        xml.sax.ContentHandler.__init__(self)
+        self.events = []
+        self._schedule = schedule
+        self._locator = None
+        self._depth = 0
+        self._prefix = ''
+
+    def setDocumentLocator(self, locator):
+        self._locator = locator
+
+    def _record(self, method, *args):
+        self.events.append((method, args,
+                            (self._locator.getLineNumber(),
+                             self._locator.getColumnNumber())))
+
+    def startElement(self, name, attrs):
+        attrs = dict(attrs)
+        self._record("startElement", name, attrs)
+        if self._depth == 0:
+            self._prefix = attrs.get("prefix") or ''
+        elif self._depth == 1 and name == "import":
+            self._import(attrs)
+        self._depth += 1
+
+    def endElement(self, name):
+        self._record("endElement", name)
+        self._depth -= 1
+
+    def characters(self, data):
+        self._record("characters", data)
+
+    def endDocument(self):
+        self._record("endDocument")
+
+    def _import(self, attrs):
+        # Only imports the parser would accept are scheduled; anything
+        # else is reported when the events are replayed.
+        pkg = attrs.get("package", "").strip()
+        file = attrs.get("file", "").strip()
+        if attrs.get("src", "").strip() or os.path.dirname(file):
+            return
+        if pkg.startswith("."):
+            pkg = self._prefix + pkg
+        if pkg and "" not in str(pkg).split("."):
+            self._schedule(str(pkg), file)
+
+
+class _Locator(xml.sax.xmlreader.Locator):
+
+    position = None, None
+
+    def __init__(self, systemid):
+        self._systemid = systemid
+
+    def getColumnNumber(self):
+        return self.position[1]
+
+    def getLineNumber(self):
+        return self.position[0]
+
+    def getSystemId(self):
+        return self._systemid
 
 
 def _srepr(ob):
@@ -309,10 +453,17 @@ class BaseParser(xml.sax.ContentHandler):
                 self.loadComponent(src)
 
     def loadComponent(self, src):
-        r = self._loader.openResource(src)
         parser = ComponentParser(self._loader, src, self._schema)
+        prefetcher = getattr(self._loader, "prefetcher", None)
+        if prefetcher is not None:
+            prefetched = prefetcher.get(src)
+            if prefetched is not None:
+                events, systemid = prefetched
+                replay(events, systemid, parser)
+                return
+        r = self._loader.openResource(src)
         try:
-            xml.sax.parse(r.file, parser)
+            _parseFile(r.file, parser, self._loader, src, "component")
         finally:
             r.close()
 
@@ -529,7 +680,7 @@ class SchemaParser(BaseParser):
         parser = SchemaParser(self._loader, src, self)
         r = self._loader.openResource(src)
         try:
-            xml.sax.parse(r.file, parser)
+            _parseFile(r.file, parser, self._loader, src, "schema")
         finally:
             r.close()
 
@@ -0,0 +1,236 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Persistent on-disk cache of compiled schemas.
+
+A `SchemaCache` stores fully built schema objects in a directory so
+that later processes can re-use them without parsing the schema and
+all of the components it imports.  Each cache entry records every
+resource that was read while building the schema; the entry is only
+used if none of those resources has changed.
+
+Data type conversions are not stored in the cache; they are recorded
+by name and looked up in the registry of the loader that uses the
+entry.
+"""
+
+import cPickle
+import os
+import tempfile
+import time
+
+try:
+    from hashlib import sha1
+except ImportError:
+    # Python 2.4
+    from sha import new as sha1
+
+import ZConfig.info
+import ZConfig.loader
+
+# Changing the format of the cache entries or of the objects in
+# ZConfig.info requires changing this value.
+FORMAT = 1
+
+# Modification times this close to the time a dependency record is
+# made (in seconds) aren't trusted: a file can change again without
+# its timestamp changing on file systems with coarse timestamps.
+TIMESTAMP_GRANULARITY = 2
+
+
+def describeResource(url, data):
+    """Return a dependency record for the resource `url` with content
+    `data`.
+
+    The record is a tuple (url, filename, mtime, size, digest); the
+    filename, modification time and size are None unless the resource
+    is a local file.
+
+    The file is examined after `data` was read, so it may have been
+    rewritten in between.  The modification time is only recorded if
+    it's older than TIMESTAMP_GRANULARITY seconds; otherwise it's
+    None, and isCurrent() compares the content instead.
+    """
+    filename = ZConfig.loader.resourceFilename(url)
+    mtime = size = None
+    if filename is not None:
+        try:
+            st = os.stat(filename)
+        except os.error:
+            filename = None
+        else:
+            size = st.st_size
+            if st.st_mtime < time.time() - TIMESTAMP_GRANULARITY:
+                mtime = st.st_mtime
+    return url, filename, mtime, size, sha1(data).hexdigest()
+
+
+def isCurrent(dependency, loader):
+    """Return true if the resource described by `dependency` is unchanged.
+
+    The modification time and size of local files are checked first;
+    otherwise the resource is read using `loader` and its digest is
+    compared.
+    """
+    url, filename, mtime, size, digest = dependency
+    if ZConfig.loader.resourceFilename(url) != filename:
+        return False
+    if filename is not None:
+        try:
+            st = os.stat(filename)
+        except os.error:
+            return False
+        if mtime is not None and (st.st_mtime, st.st_size) == (mtime, size):
+            return True
+    # Timestamps don't tell us enough; compare the content.
+    try:
+        r = ZConfig.loader.BaseLoader.openResource(loader, url)
+    except ZConfig.ConfigurationError:
+        return False
+    try:
+        data = r.read()
+    finally:
+        r.close()
+    return sha1(data).hexdigest() == digest
+
+
+class SchemaCache:
+    """Directory-backed store of compiled schemas."""
+
+    suffix = ".zcs"
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def describe(self, url, data):
+        """Return a dependency record for the resource `url` with content
+        `data`."""
+        return describeResource(url, data)
+
+    def load(self, url, dependency, loader):
+        """Return the cached schema for `url`, or None.
+
+        `dependency` is the dependency record for the current content
+        of `url` itself.  The return value is a tuple of the schema and
+        the list of dependency records, or None if there's no usable
+        entry.
+        """
+        try:
+            f = open(self.getFilename(url), "rb")
+        except IOError:
+            return None
+        try:
+            try:
+                unpickler = cPickle.Unpickler(f)
+                header = unpickler.load()
+                if (header.get("format") != FORMAT
+                    or header.get("url") != url):
+                    return None
+                dependencies = header["dependencies"]
+                for dep in dependencies:
+                    if dep[0] == url:
+                        if dep[4] != dependency[4]:
+                            return None
+                    elif not isCurrent(dep, loader):
+                        return None
+                unpickler = cPickle.Unpickler(f)
+                unpickler.persistent_load = _Resolver(loader.registry)
+                schema = unpickler.load()
+            except Exception:
+                # Unreadable or stale entry; behave as if it's missing.
+                return None
+        finally:
+            f.close()
+        return schema, dependencies
+
+    def store(self, url, dependencies, schema, registry):
+        """Save `schema` as the cache entry for `url`.
+
+        Schemas that cannot be serialized are silently not cached.
+        """
+        header = {
+            "format": FORMAT,
+            "url": url,
+            "dependencies": dependencies,
+            }
+        fd, tmpname = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        f = os.fdopen(fd, "wb")
+        try:
+            try:
+                cPickle.dump(header, f, 2)
+                pickler = cPickle.Pickler(f, 2)
+                pickler.persistent_id = _Namer(registry)
+                pickler.dump(schema)
+            finally:
+                f.close()
+            filename = self.getFilename(url)
+            if os.name == "nt" and os.path.exists(filename):
+                os.remove(filename)
+            os.rename(tmpname, filename)
+        except (cPickle.PicklingError, TypeError, IOError, OSError):
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+
+    def invalidate(self, url=None):
+        """Remove the entry for `url`, or all entries if `url` is None."""
+        if url is not None:
+            names = [self.getFilename(url)]
+        else:
+            names = [os.path.join(self.directory, fn)
+                     for fn in os.listdir(self.directory)
+                     if fn.endswith(self.suffix)]
+        for fn in names:
+            if os.path.exists(fn):
+                os.remove(fn)
+
+    def getFilename(self, url):
+        return os.path.join(self.directory,
+                            sha1(url).hexdigest() + self.suffix)
+
+class _Namer:
+    """persistent_id hook: data type conversions are stored by name."""
+
+    def __init__(self, registry):
+        self._registry = registry
+        self._names = {}
+        for mapping in (registry._stock, registry._other):
+            for name, conversion in mapping.items():
+                self._names[id(conversion)] = name
+
+    def __call__(self, ob):
+        if ob is self._registry:
+            return "registry"
+        if ob is ZConfig.info.Unbounded:
+            return "unbounded"
+        name = self._names.get(id(ob))
+        if name is not None:
+            return "datatype:" + name
+        return None
+
+
+class _Resolver:
+    """persistent_load hook; the inverse of _Namer."""
+
+    def __init__(self, registry):
+        self._registry = registry
+
+    def __call__(self, pid):
+        if pid == "registry":
+            return self._registry
+        if pid == "unbounded":
+            return ZConfig.info.Unbounded
+        if pid.startswith("datatype:"):
+            return self._registry.get(pid[9:])
+        raise cPickle.UnpicklingError("unknown persistent id: " + `pid`)
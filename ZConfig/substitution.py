@@ -19,19 +19,79 @@ import ZConfig
 def substitute(s, mapping):
     """Interpolate variables from `mapping` into `s`."""
     if "$" in s:
-        result = ''
-        rest = s
+        return getTemplate(s).render(mapping)
+    else:
+        return s
+
+
+def substituteAll(strings, mapping):
+    """Return a list of the results of substitute(s, mapping) for each
+    s in `strings`."""
+    result = []
+    for s in strings:
+        if "$" in s:
+            s = getTemplate(s).render(mapping)
+        result.append(s)
+    return result
+
+
+class Template:
+    """Pre-parsed form of a substitution source string."""
+
+    __metaclass__ = type
+    __slots__ = 'source', 'parts', 'error'
+
+    def __init__(self, source):
+        # parts is a sequence of (prefix, name, namecase) tuples, as
+        # returned by _split(); error is the message of a syntax error
+        # following the last part, or None.
+        self.source = source
+        parts = []
+        error = None
+        rest = source
         while rest:
-            p, name, namecase, rest = _split(rest)
-            result += p
+            try:
+                prefix, name, namecase, rest = _split(rest)
+            except ZConfig.SubstitutionSyntaxError, e:
+                # Raised when rendering reaches this point, so that
+                # names before the error are looked up first, as
+                # substitute() has always done.
+                error = e.message
+                break
+            parts.append((prefix, name, namecase))
+        self.parts = tuple(parts)
+        self.error = error
+
+    def render(self, mapping):
+        """Return the source with names replaced from `mapping`."""
+        L = []
+        for prefix, name, namecase in self.parts:
+            L.append(prefix)
             if name:
                 v = mapping.get(name)
                 if v is None:
-                    raise ZConfig.SubstitutionReplacementError(s, namecase)
-                result += v
-        return result
-    else:
-        return s
+                    raise ZConfig.SubstitutionReplacementError(
+                        self.source, namecase)
+                L.append(v)
+        if self.error is not None:
+            raise ZConfig.SubstitutionSyntaxError(self.error)
+        return "".join(L)
+
+
+_templates = {}
+_MAXCACHE = 1000
+
+def getTemplate(s):
+    """Return the Template for `s`, re-using a cached one if possible."""
+    try:
+        return _templates[s]
+    except KeyError:
+        pass
+    t = Template(s)
+    if len(_templates) >= _MAXCACHE:
+        _templates.clear()
+    _templates[s] = t
+    return t
 
 
 def isname(s):
@@ -0,0 +1,145 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests of ZConfig.background."""
+
+import threading
+import unittest
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.background
+
+from ZConfig.tests.support import CONFIG_BASE
+
+
+SCHEMA = """\
+<schema>
+  <key name='key'/>
+  <multikey name='refouter' attribute='refouter'/>
+  <multikey name='refinner' attribute='refinner'/>
+</schema>
+"""
+
+# Set by the tests to block reading BlockingFile objects.
+_blocker = None
+
+
+class BlockingFile(StringIO):
+
+    def read(self, *args):
+        _blocker.wait(10)
+        return StringIO.read(self, *args)
+
+
+class BackgroundTestCase(unittest.TestCase):
+
+    def setUp(self):
+        global _blocker
+        _blocker = threading.Event()
+
+    def tearDown(self):
+        global _blocker
+        _blocker.set()
+        _blocker = None
+
+    def get_schema(self):
+        load = ZConfig.background.loadSchemaFile(StringIO(SCHEMA))
+        return load.result(10)
+
+    def test_load_schema(self):
+        load = ZConfig.background.loadSchema(CONFIG_BASE + "simple.xml")
+        schema = load.result(10)
+        self.assert_(load.done())
+        self.assert_(not load.cancelled())
+        expected = ZConfig.loadSchema(CONFIG_BASE + "simple.xml")
+        self.assertEqual(schema.gettypenames(), expected.gettypenames())
+        self.assert_(load.result() is schema)
+
+    def test_load_config(self):
+        schema = self.get_schema()
+        load = ZConfig.background.loadConfig(schema,
+                                             CONFIG_BASE + "outer.conf")
+        conf, handler = load.result(10)
+        self.assertEqual(conf.refouter, ["outer"])
+        self.assertEqual(conf.refinner, ["inner"])
+
+    def test_errors_are_reraised(self):
+        schema = self.get_schema()
+        load = ZConfig.background.loadConfigFile(schema, StringIO("bad 1\n"))
+        self.assertRaises(ZConfig.ConfigurationError, load.result, 10)
+        load = ZConfig.background.loadConfig(schema,
+                                             CONFIG_BASE + "missing.conf")
+        self.assertRaises(ZConfig.ConfigurationError, load.result, 10)
+
+    def test_timeout(self):
+        schema = self.get_schema()
+        load = ZConfig.background.loadConfigFile(
+            schema, BlockingFile("%define outervar x\n"
+                                 "%include inner.conf\n"),
+            CONFIG_BASE + "outer.conf")
+        try:
+            load.result(0.01)
+        except ZConfig.ConfigurationError, e:
+            self.assertEqual(str(e), "timed out after 0.01 seconds")
+        else:
+            self.fail("expected ConfigurationError")
+        self.assert_(load.cancelled())
+        _blocker.set()
+        load._done.wait(10)
+        self.assert_(load.done())
+        self.assertRaises(ZConfig.ConfigurationError, load.result)
+        # the load was stopped when the include was opened
+        t, v, tb = load._exc_info
+        self.assertEqual(str(v), "loading cancelled")
+
+    def test_cancel(self):
+        schema = self.get_schema()
+        load = ZConfig.background.loadConfigFile(schema,
+                                                 BlockingFile("key x\n"))
+        self.assert_(load.cancel())
+        _blocker.set()
+        try:
+            load.result(10)
+        except ZConfig.ConfigurationError, e:
+            self.assertEqual(str(e), "loading cancelled")
+        else:
+            self.fail("expected ConfigurationError")
+        self.assert_(not load.cancel())
+
+    def test_callbacks(self):
+        schema = self.get_schema()
+        L = []
+        called = threading.Event()
+        def callback(load):
+            L.append(load)
+            called.set()
+        load = ZConfig.background.loadConfigFile(schema,
+                                                 BlockingFile("key x\n"))
+        load.addCallback(callback)
+        self.assertEqual(L, [])
+        _blocker.set()
+        called.wait(10)
+        self.assertEqual(L, [load])
+        self.assertEqual(load.result()[0].key, "x")
+        # callbacks added later are called immediately
+        load.addCallback(L.append)
+        self.assertEqual(L, [load, load])
+
+
+def test_suite():
+    return unittest.makeSuite(BackgroundTestCase)
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,132 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests of the line-level behavior of ZConfig.cfgparser."""
+
+import unittest
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.cfgparser
+import ZConfig.loader
+
+
+class Recorder:
+    """Parser context and section that records the events it sees."""
+
+    def __init__(self):
+        self.events = []
+
+    def startSection(self, parent, type, name):
+        self.events.append(("start", type, name))
+        return self
+
+    def endSection(self, parent, type, name, matcher):
+        self.events.append(("end", type, name))
+
+    def addValue(self, key, value, position):
+        self.events.append(("value", key, value, position[0]))
+
+    def includeConfiguration(self, section, url, defines):
+        self.events.append(("include", url))
+
+    def importSchemaComponent(self, pkgname):
+        self.events.append(("import", pkgname))
+
+
+class ParserTestCase(unittest.TestCase):
+
+    def parse(self, text):
+        recorder = Recorder()
+        resource = ZConfig.loader.Resource(StringIO(text), "file:///x.conf")
+        parser = ZConfig.cfgparser.ZConfigParser(resource, recorder)
+        parser.parse(recorder)
+        return recorder.events
+
+    def check_error(self, text, message, lineno):
+        try:
+            self.parse(text)
+        except ZConfig.ConfigurationSyntaxError, e:
+            self.assertEqual(e.message, message)
+            self.assertEqual(e.lineno, lineno)
+        else:
+            self.fail("expected ConfigurationSyntaxError")
+
+    def test_events(self):
+        events = self.parse(
+            "# comment\n"
+            "  \t\n"
+            "key value with  spaces  \n"
+            "empty\n"
+            "%define Name val\n"
+            "subst a${name}b$$\n"
+            "<Sect  Name>\n"
+            "  a(b c\n"
+            "  <inner/>\n"
+            "</sect >\n"
+            "%import some.pkg\n"
+            "%include other.conf\n"
+            "last\r\n"
+            "no-newline x")
+        self.assertEqual(events, [
+            ("value", "key", "value with  spaces", 3),
+            ("value", "empty", "", 4),
+            ("value", "subst", "avalb$", 6),
+            ("start", "sect", "name"),
+            ("value", "a", "(b c", 8),
+            ("start", "inner", None),
+            ("end", "inner", None),
+            ("end", "sect", "name"),
+            ("import", "some.pkg"),
+            ("include", "file:///other.conf"),
+            ("value", "last", "", 13),
+            ("value", "no-newline", "x", 14),
+            ])
+
+    def test_carriage_return_is_not_a_line_break(self):
+        events = self.parse("a b\rc d\n")
+        self.assertEqual(events, [("value", "a", "b\rc d", 1)])
+
+    def test_empty_resource(self):
+        self.assertEqual(self.parse(""), [])
+        self.assertEqual(self.parse("\n\n"), [])
+
+    def test_errors(self):
+        self.check_error("a b\n</sect\n", "malformed section end", 2)
+        self.check_error("<sect\n", "malformed section start", 1)
+        self.check_error("\n(a b\n", "malformed configuration data", 2)
+        self.check_error("<>\n", "malformed section header", 1)
+        self.check_error("</sect>\n", "unexpected section end", 1)
+        self.check_error("<a>\n</b>\n", "unbalanced section end", 2)
+        self.check_error("<a>\n\n", "unclosed sections not allowed", 2)
+        self.check_error("%\n", "missing or unrecognized directive", 1)
+        self.check_error("%bogus x\n", "unknown directive: 'bogus'", 1)
+
+    def test_substitution_errors(self):
+        self.assertRaises(ZConfig.SubstitutionSyntaxError,
+                          self.parse, "a $\n")
+        try:
+            self.parse("\na $undefined\n")
+        except ZConfig.SubstitutionReplacementError, e:
+            self.assertEqual(e.lineno, 2)
+            self.assertEqual(e.url, "file:///x.conf")
+        else:
+            self.fail("expected SubstitutionReplacementError")
+
+
+def test_suite():
+    return unittest.makeSuite(ParserTestCase)
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -19,9 +19,14 @@ import shutil
 import socket
 import datetime
 import tempfile
+import threading
 import unittest
 
+import ZConfig
 import ZConfig.datatypes
+import ZConfig.loader
+
+from StringIO import StringIO
 
 try:
     here = __file__
@@ -386,8 +391,145 @@ class DatatypeTestCase(unittest.TestCase):
            datetime.timedelta(2, 14, minutes=12, hours=7, weeks=4))
 
 
+class MemoizedConversionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.converted = []
+        self.now = 1000.0
+
+    def convert(self, value):
+        self.converted.append(value)
+        return value.upper()
+
+    def timer(self):
+        return self.now
+
+    def memoize(self, **kw):
+        memo = ZConfig.datatypes.MemoizedConversion(self.convert, **kw)
+        memo.timer = self.timer
+        return memo
+
+    def test_unbounded(self):
+        memo = self.memoize()
+        for v in ["a", "b", "a", "a", "c"]:
+            self.assertEqual(memo(v), v.upper())
+        self.assertEqual(self.converted, ["a", "b", "c"])
+        self.assertEqual(memo.getStatistics(),
+                         {"size": 3, "hits": 2, "misses": 3, "evictions": 0})
+
+    def test_lru_eviction(self):
+        memo = self.memoize(maxsize=2)
+        memo("a")
+        memo("b")
+        memo("a")
+        memo("c")     # evicts "b", the least recently used
+        memo("a")
+        memo("b")
+        self.assertEqual(self.converted, ["a", "b", "c", "b"])
+        self.assertEqual(len(memo), 2)
+        self.assertEqual(memo.evictions, 2)
+        self.assertEqual((memo.hits, memo.misses), (2, 4))
+
+    def test_ttl(self):
+        memo = self.memoize(ttl=10)
+        memo("a")
+        self.now += 5
+        memo("a")
+        self.now += 10
+        memo("a")
+        self.assertEqual(self.converted, ["a", "a"])
+        self.assertEqual(len(memo), 1)
+
+    def test_errors_not_cached(self):
+        memo = ZConfig.datatypes.MemoizedConversion(
+            ZConfig.datatypes.integer)
+        self.assertRaises(ValueError, memo, "x")
+        self.assertRaises(ValueError, memo, "x")
+        self.assertEqual(len(memo), 0)
+        self.assertEqual(memo.misses, 2)
+
+    def test_clear(self):
+        memo = self.memoize()
+        memo("a")
+        memo.clear()
+        memo("a")
+        self.assertEqual(self.converted, ["a", "a"])
+
+
 class RegistryTestCase(unittest.TestCase):
 
+    def test_search_cache_shared(self):
+        name = "ZConfig.tests.test_datatypes.sample_datatype"
+        ZConfig.datatypes.clearSearchCache(name)
+        r1 = ZConfig.datatypes.Registry()
+        self.assert_(r1.get(name) is sample_datatype)
+        self.assert_(r1.imports > 0)
+        r2 = ZConfig.datatypes.Registry()
+        self.assert_(r2.get(name) is sample_datatype)
+        self.assertEqual(r2.imports, 0)
+
+        ZConfig.datatypes.clearSearchCache("ZConfig.tests")
+        r3 = ZConfig.datatypes.Registry()
+        r3.get(name)
+        self.assert_(r3.imports > 0)
+
+    def test_search_from_threads(self):
+        name = "ZConfig.tests.test_datatypes.sample_datatype"
+        ZConfig.datatypes.clearSearchCache()
+        results = []
+        def resolve():
+            results.append(ZConfig.datatypes.Registry().get(name))
+        threads = [threading.Thread(target=resolve) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [sample_datatype] * 8)
+
+    def test_imports_counted_during_schema_load(self):
+        ZConfig.datatypes.clearSearchCache()
+        text = ("<schema><key name='a' datatype="
+                "'ZConfig.tests.test_datatypes.sample_datatype'/></schema>")
+        loader = ZConfig.loader.SchemaLoader()
+        loader.loadFile(StringIO(text))
+        self.assert_(loader.registry.imports > 0)
+        loader = ZConfig.loader.SchemaLoader()
+        loader.loadFile(StringIO(text))
+        self.assertEqual(loader.registry.imports, 0)
+
+    def test_memoize(self):
+        registry = ZConfig.datatypes.Registry()
+        memo = registry.memoize("Dotted-Name", maxsize=10)
+        self.assert_(registry.get("dotted-name") is memo)
+        self.assertEqual(memo.maxsize, 10)
+        self.assertEqual(memo("a.b"), "a.b")
+        self.assertEqual(memo("a.b"), "a.b")
+        self.assertEqual(memo.hits, 1)
+        self.assertRaises(ValueError, memo, "a..b")
+        # other registries are not affected
+        other = ZConfig.datatypes.Registry()
+        self.failIf(isinstance(other.get("dotted-name"),
+                               ZConfig.datatypes.MemoizedConversion))
+
+    def test_memoize_memoized_datatype(self):
+        registry = ZConfig.datatypes.Registry()
+        memo = registry.memoize("locale", maxsize=1)
+        self.failIf(memo is ZConfig.datatypes.stock_datatypes["locale"])
+        self.failIf(isinstance(memo._conversion,
+                               ZConfig.datatypes.MemoizedConversion))
+
+    def test_memoize_used_by_schema(self):
+        registry = ZConfig.datatypes.Registry()
+        memo = registry.memoize("integer")
+        loader = ZConfig.loader.SchemaLoader(registry)
+        schema = loader.loadFile(StringIO(
+            "<schema><multikey name='n' attribute='n' datatype='integer'/>"
+            "</schema>"))
+        conf, handler = ZConfig.loadConfigFile(
+            schema, StringIO("n 1\nn 2\nn 1\n"))
+        self.assertEqual(conf.n, [1, 2, 1])
+        self.assertEqual((memo.hits, memo.misses), (1, 2))
+
     def test_registry_does_not_mask_toplevel_imports(self):
         old_sys_path = sys.path[:]
         tmpdir = tempfile.mkdtemp(prefix="test_datatypes_")
@@ -406,6 +548,10 @@ class RegistryTestCase(unittest.TestCase):
             sys.path[:] = old_sys_path
         self.assertEqual(datatype, 42)
 
+def sample_datatype(value):
+    return value
+
+
 TEST_DATATYPE_SOURCE = """
 # sample datatypes file
 
@@ -415,6 +561,7 @@ my_sample_datatype = 42
 
 def test_suite():
     suite = unittest.makeSuite(DatatypeTestCase)
+    suite.addTest(unittest.makeSuite(MemoizedConversionTestCase))
     suite.addTest(unittest.makeSuite(RegistryTestCase))
     return suite
 
@@ -0,0 +1,177 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests of event-based configuration reading."""
+
+import unittest
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.events
+
+from ZConfig.events import DIRECTIVE, END, START, VALUE
+from ZConfig.tests.support import CONFIG_BASE
+
+
+SCHEMA = """\
+<schema handler='top'>
+  <sectiontype name='item' datatype='ZConfig.tests.test_events.Item'>
+    <key name='size' datatype='integer' required='yes'/>
+  </sectiontype>
+  <sectiontype name='options'>
+    <key name='debug' datatype='boolean' default='off'/>
+  </sectiontype>
+  <multisection type='item' name='+' attribute='items' handler='item'/>
+  <section type='options' name='*' attribute='options' required='yes'/>
+  <key name='title' handler='title'/>
+</schema>
+"""
+
+
+class Item:
+    def __init__(self, section):
+        self.name = section.getSectionName()
+        self.size = section.size
+
+
+class RecordingReader(ZConfig.events.EventReader):
+    """Reader that records which of the resources it opens are closed."""
+
+    def __init__(self, schema=None):
+        ZConfig.events.EventReader.__init__(self, schema)
+        self.opened = []
+        self.closed = []
+
+    def openResource(self, url):
+        resource = ZConfig.events.EventReader.openResource(self, url)
+        self.opened.append(url)
+        close = resource.close
+        def recording_close():
+            self.closed.append(url)
+            close()
+        resource.close = recording_close
+        return resource
+
+
+class EventsTestCase(unittest.TestCase):
+
+    def get_schema(self):
+        return ZConfig.loadSchemaFile(StringIO(SCHEMA))
+
+    def test_events_without_schema(self):
+        url = CONFIG_BASE + "outer.conf"
+        inner = CONFIG_BASE + "inner.conf"
+        events = list(ZConfig.events.iterConfig(url))
+        self.assertEqual(events, [
+            (DIRECTIVE, ("define", "outervar outer"), (1, None, url)),
+            (DIRECTIVE, ("include", "inner.conf"), (2, None, url)),
+            (VALUE, ("refouter", "outer"), (1, None, inner)),
+            (DIRECTIVE, ("define", "innervar inner"), (2, None, inner)),
+            (VALUE, ("refinner", "inner"), (3, None, url)),
+            ])
+
+    def test_section_events(self):
+        events = list(ZConfig.events.iterConfigFile(StringIO(
+            "<Outer a>\n"
+            "  <inner/>\n"
+            "  key value\n"
+            "</outer>\n"), "file:///x.conf"))
+        self.assertEqual([event[:2] for event in events], [
+            (START, ("outer", "a")),
+            (START, ("inner", None)),
+            (END, ("inner", None, None)),
+            (VALUE, ("key", "value")),
+            (END, ("outer", "a", None)),
+            ])
+        self.assertEqual(events[-1][2], (4, None, "file:///x.conf"))
+
+    def test_schema_validation(self):
+        reader = ZConfig.events.EventReader(self.get_schema())
+        events = list(reader.iterFile(StringIO(
+            "title Example\n"
+            "<item a>\n"
+            "  size 1\n"
+            "</item>\n"
+            "<options/>\n"
+            "<item b>\n"
+            "  size 2\n"
+            "</item>\n")))
+        ends = [data for event, data, position in events if event == END]
+        self.assertEqual([(type, name) for type, name, value in ends],
+                         [("item", "a"), ("options", None),
+                          ("item", "b"), (None, None)])
+        a, options, b, conf = [value for type, name, value in ends]
+        self.assert_(isinstance(a, Item))
+        self.assertEqual((a.name, a.size, b.size), ("a", 1, 2))
+        self.assertEqual(options.debug, False)
+        # the sections are not retained by the top-level value
+        self.assertEqual(conf.title, "Example")
+        self.assertEqual(conf.items, [])
+        self.assertEqual(conf.options, None)
+
+        L = []
+        reader.handler({"item": L.append, "title": L.append,
+                        "top": None})
+        self.assertEqual(L, [a, b, "Example"])
+
+    def test_schema_errors(self):
+        schema = self.get_schema()
+        it = ZConfig.events.iterConfigFile(StringIO(
+            "<item a>\n"
+            "</item>\n"), schema=schema)
+        self.assertEqual(it.next()[0], START)
+        self.assertRaises(ZConfig.ConfigurationError, it.next)
+        # required sections are still checked
+        self.assertRaises(ZConfig.ConfigurationError, list,
+                          ZConfig.events.iterConfigFile(StringIO(
+                              "<item a>\n  size 1\n</item>\n"),
+                              schema=schema))
+        self.assertRaises(ZConfig.ConfigurationError, list,
+                          ZConfig.events.iterConfigFile(StringIO(
+                              "<options/>\n<options/>\n"),
+                              schema=schema))
+
+    def test_resources_closed(self):
+        url = CONFIG_BASE + "outer.conf"
+        inner = CONFIG_BASE + "inner.conf"
+        reader = RecordingReader()
+        list(reader.iterURL(url))
+        self.assertEqual(reader.opened, [url, inner])
+        self.assertEqual(set(reader.closed), set([url, inner]))
+        # stopping while an included resource is read
+        reader = RecordingReader()
+        it = reader.iterURL(url)
+        while it.next()[0] != VALUE:
+            pass
+        it.close()
+        self.assertEqual(reader.opened, [url, inner])
+        self.assertEqual(set(reader.closed), set([url, inner]))
+
+    def test_syntax_errors(self):
+        it = ZConfig.events.iterConfigFile(StringIO("a b\n<sect\n"),
+                                           "file:///x.conf")
+        self.assertEqual(it.next()[:2], (VALUE, ("a", "b")))
+        try:
+            it.next()
+        except ZConfig.ConfigurationSyntaxError, e:
+            self.assertEqual(e.lineno, 2)
+        else:
+            self.fail("expected ConfigurationSyntaxError")
+
+
+def test_suite():
+    return unittest.makeSuite(EventsTestCase)
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
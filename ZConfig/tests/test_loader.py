@@ -14,6 +14,7 @@
 """Tests of ZConfig.loader classes and helper functions."""
 
 import os.path
+import shutil
 import sys
 import tempfile
 import unittest
@@ -22,6 +23,7 @@ import urllib2
 from StringIO import StringIO
 
 import ZConfig
+import ZConfig.cfgparser
 import ZConfig.loader
 import ZConfig.url
 
@@ -241,6 +243,84 @@ class LoaderTestCase(TestBase):
         assert_(not isPath("file:///c|/foo/bar.conf"))
 
 
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.write("part.conf", "path $dir/part\n")
+        self.schema = ZConfig.loadSchemaFile(StringIO(
+            "<schema><multikey name='path' attribute='paths'/></schema>"))
+        self.tokenized = []
+        self.old_tokenize = ZConfig.cfgparser.tokenize
+        ZConfig.cfgparser.tokenize = self.tokenize
+
+    def tearDown(self):
+        ZConfig.cfgparser.tokenize = self.old_tokenize
+        shutil.rmtree(self.tmpdir)
+
+    def tokenize(self, text):
+        self.tokenized.append(text)
+        return self.old_tokenize(text)
+
+    def write(self, name, text):
+        f = open(os.path.join(self.tmpdir, name), "w")
+        f.write(text)
+        f.close()
+
+    def load(self, text, loader=None):
+        if loader is None:
+            loader = ZConfig.loader.ConfigLoader(self.schema)
+        url = ZConfig.url.urljoin(
+            "file://" + urllib2.quote(self.tmpdir) + "/", "main.conf")
+        conf, handler = loader.loadFile(StringIO(text), url)
+        return conf.paths
+
+    def test_include_tokenized_once_per_load(self):
+        paths = self.load("%define dir /a\n"
+                          "%include part.conf\n"
+                          "%include part.conf\n")
+        self.assertEqual(paths, ["/a/part", "/a/part"])
+        self.assertEqual(self.tokenized.count("path $dir/part\n"), 1)
+
+    def test_cache_shared_between_loads(self):
+        cache = ZConfig.loader.ParseCache()
+        loader = ZConfig.loader.ConfigLoader(self.schema, parse_cache=cache)
+        self.assertEqual(self.load("%define dir /a\n%include part.conf\n",
+                                   loader),
+                         ["/a/part"])
+        loader = ZConfig.loader.ConfigLoader(self.schema, parse_cache=cache)
+        self.assertEqual(self.load("%define dir /b\n%include part.conf\n",
+                                   loader),
+                         ["/b/part"])
+        self.assertEqual(self.tokenized.count("path $dir/part\n"), 1)
+
+        # a changed resource is tokenized again
+        self.write("part.conf", "path $dir/changed\n")
+        loader = ZConfig.loader.ConfigLoader(self.schema, parse_cache=cache)
+        self.assertEqual(self.load("%define dir /c\n%include part.conf\n",
+                                   loader),
+                         ["/c/changed"])
+        # only the latest content of each resource is kept
+        self.assertEqual(len(cache), 2)
+        key = ZConfig.loader._parse_key(
+            ZConfig.url.urljoin("file://" + urllib2.quote(self.tmpdir) + "/",
+                                "part.conf"),
+            "path $dir/part\n")
+        self.assertEqual(cache.get(key), None)
+
+    def test_replayed_errors_report_include_site(self):
+        self.write("bad.conf", "path /x\n<section\n")
+        loader = ZConfig.loader.ConfigLoader(self.schema)
+        for i in range(2):
+            try:
+                self.load("%include bad.conf\n", loader)
+            except ZConfig.ConfigurationSyntaxError, e:
+                self.assertEqual(e.lineno, 2)
+                self.assert_(e.url.endswith("/bad.conf"))
+            else:
+                self.fail("expected ConfigurationSyntaxError")
+
+
 class TestNonExistentResources(unittest.TestCase):
 
     # XXX Not sure if this is the best approach for these.  These
@@ -338,6 +418,7 @@ class TestResourcesInZip(unittest.TestCase):
 
 def test_suite():
     suite = unittest.makeSuite(LoaderTestCase)
+    suite.addTest(unittest.makeSuite(TestParseCache))
     suite.addTest(unittest.makeSuite(TestNonExistentResources))
     suite.addTest(unittest.makeSuite(TestResourcesInZip))
     return suite
@@ -0,0 +1,263 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests of fetching schema components and includes in worker threads."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.cfgparser
+import ZConfig.loader
+import ZConfig.prefetch
+import ZConfig.schema
+import ZConfig.schemacache
+import ZConfig.url
+
+
+SCHEMA = """\
+<schema>
+  <import package='ZConfig.components.logger'/>
+  <import package='ZConfig.tests.library.widget'/>
+  <import package='ZConfig.tests.library.thing'/>
+  <import package='ZConfig.components.basic' file='mapping.xml'/>
+  <section type='eventlog' name='*' attribute='eventlog'/>
+</schema>
+"""
+
+
+def wait(prefetcher):
+    # Wait for all the scheduled jobs, including those they schedule.
+    done = 0
+    while len(prefetcher._jobs) != done:
+        done = len(prefetcher._jobs)
+        for job in prefetcher._jobs.values():
+            job.done.wait(10)
+
+
+class PrefetchTestCase(unittest.TestCase):
+
+    def load(self, text, prefetch, cache=None):
+        loader = ZConfig.loader.SchemaLoader(cache=cache, prefetch=prefetch)
+        schema = loader.loadFile(StringIO(text), "file:///schema.xml")
+        self.assertEqual(loader.prefetcher, None)
+        return schema
+
+    def test_same_schema(self):
+        expected = self.load(SCHEMA, 0)
+        for i in range(5):
+            schema = self.load(SCHEMA, 4)
+            self.assertEqual(schema.gettypenames(), expected.gettypenames())
+            self.assertEqual(schema._components, expected._components)
+            for name in expected.gettypenames():
+                t1 = expected.gettype(name)
+                t2 = schema.gettype(name)
+                self.assertEqual(t1.isabstract(), t2.isabstract())
+                if not t1.isabstract():
+                    self.assertEqual([(k, ci.attribute) for k, ci in t1],
+                                     [(k, ci.attribute) for k, ci in t2])
+
+    def test_same_errors(self):
+        for text in [
+            "<schema><import package='ZConfig.tests.nonexistent'/></schema>",
+            "<schema><import package='ZConfig.tests.library.widget'"
+            " file='missing.xml'/></schema>",
+            "<schema><import package='ZConfig.tests.library.widget'/>"
+            "<unknown/></schema>",
+            "<schema><import package='ZConfig.components.logger'/><schema>",
+            ]:
+            try:
+                self.load(text, 0)
+            except Exception, e:
+                expected = e
+            else:
+                self.fail("expected an error for " + text)
+            try:
+                self.load(text, 4)
+            except Exception, e:
+                self.assertEqual(e.__class__, expected.__class__)
+                self.assertEqual(str(e), str(expected))
+            else:
+                self.fail("expected an error for " + text)
+
+    def test_nested_imports_scheduled(self):
+        loader = ZConfig.loader.SchemaLoader()
+        prefetcher = ZConfig.prefetch.ComponentPrefetcher(loader, 2)
+        try:
+            prefetcher.schedule("ZConfig.components.logger", "")
+            wait(prefetcher)
+            urls = prefetcher._jobs.keys()
+            urls.sort()
+            base = "package:ZConfig.components.logger:"
+            self.assertEqual(urls, [base + name for name in [
+                "abstract.xml", "base-logger.xml", "component.xml",
+                "eventlog.xml", "handlers.xml", "logger.xml"]])
+            events, systemid = prefetcher.get(base + "component.xml")
+            self.assertEqual(events[0][:2],
+                             ("startElement", ("component", {"prefix":
+                              "ZConfig.components.logger.datatypes"})))
+            f = ZConfig.loader.openPackageResource(
+                "ZConfig.components.logger", "component.xml")
+            try:
+                self.assertEqual(systemid, ZConfig.schema._systemId(f))
+            finally:
+                f.close()
+            self.assertEqual(prefetcher.get(base + "unknown.xml"), None)
+        finally:
+            prefetcher.close()
+
+    def test_dependencies_recorded(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = ZConfig.schemacache.SchemaCache(tmpdir)
+            self.load(SCHEMA, 4, cache)
+            loader = ZConfig.loader.SchemaLoader(cache=cache)
+            loader.loadFile(StringIO(SCHEMA), "file:///schema.xml")
+            urls = [dep[0] for dep in
+                    loader._dependencies["file:///schema.xml"]]
+            self.assert_(
+                "package:ZConfig.components.logger:handlers.xml" in urls)
+            self.assert_(
+                "package:ZConfig.tests.library.thing:component.xml" in urls)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+CONFIG_SCHEMA = """\
+<schema>
+  <sectiontype name='part'>
+    <multikey name='item' attribute='items'/>
+  </sectiontype>
+  <multikey name='item' attribute='items'/>
+  <multisection type='part' name='*' attribute='parts'/>
+</schema>
+"""
+
+FILES = {
+    "main.conf": ("%define sub nested\n"
+                  "item main\n"
+                  "%include a.conf\n"
+                  "<part p>\n"
+                  "  %include b.conf\n"
+                  "</part>\n"
+                  "%include ${sub}/d.conf\n"
+                  "%include a.conf\n"),
+    "a.conf": "item a\n%include nested/c.conf\n",
+    "b.conf": "item b-$sub\n",
+    "nested/c.conf": "item c\n",
+    "nested/d.conf": "item d\n%include e.conf\n",
+    "nested/e.conf": "item e\n",
+    }
+
+
+class IncludePrefetchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmpdir, "nested"))
+        for name, text in FILES.items():
+            self.write(name, text)
+        self.schema = ZConfig.loadSchemaFile(StringIO(CONFIG_SCHEMA))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, text):
+        f = open(os.path.join(self.tmpdir, name), "w")
+        f.write(text)
+        f.close()
+
+    def load(self, prefetch):
+        loader = ZConfig.loader.ConfigLoader(self.schema, prefetch=prefetch)
+        conf, handler = loader.loadURL(os.path.join(self.tmpdir, "main.conf"))
+        self.assertEqual(loader.prefetcher, None)
+        return conf
+
+    def test_same_config(self):
+        expected = self.load(0)
+        self.assertEqual(expected.items, ["main", "a", "c", "d", "e",
+                                          "a", "c"])
+        self.assertEqual(expected.parts[0].items, ["b-nested"])
+        for i in range(5):
+            conf = self.load(4)
+            self.assertEqual(conf.items, expected.items)
+            self.assertEqual(conf.parts[0].items, expected.parts[0].items)
+
+    def test_same_errors(self):
+        for name, text in [("nested/c.conf", "<part\n"),
+                           ("nested/e.conf", "unknown-key x\n")]:
+            self.write(name, text)
+            try:
+                self.load(0)
+            except ZConfig.ConfigurationError, e:
+                expected = e
+            else:
+                self.fail("expected an error")
+            try:
+                self.load(4)
+            except ZConfig.ConfigurationError, e:
+                self.assertEqual(e.__class__, expected.__class__)
+                self.assertEqual(str(e), str(expected))
+            else:
+                self.fail("expected an error")
+        os.remove(os.path.join(self.tmpdir, "b.conf"))
+        self.assertRaises(ZConfig.ConfigurationError, self.load, 4)
+
+    def test_scan(self):
+        loader = ZConfig.loader.ConfigLoader(self.schema)
+        prefetcher = ZConfig.prefetch.IncludePrefetcher(loader, 2)
+        try:
+            url = loader.normalizeURL(os.path.join(self.tmpdir, "main.conf"))
+            tokens = ZConfig.cfgparser.tokenize(FILES["main.conf"])
+            prefetcher.scan(url, tokens)
+            wait(prefetcher)
+            urls = prefetcher._jobs.keys()
+            urls.sort()
+            # includes using substitutions aren't scheduled, but
+            # nested includes are
+            self.assertEqual(urls, [ZConfig.url.urljoin(url, name)
+                                    for name in ["a.conf", "b.conf",
+                                                 "nested/c.conf"]])
+            data, key, tokens = prefetcher.get(urls[0])
+            self.assertEqual(data, FILES["a.conf"])
+            self.assertEqual(key, ZConfig.loader._parse_key(urls[0], data))
+            self.assertEqual(tokens, ZConfig.cfgparser.tokenize(data))
+        finally:
+            prefetcher.close()
+
+    def test_unstarted_jobs_are_not_waited_for(self):
+        loader = ZConfig.loader.ConfigLoader(self.schema)
+        prefetcher = ZConfig.prefetch.IncludePrefetcher(loader, 0)
+        try:
+            url = loader.normalizeURL(os.path.join(self.tmpdir, "main.conf"))
+            prefetcher.scan(url, ZConfig.cfgparser.tokenize(
+                FILES["main.conf"]))
+            url = ZConfig.url.urljoin(url, "a.conf")
+            # the caller fetches the resource itself, every time
+            self.assertEqual(prefetcher.get(url), None)
+            self.assertEqual(prefetcher.get(url), None)
+        finally:
+            prefetcher.close()
+
+
+def test_suite():
+    suite = unittest.makeSuite(PrefetchTestCase)
+    suite.addTest(unittest.makeSuite(IncludePrefetchTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,304 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests of ZConfig.reloader."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.loader
+import ZConfig.reloader
+
+
+SCHEMA = """\
+<schema>
+  <sectiontype name='part'>
+    <key name='size' datatype='integer'/>
+  </sectiontype>
+  <key name='title'/>
+  <multikey name='item' attribute='items'/>
+  <multisection type='part' name='*' attribute='parts'/>
+</schema>
+"""
+
+MAIN = """\
+title Example
+item a
+%include parts.conf
+"""
+
+PARTS = """\
+<part one>
+  size 1
+</part>
+<part two>
+  size 2
+</part>
+"""
+
+
+class ReloaderTestBase(unittest.TestCase):
+
+    schema = SCHEMA
+    main = MAIN
+    incremental = False
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.write("schema.xml", self.schema)
+        self.write("main.conf", self.main)
+        self.write("parts.conf", PARTS)
+        self.reloader = ZConfig.reloader.Reloader(
+            self.path("schema.xml"), self.path("main.conf"),
+            incremental=self.incremental)
+        self.config, self.handler = self.reloader.load()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def url(self, name):
+        return ZConfig.loader.BaseLoader().normalizeURL(self.path(name))
+
+    def write(self, name, text):
+        f = open(self.path(name), "w")
+        f.write(text)
+        f.close()
+        # make sure the change is visible even with coarse timestamps
+        t = time.time() + len(text)
+        os.utime(self.path(name), (t, t))
+
+
+class ReloaderTestCase(ReloaderTestBase):
+
+    def test_resources_recorded(self):
+        urls = self.reloader._schema_deps.keys()
+        self.assertEqual(urls, [self.url("schema.xml")])
+        urls = self.reloader._config_deps.keys()
+        urls.sort()
+        self.assertEqual(urls,
+                         [self.url("main.conf"), self.url("parts.conf")])
+
+    def test_unchanged(self):
+        self.assertEqual(self.reloader.changed(), [])
+        self.assertEqual(self.reloader.reload(), None)
+        self.assert_(self.reloader.config is self.config)
+
+    def test_timestamp_change_only(self):
+        t = time.time() - 3600
+        os.utime(self.path("parts.conf"), (t, t))
+        self.assertEqual(self.reloader.reload(), None)
+
+    def test_changed_include(self):
+        schema = self.reloader.schema
+        self.write("parts.conf", PARTS.replace("size 2", "size 3"))
+        self.assertEqual(self.reloader.changed(), [self.url("parts.conf")])
+        config, handler, changes = self.reloader.reload()
+        self.assert_(self.reloader.config is config)
+        self.assert_(self.reloader.schema is schema)
+        self.assertEqual(config.parts[1].size, 3)
+        self.assertEqual(changes, [(("parts", 1, "size"), 2, 3)])
+        self.assertEqual(self.reloader.reload(), None)
+
+    def test_changed_schema(self):
+        schema = self.reloader.schema
+        self.write("schema.xml", SCHEMA.replace(
+            "<key name='title'/>",
+            "<key name='title'/><key name='extra' default='x'/>"))
+        config, handler, changes = self.reloader.reload()
+        self.assert_(self.reloader.schema is not schema)
+        self.assertEqual(changes, [(("extra",), None, "x")])
+
+    def test_new_include(self):
+        self.write("more.conf", "item b\n")
+        self.write("main.conf", MAIN + "%include more.conf\n")
+        config, handler, changes = self.reloader.reload()
+        self.assertEqual(changes, [(("items", 1), None, "b")])
+        self.write("more.conf", "item c\n")
+        self.assertEqual(self.reloader.changed(), [self.url("more.conf")])
+
+    def test_failed_reload(self):
+        self.write("parts.conf", "<part\n")
+        self.assertRaises(ZConfig.ConfigurationError, self.reloader.reload)
+        self.assert_(self.reloader.config is self.config)
+        self.assertEqual(self.reloader.changed(), [self.url("parts.conf")])
+        # restoring the content loaded before makes it current again
+        self.write("parts.conf", PARTS)
+        self.assertEqual(self.reloader.reload(), None)
+
+    def test_removed_resource(self):
+        os.remove(self.path("parts.conf"))
+        self.assertEqual(self.reloader.changed(), [self.url("parts.conf")])
+
+    def test_imported_components_recorded(self):
+        self.write("main.conf", "%import ZConfig.tests.library.widget\n"
+                                + MAIN)
+        self.reloader.reload()
+        urls = self.reloader._config_deps.keys()
+        self.assert_(
+            "package:ZConfig.tests.library.widget:component.xml" in urls)
+
+    def test_diff(self):
+        diff = ZConfig.reloader.diff
+        self.assertEqual(diff(self.config, self.config), [])
+        self.assertEqual(diff([1, 2], [1, 3, 4]),
+                         [((1,), 2, 3), ((2,), None, 4)])
+        self.write("parts.conf", PARTS.replace("<part two>", "<part three>"))
+        config, handler, changes = self.reloader.reload()
+        old, new = self.config.parts[1], config.parts[1]
+        self.assertEqual(changes, [(("parts", 1), old, new)])
+
+
+conversions = []
+
+def counting(section):
+    conversions.append(section.getSectionName())
+    return section
+
+
+INCREMENTAL_SCHEMA = """\
+<schema>
+  <sectiontype name='part' datatype='%s.counting'>
+    <key name='size' datatype='integer' handler='size'/>
+  </sectiontype>
+  <key name='title' handler='title'/>
+  <multisection type='part' name='*' attribute='parts' handler='parts'/>
+</schema>
+""" % __name__
+
+
+class IncrementalReloaderTestCase(ReloaderTestBase):
+
+    schema = INCREMENTAL_SCHEMA
+    main = "title Example\n%include parts.conf\n"
+    incremental = True
+
+    def setUp(self):
+        del conversions[:]
+        ReloaderTestBase.setUp(self)
+
+    def test_unchanged_sections_reused(self):
+        self.assertEqual(conversions, ["one", "two"])
+        self.write("parts.conf", PARTS.replace("size 2", "size 3"))
+        config, handler, changes = self.reloader.reload()
+        self.assert_(config.parts[0] is self.config.parts[0])
+        self.assert_(config.parts[1] is not self.config.parts[1])
+        self.assertEqual(config.parts[1].size, 3)
+        self.assertEqual(conversions, ["one", "two", "two"])
+        self.assertEqual(self.reloader.memo.reused, 1)
+        self.assertEqual(self.reloader.memo.built, 2)
+
+    def test_changed_handlers(self):
+        self.write("parts.conf", PARTS.replace("size 2", "size 3"))
+        config, handler, changes = self.reloader.reload()
+        self.assertEqual(handler.getChangedHandlers(), ["size", "parts"])
+        calls = []
+        handler({"size": calls.append, "title": calls.append,
+                 "parts": lambda value: calls.append(len(value))},
+                changed_only=True)
+        self.assertEqual(calls, [3, 2])
+        del calls[:]
+        handler({"size": calls.append, "title": calls.append,
+                 "parts": lambda value: calls.append(len(value))})
+        self.assertEqual(calls, [1, 3, "Example", 2])
+
+    def test_nested_section_handlers(self):
+        self.write("schema.xml", """\
+<schema>
+  <sectiontype name='inner'>
+    <key name='x' handler='hx'/>
+  </sectiontype>
+  <sectiontype name='outer'>
+    <key name='y' handler='hy'/>
+    <section type='inner' name='*' attribute='inner'/>
+  </sectiontype>
+  <section type='outer' name='*' attribute='outer'/>
+</schema>
+""")
+        nested = "<outer>\n  y 2\n  <inner>\n    x 3\n  </inner>\n</outer>\n"
+        self.write("main.conf", nested)
+        config, handler, changes = self.reloader.reload()
+        self.assertEqual(handler._handlers, [("hx", "3"), ("hy", "2")])
+        # a change that leaves every section the same
+        self.write("main.conf", "# comment\n" + nested)
+        config, handler, changes = self.reloader.reload()
+        self.assertEqual(self.reloader.memo.built, 0)
+        self.assertEqual(handler._handlers, [("hx", "3"), ("hy", "2")])
+        self.assertEqual(handler.getChangedHandlers(), [])
+        calls = []
+        handler({"hx": calls.append, "hy": calls.append})
+        self.assertEqual(calls, ["3", "2"])
+
+    def test_changed_schema(self):
+        self.write("schema.xml", INCREMENTAL_SCHEMA.replace(
+            "<key name='title'",
+            "<key name='extra' default='x'/><key name='title'"))
+        config, handler, changes = self.reloader.reload()
+        # sections of the old schema aren't re-used
+        self.assert_(config.parts[0] is not self.config.parts[0])
+        self.assertEqual(self.reloader.memo.reused, 0)
+        self.assertEqual(changes, [(("extra",), None, "x")])
+
+    def test_overrides_disable_incremental_matching(self):
+        self.reloader.overrides = ["title=Other"]
+        self.write("parts.conf", PARTS.replace("size 2", "size 3"))
+        config, handler, changes = self.reloader.reload()
+        self.assertEqual(config.title, "Other")
+        self.assert_(config.parts[0] is not self.config.parts[0])
+        self.assertEqual(self.reloader.memo.built, 0)
+
+
+class CompositeHandlerTestCase(unittest.TestCase):
+
+    def handler(self, items):
+        schema = ZConfig.loadSchemaFile(StringIO("<schema/>"))
+        return ZConfig.loader.CompositeHandler(items, schema)
+
+    def test_compareWith(self):
+        marker = object()
+        old = self.handler([("a", 1), ("b", marker), ("a", 2), ("c", 3)])
+        new = self.handler([("a", 2), ("b", marker), ("a", 4), ("d", 3)])
+        self.assertEqual(new.getChangedHandlers(), ["a", "b", "d"])
+        new.compareWith(old)
+        self.assertEqual(new.getChangedHandlers(), ["a", "d"])
+        calls = []
+        new({"a": calls.append, "b": calls.append, "d": calls.append},
+            changed_only=True)
+        self.assertEqual(calls, [4, 3])
+
+    def test_uncomparable_values(self):
+        class Uncomparable:
+            def __eq__(self, other):
+                raise RuntimeError("can't compare")
+        old = self.handler([("a", Uncomparable())])
+        new = self.handler([("a", Uncomparable())])
+        new.compareWith(old)
+        self.assertEqual(new.getChangedHandlers(), ["a"])
+
+
+def test_suite():
+    suite = unittest.makeSuite(ReloaderTestCase)
+    suite.addTest(unittest.makeSuite(IncrementalReloaderTestCase))
+    suite.addTest(unittest.makeSuite(CompositeHandlerTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,175 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests of the cache for remote resources."""
+
+import BaseHTTPServer
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib2
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.loader
+import ZConfig.resourcecache
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.path)
+        if server.status != 200:
+            self.send_error(server.status)
+            return
+        try:
+            body, etag = server.documents[self.path]
+        except KeyError:
+            self.send_error(404)
+            return
+        if self.headers.getheader("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer(BaseHTTPServer.HTTPServer):
+    """Stand-in HTTP server, running in a separate thread."""
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), Handler)
+        self.requests = []
+        self.documents = {}
+        self.status = 200
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def url(self, path):
+        return "http://127.0.0.1:%d%s" % (self.server_address[1], path)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+
+class ResourceCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer()
+        self.server.documents["/simple.conf"] = ("key value\n", '"v1"')
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ZConfig.resourcecache.ResourceCache(self.tmpdir)
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, path):
+        f = self.cache.urlopen(self.server.url(path))
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def test_revalidation(self):
+        self.assertEqual(self.read("/simple.conf"), "key value\n")
+        self.assertEqual(self.read("/simple.conf"), "key value\n")
+        self.assertEqual(self.server.requests,
+                         ["/simple.conf", "/simple.conf"])
+        self.server.documents["/simple.conf"] = ("key other\n", '"v2"')
+        self.assertEqual(self.read("/simple.conf"), "key other\n")
+
+    def test_max_age(self):
+        self.cache.max_age = 3600
+        self.read("/simple.conf")
+        self.server.documents["/simple.conf"] = ("key other\n", '"v2"')
+        self.assertEqual(self.read("/simple.conf"), "key value\n")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_stale_on_server_error(self):
+        self.read("/simple.conf")
+        self.server.status = 503
+        self.assertEqual(self.read("/simple.conf"), "key value\n")
+        self.cache.serve_stale = False
+        self.assertRaises(urllib2.HTTPError,
+                          self.read, "/simple.conf")
+
+    def test_stale_on_unreachable_server(self):
+        url = self.server.url("/simple.conf")
+        self.read("/simple.conf")
+        self.server.stop()
+        self.server = None
+        f = self.cache.urlopen(url)
+        self.assertEqual(f.read(), "key value\n")
+
+    def test_missing_resource_not_served_stale(self):
+        self.read("/simple.conf")
+        del self.server.documents["/simple.conf"]
+        self.assertRaises(urllib2.HTTPError,
+                          self.read, "/simple.conf")
+
+    def test_lru_eviction(self):
+        for i in range(4):
+            self.server.documents["/%d" % i] = ("x" * 100, '"%d"' % i)
+        self.cache.maxsize = 250
+        self.read("/0")
+        self.read("/1")
+        self.read("/0")
+        self.read("/2")
+        self.assertEqual(self.cache.getSize(), 200)
+        self.assert_(self.cache.getEntry(self.server.url("/0")))
+        self.assert_(self.cache.getEntry(self.server.url("/2")))
+        self.assertEqual(self.cache.getEntry(self.server.url("/1")), None)
+
+    def test_loader_uses_cache(self):
+        schema = ZConfig.loadSchemaFile(StringIO(
+            "<schema><key name='key'/></schema>"))
+        loader = ZConfig.loader.ConfigLoader(schema)
+        loader.resource_cache = self.cache
+        url = self.server.url("/simple.conf")
+        conf, handler = loader.loadURL(url)
+        self.assertEqual(conf.key, "value")
+        self.server.stop()
+        self.server = None
+        conf, handler = loader.loadURL(url)
+        self.assertEqual(conf.key, "value")
+
+    def test_loader_error_without_cached_copy(self):
+        schema = ZConfig.loadSchemaFile(StringIO(
+            "<schema/>"))
+        loader = ZConfig.loader.ConfigLoader(schema)
+        loader.resource_cache = self.cache
+        url = self.server.url("/missing.conf")
+        self.assertRaises(ZConfig.ConfigurationError, loader.loadURL, url)
+
+
+def test_suite():
+    return unittest.makeSuite(ResourceCacheTestCase)
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
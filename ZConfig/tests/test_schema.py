@@ -15,7 +15,12 @@
 
 import unittest
 
+from StringIO import StringIO
+
 import ZConfig
+import ZConfig.info
+import ZConfig.loader
+import ZConfig.matcher
 
 from ZConfig.tests.support import TestBase, CONFIG_BASE
 
@@ -540,6 +545,91 @@ class SchemaTestCase(TestBase):
         self.assertEqual(get_section_attributes(conf),
                          ["k1", "k2", "keymap"])
 
+    def test_getkeyinfo(self):
+        schema = self.load_schema_text("""\
+            <schema>
+              <sectiontype name='sect'/>
+              <key name='k1'/>
+              <section type='sect' name='s1'/>
+              <key name='+' attribute='keymap'/>
+            </schema>
+            """)
+        k, info = schema.getkeyinfo("k1")
+        self.assertEqual((k, info.name), ("k1", "k1"))
+        k, info = schema.getkeyinfo("s1")
+        self.assert_(info.issection())
+        k, info = schema.getkeyinfo("other")
+        self.assertEqual((k, info.attribute), ("+", "keymap"))
+        # the index is rebuilt when keys are added
+        schema.addkey(ZConfig.info.KeyInfo("other", str, 0, None, "other"))
+        k, info = schema.getkeyinfo("other")
+        self.assertEqual((k, info.attribute), ("other", "other"))
+
+    def test_getkeyinfo_without_arbitrary_key(self):
+        schema = self.load_schema_text("""\
+            <schema>
+              <key name='k1'/>
+            </schema>
+            """)
+        self.assertEqual(schema.getkeyinfo("k2"), None)
+        self.assertRaises(ZConfig.ConfigurationError,
+                          self.load_config_text, schema, "k2 value")
+
+    def test_getsectioninfo(self):
+        schema = self.load_schema_text("""\
+            <schema>
+              <abstracttype name='abstract'/>
+              <sectiontype name='t1' implements='abstract'/>
+              <sectiontype name='t2' implements='abstract'/>
+              <sectiontype name='t3'/>
+              <key name='k1'/>
+              <section type='t1' name='s1'/>
+              <section type='abstract' name='s2'/>
+              <multisection type='t3' name='+' attribute='t3s'/>
+              <multisection type='abstract' name='*' attribute='others'/>
+              <section type='t3' name='s3'/>
+            </schema>
+            """)
+        eq = self.assertEqual
+        eq(schema.getsectioninfo("t1", "s1").attribute, "s1")
+        eq(schema.getsectioninfo("t2", "s2").attribute, "s2")
+        eq(schema.getsectioninfo("t1", None).attribute, "others")
+        eq(schema.getsectioninfo("t2", "other").attribute, "others")
+        eq(schema.getsectioninfo("t3", "other").attribute, "t3s")
+        # the unnamed section comes first, so it wins:
+        eq(schema.getsectioninfo("t3", "s3").attribute, "t3s")
+
+        def check_error(type, name, message):
+            try:
+                schema.getsectioninfo(type, name)
+            except ZConfig.ConfigurationError, e:
+                eq(str(e), message)
+            else:
+                self.fail("expected ConfigurationError")
+
+        check_error("t1", "k1", "section name k1 already in use for key")
+        check_error("t3", "s2", "section type 't3' not allowed for name 's2'")
+        check_error("t2", "s1", "name 's1' must be used for a 't1' section")
+        check_error("t3", None, "'t3' sections must be named")
+        check_error("t4", None,
+                    "no matching section defined for type='t4', name='None'")
+
+    def test_getsectioninfo_new_subtype(self):
+        schema = self.load_schema_text("""\
+            <schema>
+              <abstracttype name='abstract'/>
+              <sectiontype name='t1' implements='abstract'/>
+              <multisection type='abstract' name='*' attribute='others'/>
+            </schema>
+            """)
+        schema.getsectioninfo("t1", None)
+        self.assertRaises(ZConfig.ConfigurationError,
+                          schema.getsectioninfo, "t2", None)
+        t2 = schema.createSectionType("t2", None, None, None)
+        schema.gettype("abstract").addsubtype(t2)
+        self.assertEqual(schema.getsectioninfo("t2", None).attribute,
+                         "others")
+
     def test_arbitrary_key_missing(self):
         schema = self.load_schema_text("""\
             <schema>
@@ -1084,8 +1174,195 @@ class SchemaTestCase(TestBase):
             """)
 
 
+class LazyConversionTestCase(TestBase):
+    """Tests of deferred conversion of key values."""
+
+    schema_text = """\
+        <schema>
+          <sectiontype name='sect'>
+            <key name='value' datatype='integer'/>
+            <key name='label' datatype='%s.counted' default='xyz'/>
+          </sectiontype>
+          <key name='a' datatype='integer'/>
+          <key name='b' datatype='%s.counted' default='abc'/>
+          <key name='h' datatype='integer' handler='h' default='1'/>
+          <multikey name='m' datatype='integer'/>
+          <key name='+' attribute='keymap' datatype='integer'/>
+          <multisection type='sect' name='*' attribute='sections'/>
+        </schema>
+        """ % (__name__, __name__)
+
+    def setUp(self):
+        del counted_values[:]
+        self.schema = self.load_schema_text(self.schema_text)
+
+    def create_config_loader(self, schema):
+        return ZConfig.loader.ConfigLoader(schema, lazy=True,
+                                           compact=self.compact)
+
+    compact = False
+
+    def test_conversion_on_access(self):
+        conf = self.load_config_text(self.schema, """\
+                                     a 42
+                                     m 1
+                                     m 2
+                                     k 3
+                                     <sect/>
+                                     """, num_handlers=1)
+        self.assertEqual(counted_values, [])
+        self.assertEqual(conf.b, "ABC")
+        self.assertEqual(conf.b, "ABC")
+        self.assertEqual(counted_values, ["abc"])
+        self.assertEqual(conf.a, 42)
+        self.assertEqual(conf.m, [1, 2])
+        self.assertEqual(conf.keymap, {"k": 3})
+        self.assertEqual(conf.sections[0].value, None)
+        self.assertEqual(get_section_attributes(conf),
+                         ["a", "b", "h", "keymap", "m", "sections"])
+
+    def test_handler_values_converted_eagerly(self):
+        self.load_config_text(self.schema, "h 2", num_handlers=1)
+        L = []
+        self.handlers({"h": L.append})
+        self.assertEqual(L, [2])
+
+    def test_conversion_error_on_access(self):
+        conf = self.load_config_text(self.schema, "a not-a-number",
+                                     num_handlers=1)
+        self.assertRaises(ZConfig.DataConversionError, getattr, conf, "a")
+        # the error is raised again on the next access
+        self.assertRaises(ZConfig.DataConversionError, getattr, conf, "a")
+        self.assertRaises(AttributeError, getattr, conf, "no_such_attr")
+
+    def test_validate(self):
+        conf = self.load_config_text(self.schema, """\
+                                     a 1
+                                     <sect>
+                                       value 2
+                                     </sect>
+                                     """, num_handlers=1)
+        ZConfig.matcher.validate(conf)
+        counted_values.sort()
+        self.assertEqual(counted_values, ["abc", "xyz"])
+
+        conf = self.load_config_text(self.schema, """\
+                                     <sect>
+                                       value bad
+                                     </sect>
+                                     """, num_handlers=1)
+        self.assertRaises(ZConfig.DataConversionError,
+                          ZConfig.matcher.validate, conf)
+
+    def test_assignment_before_access(self):
+        conf = self.load_config_text(self.schema, "a 1", num_handlers=1)
+        conf.a = "replaced"
+        ZConfig.matcher.validate(conf)
+        self.assertEqual(conf.a, "replaced")
+
+    def test_key_named_validate(self):
+        schema = self.load_schema_text("""\
+            <schema>
+              <sectiontype name='sect'>
+                <key name='validate' datatype='boolean'/>
+              </sectiontype>
+              <section type='sect' name='*' attribute='sect'/>
+            </schema>
+            """)
+        conf = self.load_config_text(schema, """\
+                                     <sect>
+                                       validate on
+                                     </sect>
+                                     """)
+        self.assertEqual(conf.sect.validate, True)
+        ZConfig.matcher.validate(conf)
+        self.assertEqual(conf.sect.validate, True)
+        # the same without lazy conversion
+        conf, handler = ZConfig.loadConfigFile(
+            schema, StringIO("<sect>\n  validate on\n</sect>\n"),
+            compact=self.compact)
+        self.assertEqual(conf.sect.validate, True)
+
+    def test_lazy_with_overrides(self):
+        conf, handler = ZConfig.loadConfigFile(
+            self.schema, StringIO("<sect/>"),
+            overrides=["a=5", "sect/value=6"], lazy=True,
+            compact=self.compact)
+        self.assertEqual(counted_values, [])
+        self.assertEqual(conf.a, 5)
+        self.assertEqual(conf.sections[0].value, 6)
+
+
+class CompactSchemaTestCase(SchemaTestCase):
+    """Run the schema tests using compact section values."""
+
+    def create_config_loader(self, schema):
+        return ZConfig.loader.ConfigLoader(schema, compact=True)
+
+    def test_compact_section_value(self):
+        schema = self.load_schema_text("""\
+            <schema>
+              <sectiontype name='sect'>
+                <key name='value' datatype='integer'/>
+              </sectiontype>
+              <section type='sect' name='*' attribute='sect'/>
+            </schema>
+            """)
+        conf = self.load_config_text(schema, """\
+                                     <sect name>
+                                       value 42
+                                     </sect>
+                                     """)
+        sect = conf.sect
+        self.assert_(isinstance(sect, ZConfig.matcher.CompactSectionValue))
+        self.failIf(hasattr(sect, "__dict__"))
+        self.assertEqual(sect.value, 42)
+        self.assertEqual(sect.getSectionName(), "name")
+        self.assertEqual(sect.getSectionType(), "sect")
+        self.assert_(sect.getSectionDefinition() is schema.gettype("sect"))
+        self.assertEqual(sect.getSectionMatcher(), None)
+        self.assertEqual(sect.getSectionAttributes(), ("value",))
+
+        self.assertEqual(repr(sect), "<CompactSectionValue for sect 'name'>")
+        self.assertEqual(conf.getSectionType(), None)
+        self.assertRaises(AttributeError, setattr, sect, "other", 1)
+
+    def test_reserved_compact_attribute_names(self):
+        for attr in ("_name", "_type", "_pending", "_attributes"):
+            schema = self.load_schema_text("""\
+                <schema>
+                  <sectiontype name='sect'>
+                    <key name='value' attribute='%s'/>
+                  </sectiontype>
+                  <section type='sect' name='*' attribute='sect'/>
+                </schema>
+                """ % attr)
+            try:
+                self.load_config_text(schema, "<sect>\n  value 1\n</sect>\n")
+            except ZConfig.ConfigurationError, e:
+                self.assert_("reserved" in str(e), str(e))
+            else:
+                self.fail("expected ConfigurationError for " + attr)
+
+
+class CompactLazyConversionTestCase(LazyConversionTestCase):
+
+    compact = True
+
+
+counted_values = []
+
+def counted(value):
+    counted_values.append(value)
+    return value.upper()
+
+
 def test_suite():
-    return unittest.makeSuite(SchemaTestCase)
+    suite = unittest.makeSuite(SchemaTestCase)
+    suite.addTest(unittest.makeSuite(LazyConversionTestCase))
+    suite.addTest(unittest.makeSuite(CompactSchemaTestCase))
+    suite.addTest(unittest.makeSuite(CompactLazyConversionTestCase))
+    return suite
 
 if __name__ == '__main__':
     unittest.main(defaultTest='test_suite')
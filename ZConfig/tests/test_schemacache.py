@@ -0,0 +1,195 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests of the persistent schema cache."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.loader
+import ZConfig.schema
+import ZConfig.schemacache
+
+
+SCHEMA = """\
+<schema>
+  <import package="ZConfig.components.logger"/>
+  <import src="base.xml"/>
+  <key name="port" datatype="port-number" default="8080"/>
+  <multikey name="path" datatype="string"/>
+  <section type="base" name="*" attribute="base"/>
+  <multisection type="ZConfig.logger.log" name="*" attribute="loggers"/>
+</schema>
+"""
+
+BASE = """\
+<schema>
+  <sectiontype name="base">
+    <key name="value" datatype="integer" default="%s"/>
+  </sectiontype>
+</schema>
+"""
+
+
+class SchemaCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cachedir = os.path.join(self.tmpdir, "cache")
+        self.cache = ZConfig.schemacache.SchemaCache(self.cachedir)
+        self.schemafile = self.write("schema.xml", SCHEMA)
+        self.write("base.xml", BASE % 42)
+        self.parses = 0
+        self._parseResource = ZConfig.schema.parseResource
+        def parseResource(resource, loader):
+            self.parses += 1
+            return self._parseResource(resource, loader)
+        ZConfig.schema.parseResource = parseResource
+
+    def tearDown(self):
+        ZConfig.schema.parseResource = self._parseResource
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, text):
+        fn = os.path.join(self.tmpdir, name)
+        f = open(fn, "w")
+        f.write(text)
+        f.close()
+        return fn
+
+    def load(self):
+        loader = ZConfig.loader.SchemaLoader(cache=self.cache)
+        return loader.loadURL(self.schemafile)
+
+    def load_config(self, schema):
+        conf, handler = ZConfig.loadConfigFile(schema, StringIO(
+            "path a\n"
+            "path b\n"
+            "<base/>\n"
+            "<logger>\n"
+            "  name foo\n"
+            "</logger>\n"))
+        return conf
+
+    def test_reuse_cached_schema(self):
+        schema = self.load()
+        self.assertEqual(self.parses, 2)
+        self.assertEqual(len(os.listdir(self.cachedir)), 2)
+        cached = self.load()
+        self.assertEqual(self.parses, 2)
+        self.assert_(cached is not schema)
+        self.assertEqual(cached.url, schema.url)
+        self.assertEqual(sorted(cached.gettypenames()),
+                         sorted(schema.gettypenames()))
+        conf = self.load_config(cached)
+        self.assertEqual(conf.port, 8080)
+        self.assertEqual(conf.path, ["a", "b"])
+        self.assertEqual(conf.base.value, 42)
+        self.assertEqual(conf.loggers[0].name, "foo")
+
+    def test_conversions_come_from_registry(self):
+        self.load()
+        loader = ZConfig.loader.SchemaLoader(cache=self.cache)
+        schema = loader.loadURL(self.schemafile)
+        self.assert_(schema.registry is loader.registry)
+        self.assert_(schema.getinfo("port").datatype
+                     is loader.registry.get("port-number"))
+        self.assert_(schema.getinfo("path").maxOccurs
+                     is ZConfig.info.Unbounded)
+
+    def test_change_in_schema_invalidates(self):
+        self.load()
+        self.write("schema.xml", SCHEMA.replace("8080", "8081"))
+        conf = self.load_config(self.load())
+        self.assertEqual(conf.port, 8081)
+        self.assertEqual(self.parses, 3)
+
+    def test_change_in_imported_schema_invalidates(self):
+        self.load()
+        self.write("base.xml", BASE % 24)
+        # make sure the timestamp doesn't hide the change
+        os.utime(os.path.join(self.tmpdir, "base.xml"), (0, 0))
+        conf = self.load_config(self.load())
+        self.assertEqual(conf.base.value, 24)
+        self.assertEqual(self.parses, 4)
+
+    def test_touched_but_unchanged_dependency(self):
+        self.load()
+        os.utime(os.path.join(self.tmpdir, "base.xml"), (0, 0))
+        self.load()
+        self.assertEqual(self.parses, 2)
+
+    def test_recent_timestamps_not_trusted(self):
+        fn = os.path.join(self.tmpdir, "base.xml")
+        url = ZConfig.loader.BaseLoader().normalizeURL(fn)
+        dep = ZConfig.schemacache.describeResource(url, BASE % 42)
+        self.assertEqual(dep[2], None)
+        # rewritten after it was read, without changing the timestamp
+        # or the size
+        st = os.stat(fn)
+        self.write("base.xml", BASE % 24)
+        os.utime(fn, (st.st_atime, st.st_mtime))
+        loader = ZConfig.loader.SchemaLoader()
+        self.assert_(not ZConfig.schemacache.isCurrent(dep, loader))
+        # older timestamps are used
+        os.utime(fn, (0, 0))
+        dep = ZConfig.schemacache.describeResource(url, "stale")
+        self.assertEqual(dep[2], 0)
+        self.assert_(ZConfig.schemacache.isCurrent(dep, loader))
+
+    def test_component_dependencies_recorded(self):
+        self.load()
+        loader = ZConfig.loader.SchemaLoader(cache=self.cache)
+        loader.loadURL(self.schemafile)
+        url = loader.normalizeURL(self.schemafile)
+        urls = [dep[0] for dep in loader._dependencies[url]]
+        self.assert_(url in urls)
+        self.assert_(
+            "package:ZConfig.components.logger:handlers.xml" in urls)
+        self.assert_(loader.normalizeURL(
+            os.path.join(self.tmpdir, "base.xml")) in urls)
+
+    def test_corrupt_entry_is_ignored(self):
+        self.load()
+        url = ZConfig.loader.SchemaLoader().normalizeURL(self.schemafile)
+        f = open(self.cache.getFilename(url), "wb")
+        f.write("not a pickle")
+        f.close()
+        self.load()
+        self.assertEqual(self.parses, 3)
+        self.load()
+        self.assertEqual(self.parses, 3)
+
+    def test_invalidate(self):
+        self.load()
+        self.cache.invalidate()
+        self.assertEqual(os.listdir(self.cachedir), [])
+        self.load()
+        self.assertEqual(self.parses, 4)
+
+    def test_schema_without_url_not_cached(self):
+        loader = ZConfig.loader.SchemaLoader(cache=self.cache)
+        loader.loadFile(StringIO("<schema/>"))
+        self.assertEqual(os.listdir(self.cachedir), [])
+
+
+def test_suite():
+    return unittest.makeSuite(SchemaCacheTestCase)
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
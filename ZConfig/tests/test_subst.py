@@ -19,7 +19,8 @@ from __future__ import nested_scopes
 import unittest
 
 from ZConfig import SubstitutionReplacementError, SubstitutionSyntaxError
-from ZConfig.substitution import isname, substitute
+from ZConfig.substitution import isname, substitute, substituteAll
+from ZConfig.substitution import getTemplate
 
 
 class SubstitutionTestCase(unittest.TestCase):
@@ -79,6 +80,39 @@ class SubstitutionTestCase(unittest.TestCase):
         d = {"name": "$value"}
         self.assertEqual(substitute("$name", d), "$value")
 
+    def test_error_order(self):
+        # names before a syntax error are replaced first
+        self.assertRaises(SubstitutionReplacementError,
+                          substitute, "$undefined ${", {})
+        self.assertRaises(SubstitutionSyntaxError,
+                          substitute, "$name ${", {"name": "value"})
+        try:
+            substitute("a ${name", {})
+        except SubstitutionSyntaxError, e:
+            self.assertEqual(e.message, "'${name' not followed by '}'")
+        else:
+            self.fail("expected SubstitutionSyntaxError")
+
+    def test_templates(self):
+        t = getTemplate("$name/${other}$$")
+        self.assert_(getTemplate("$name/${other}$$") is t)
+        self.assertEqual(t.render({"name": "a", "other": "b"}), "a/b$")
+        self.assertEqual(t.render({"name": "c", "other": "d"}), "c/d$")
+        try:
+            t.render({"name": "a"})
+        except SubstitutionReplacementError, e:
+            self.assertEqual(e.source, "$name/${other}$$")
+            self.assertEqual(e.name, "other")
+        else:
+            self.fail("expected SubstitutionReplacementError")
+
+    def test_substitute_all(self):
+        d = {"name": "value"}
+        self.assertEqual(substituteAll(["plain", "$name", "x${name}y"], d),
+                         ["plain", "value", "xvaluey"])
+        self.assertRaises(SubstitutionReplacementError,
+                          substituteAll, ["$name", "$other"], d)
+
     def test_isname(self):
         self.assert_(isname("abc"))
         self.assert_(isname("abc_def"))
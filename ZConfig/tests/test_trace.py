@@ -0,0 +1,168 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests of ZConfig.trace and the tracing support of the loaders."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import ZConfig
+import ZConfig.loader
+import ZConfig.trace
+
+
+SCHEMA = """\
+<schema>
+  <import package='ZConfig.tests.library.widget'/>
+  <sectiontype name='part'>
+    <key name='size' datatype='integer'/>
+    <key name='ratio' datatype='float' default='0.5'/>
+  </sectiontype>
+  <key name='title'/>
+  <multikey name='count' attribute='counts' datatype='integer'/>
+  <multisection type='part' name='*' attribute='parts'/>
+</schema>
+"""
+
+MAIN = """\
+title Example
+count 1
+count 2
+%include parts.conf
+"""
+
+PARTS = """\
+<part one>
+  size 1
+</part>
+"""
+
+
+class TraceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.write("schema.xml", SCHEMA)
+        self.write("main.conf", MAIN)
+        self.write("parts.conf", PARTS)
+        self.tracer = ZConfig.trace.Tracer()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, text):
+        f = open(os.path.join(self.tmpdir, name), "w")
+        f.write(text)
+        f.close()
+
+    def url(self, name):
+        return ZConfig.loader.BaseLoader().normalizeURL(
+            os.path.join(self.tmpdir, name))
+
+    def load(self, lazy=False):
+        loader = ZConfig.loader.SchemaLoader()
+        loader.tracer = self.tracer
+        schema = loader.loadURL(self.url("schema.xml"))
+        loader = ZConfig.loader.ConfigLoader(schema, lazy=lazy)
+        loader.tracer = self.tracer
+        return loader.loadURL(self.url("main.conf"))
+
+    def spans(self, kind):
+        return [span for span in self.tracer.spans if span.kind == kind]
+
+    def test_open_and_parse(self):
+        self.load()
+        opened = [span.url for span in self.spans("open")]
+        self.assertEqual(opened[0], self.url("schema.xml"))
+        self.assert_("package:ZConfig.tests.library.widget:component.xml"
+                     in opened)
+        self.assertEqual(opened[-2:],
+                         [self.url("main.conf"), self.url("parts.conf")])
+        parsed = [(span.type, span.url) for span in self.spans("parse")]
+        self.assertEqual(parsed[-2:], [("config", self.url("parts.conf")),
+                                       ("config", self.url("main.conf"))])
+        self.assert_(("schema", self.url("schema.xml")) in parsed)
+        self.assert_(("component", "package:ZConfig.tests.library.widget:"
+                      "component.xml") in parsed)
+        for span in self.tracer.spans:
+            self.assert_(span.duration >= 0)
+        # the included resource is parsed within the main resource
+        outer, inner = self.spans("parse")[-1], self.spans("parse")[-2]
+        self.assert_(outer.start <= inner.start <= inner.end <= outer.end)
+
+    def test_sections(self):
+        self.load()
+        sections = self.spans("section")
+        self.assertEqual(len(sections), 2)
+        span = sections[0]
+        self.assertEqual((span.type, span.name), ("part", "one"))
+        self.assertEqual((span.url, span.line), (self.url("parts.conf"), 3))
+        self.assertEqual(sections[1].url, self.url("main.conf"))
+
+    def test_conversions(self):
+        self.load()
+        converted = {}
+        for span in self.spans("convert"):
+            converted[span.type, span.name] = span
+        span = converted["part", "size"]
+        self.assertEqual(span.datatype, "integer")
+        self.assertEqual((span.url, span.line), (self.url("parts.conf"), 2))
+        span = converted[None, "count"]
+        self.assertEqual(span.datatype, "integer")
+        self.assertEqual((span.url, span.line), (self.url("main.conf"), 2))
+        self.assertEqual(converted["part", "ratio"].datatype, "float")
+        # the section's own datatype
+        self.assertEqual(converted["part", None].datatype, "null")
+
+    def test_summaries(self):
+        self.load()
+        keys = self.tracer.keySummary()
+        d = {}
+        for key, count, seconds in keys:
+            d[key] = count
+        self.assertEqual(d[("part", "size")], 1)
+        self.assertEqual(d[(None, "title")], 1)
+        costs = [seconds for key, count, seconds in keys]
+        sorted = list(costs)
+        sorted.sort()
+        sorted.reverse()
+        self.assertEqual(costs, sorted)
+        d = {}
+        for name, count, seconds in self.tracer.datatypeSummary():
+            d[name] = count
+        self.assertEqual(d["integer"], 2)
+        self.assertEqual(d["float"], 1)
+
+    def test_lazy_conversions_not_traced(self):
+        conf, handler = self.load(lazy=True)
+        self.assertEqual(conf.parts[0].size, 1)
+        self.assertEqual(self.spans("convert"),
+                         [span for span in self.spans("convert")
+                          if span.name is None])
+
+    def test_disabled(self):
+        loader = ZConfig.loader.ConfigLoader(
+            ZConfig.loadSchema(os.path.join(self.tmpdir, "schema.xml")))
+        self.assertEqual(loader.tracer, None)
+        conf, handler = loader.loadURL(self.url("main.conf"))
+        self.assertEqual(conf.counts, [1, 2])
+        self.assertEqual(self.tracer.spans, [])
+
+
+def test_suite():
+    return unittest.makeSuite(TraceTestCase)
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,271 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests of the persistent HTTP transport."""
+
+import BaseHTTPServer
+import shutil
+import SocketServer
+import tempfile
+import threading
+import time
+import unittest
+import urllib2
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.loader
+import ZConfig.resourcecache
+import ZConfig.transport
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # Send each response in one piece; writing headers separately
+    # interacts badly with delayed ACKs on persistent connections.
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.count("connections")
+
+    def do_GET(self):
+        server = self.server
+        server.count("active")
+        try:
+            server.requests.append(self.path)
+            time.sleep(server.delay)
+            if server.failures:
+                server.failures -= 1
+                self.respond(503, "")
+                return
+            if self.path.startswith("/redirect"):
+                self.send_response(302)
+                self.send_header("Location", self.path[9:])
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = server.documents.get(self.path)
+            if body is None:
+                self.respond(404, "not found")
+            elif self.headers.getheader("If-None-Match") == '"1"':
+                self.respond(304, "")
+            else:
+                self.respond(200, body)
+        finally:
+            server.count("active", -1)
+
+    def do_POST(self):
+        length = int(self.headers.getheader("Content-Length"))
+        self.server.bodies.append(self.rfile.read(length))
+        self.do_GET()
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Stand-in HTTP/1.1 server, running in a separate thread."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), Handler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.bodies = []
+        self.documents = {}
+        self.failures = 0
+        self.delay = 0
+        self.connections = 0
+        self.active = 0
+        self.maxactive = 0
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def count(self, name, delta=1):
+        self.lock.acquire()
+        try:
+            value = getattr(self, name) + delta
+            setattr(self, name, value)
+            if name == "active":
+                self.maxactive = max(self.maxactive, value)
+        finally:
+            self.lock.release()
+
+    def url(self, path):
+        return "http://127.0.0.1:%d%s" % (self.server_address[1], path)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+
+class TransportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer()
+        self.server.documents["/a.conf"] = "key a\n%include b.conf\n"
+        self.server.documents["/b.conf"] = "key b\n"
+        self.transport = ZConfig.transport.HTTPTransport(backoff=0.001)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.stop()
+
+    def read(self, path):
+        f = self.transport.urlopen(self.server.url(path))
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def test_connection_reuse(self):
+        for i in range(5):
+            self.assertEqual(self.read("/b.conf"), "key b\n")
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.transport.connections, 1)
+        self.assertEqual(self.transport.requests, 5)
+
+    def test_reconnect_after_server_closes(self):
+        self.read("/b.conf")
+        # close the idle connection behind the transport's back
+        for conns in self.transport._idle.values():
+            for conn in conns:
+                conn.sock.close()
+        self.assertEqual(self.read("/b.conf"), "key b\n")
+
+    def test_response(self):
+        f = self.transport.urlopen(self.server.url("/b.conf"))
+        self.assertEqual(f.code, 200)
+        self.assertEqual(f.getcode(), 200)
+        self.assertEqual(f.geturl(), self.server.url("/b.conf"))
+        self.assertEqual(f.info().getheader("ETag"), '"1"')
+        self.assertEqual(self.read("/redirect/b.conf"), "key b\n")
+
+    def test_errors(self):
+        try:
+            self.read("/missing.conf")
+        except urllib2.HTTPError, e:
+            self.assertEqual(e.code, 404)
+            self.assertEqual(e.read(), "not found")
+        else:
+            self.fail("expected HTTPError")
+        url = self.server.url("/b.conf")
+        self.server.stop()
+        self.transport.close()
+        self.assertRaises(urllib2.URLError, self.transport.urlopen, url)
+        self.server = LocalServer()
+
+    def test_retries(self):
+        self.server.failures = 2
+        self.assertEqual(self.read("/b.conf"), "key b\n")
+        self.assertEqual(len(self.server.requests), 3)
+        self.server.failures = 3
+        try:
+            self.read("/b.conf")
+        except urllib2.HTTPError, e:
+            self.assertEqual(e.code, 503)
+        else:
+            self.fail("expected HTTPError")
+
+    def test_post(self):
+        self.server.documents["/log"] = "ok"
+        req = urllib2.Request(self.server.url("/log"), "data",
+                              {"Content-Type": "text/plain"})
+        self.assertEqual(self.transport.urlopen(req).read(), "ok")
+        self.assertEqual(self.transport.urlopen(req).read(), "ok")
+        self.assertEqual(self.server.bodies, ["data", "data"])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_post_not_retried_once_sent(self):
+        self.server.documents["/log"] = "ok"
+        self.server.failures = 1
+        req = urllib2.Request(self.server.url("/log"), "data")
+        try:
+            self.transport.urlopen(req)
+        except urllib2.HTTPError, e:
+            self.assertEqual(e.code, 503)
+        else:
+            self.fail("expected HTTPError")
+        self.assertEqual(self.server.bodies, ["data"])
+
+    def test_post_retried_before_sending(self):
+        url = self.server.url("/log")
+        self.server.stop()
+        self.transport.close()
+        attempts = []
+        connection = self.transport._connection
+        def _connection(key):
+            attempts.append(key)
+            return connection(key)
+        self.transport._connection = _connection
+        self.assertRaises(urllib2.URLError, self.transport.urlopen,
+                          urllib2.Request(url, "data"))
+        self.assertEqual(len(attempts), 3)
+        self.server = LocalServer()
+
+    def test_concurrency_limit(self):
+        self.transport.maxconnections = 2
+        self.server.delay = 0.02
+        threads = [threading.Thread(target=self.read, args=("/b.conf",))
+                   for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertEqual(self.server.maxactive, 2)
+        self.assertEqual(self.transport.connections, 2)
+
+    def test_loader(self):
+        schema = ZConfig.loadSchemaFile(StringIO(
+            "<schema><multikey name='key' attribute='keys'/></schema>"))
+        loader = ZConfig.loader.ConfigLoader(schema)
+        loader.transport = self.transport
+        conf, handler = loader.loadURL(self.server.url("/a.conf"))
+        self.assertEqual(conf.keys, ["a", "b"])
+        self.assertEqual(self.server.connections, 1)
+        self.assertRaises(ZConfig.ConfigurationError,
+                          loader.loadURL, self.server.url("/missing.conf"))
+
+    def test_resource_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = ZConfig.resourcecache.ResourceCache(tmpdir)
+            cache.transport = self.transport
+            url = self.server.url("/b.conf")
+            self.assertEqual(cache.urlopen(url).read(), "key b\n")
+            # revalidated with a conditional request
+            self.assertEqual(cache.urlopen(url).read(), "key b\n")
+            self.assertEqual(self.server.connections, 1)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+def test_suite():
+    return unittest.makeSuite(TransportTestCase)
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
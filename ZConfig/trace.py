@@ -0,0 +1,109 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Timing the phases of loading schemas and configurations.
+
+A tracer is set as the `tracer` attribute of a loader.  Its span()
+method is called as each phase of the load ends:
+
+  open      a resource was opened; `url` is set
+  parse     a schema, component or configuration resource was parsed;
+            `url` is set, and `type` is "schema", "component" or
+            "config".  Nested resources are parsed within this span.
+  section   a configuration section was matched to its section type
+            (BaseMatcher.finish()); `type` and `name` are those of the
+            section and `url` and `line` give the end of the section
+  convert   a value was converted by its datatype; `type` is the name
+            of the section type, `name` is the key name, or None for
+            the section's own datatype, and `datatype` is the name of
+            the datatype.  `url` and `line` give the first value for
+            the key, if known.
+
+Values converted lazily, when first accessed, are not traced.  When no
+tracer is set, the cost is a test of the attribute at each of these
+points.
+"""
+
+import threading
+
+
+class Span:
+    """One timed phase of a load."""
+
+    def __init__(self, kind, start, end, url=None, line=None, type=None,
+                 name=None, datatype=None):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.duration = end - start
+        self.url = url
+        self.line = line
+        self.type = type
+        self.name = name
+        self.datatype = datatype
+
+    def __repr__(self):
+        return "<%s %s %.6f %s>" % (self.__class__.__name__, self.kind,
+                                    self.duration, self.url)
+
+
+class Tracer:
+    """Tracer that keeps the spans it receives.
+
+    span() may be called from several threads when resources are
+    fetched concurrently.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = []
+
+    def span(self, kind, start, end, url=None, line=None, type=None,
+             name=None, datatype=None):
+        span = Span(kind, start, end, url, line, type, name, datatype)
+        self._lock.acquire()
+        try:
+            self.spans.append(span)
+        finally:
+            self._lock.release()
+
+    def summarize(self, kind, tags):
+        """Return the cost of the spans of `kind` grouped by `tags`.
+
+        `tags` is a sequence of span attribute names.  The result is a
+        list of (values, count, seconds) tuples, where `values` is a
+        tuple of the values of the tags, most expensive first.
+        """
+        totals = {}
+        for span in self.spans:
+            if span.kind == kind:
+                key = tuple([getattr(span, tag) for tag in tags])
+                count, seconds = totals.get(key, (0, 0.0))
+                totals[key] = count + 1, seconds + span.duration
+        L = [(seconds, count, key)
+             for key, (count, seconds) in totals.items()]
+        L.sort()
+        L.reverse()
+        return [(key, count, seconds) for seconds, count, key in L]
+
+    def keySummary(self):
+        """Return the conversion cost for each key of each section type.
+
+        Keys are identified by (section type name, key name).
+        """
+        return self.summarize("convert", ("type", "name"))
+
+    def datatypeSummary(self):
+        """Return the conversion cost for each datatype."""
+        return [(key[0], count, seconds) for key, count, seconds
+                in self.summarize("convert", ("datatype",))]
@@ -0,0 +1,220 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""HTTP transport with persistent connections.
+
+An HTTPTransport can be set as the `transport` attribute of a loader
+or a ZConfig.resourcecache.ResourceCache; its urlopen() method is then
+used instead of urllib2.urlopen() for http: and https: URLs.
+
+Connections are kept open and re-used for later requests to the same
+host.  The number of simultaneous requests to each host is limited,
+and requests that fail because of a connection error or a server
+error are retried after an exponentially increasing delay.  Requests
+that aren't idempotent, such as POST requests, are only retried if
+they fail before they are sent, so the server never sees them twice.
+"""
+
+import httplib
+import select
+import socket
+import sys
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+
+from cStringIO import StringIO
+
+
+class HTTPTransport:
+
+    schemes = ("http", "https")
+
+    # Maximum number of redirections followed for a request.
+    max_redirects = 10
+
+    # Methods of requests that can be retried after they were sent.
+    idempotent_methods = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE")
+
+    def __init__(self, maxconnections=4, timeout=None, retries=2,
+                 backoff=0.1):
+        # maxconnections - maximum number of simultaneous requests to
+        #                  one host, and of connections kept open
+        # timeout        - socket timeout for requests, or None
+        # retries        - number of times a failed request is retried
+        # backoff        - delay before the first retry, in seconds;
+        #                  the delay doubles for each later retry
+        if timeout is not None and sys.version_info < (2, 6):
+            raise ValueError("socket timeouts require at least Python 2.6")
+        self.maxconnections = maxconnections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._idle = {}    # (scheme, host) -> [connection, ...]
+        self._slots = {}   # (scheme, host) -> threading.Semaphore
+        self.connections = 0
+        self.requests = 0
+
+    def urlopen(self, req):
+        """Return a file object for `req`, a URL or urllib2.Request.
+
+        A request with data is sent as a POST.  The response is read
+        completely before returning.  Exceptions are the same as those
+        raised by urllib2.urlopen().
+        """
+        if isinstance(req, basestring):
+            req = urllib2.Request(req)
+        for i in range(self.max_redirects + 1):
+            url = req.get_full_url()
+            scheme = url.split(":", 1)[0].lower()
+            if scheme not in self.schemes:
+                return urllib2.urlopen(req)
+            status, reason, headers, data = self._request(req)
+            location = headers.getheader("Location")
+            if status in (301, 302, 303, 307) and location:
+                newreq = urllib2.Request(urlparse.urljoin(url, location))
+                for name, value in req.header_items():
+                    newreq.add_header(name, value)
+                req = newreq
+                continue
+            if status >= 400 or status == 304:
+                raise urllib2.HTTPError(url, status, reason, headers,
+                                        StringIO(data))
+            # The status argument of addinfourl() is new in Python 2.6.
+            f = urllib.addinfourl(StringIO(data), headers, url)
+            f.code = status
+            return f
+        raise urllib2.HTTPError(url, status, "too many redirections",
+                                headers, StringIO(data))
+
+    def close(self):
+        """Close all idle connections."""
+        self._lock.acquire()
+        try:
+            idle = self._idle
+            self._idle = {}
+        finally:
+            self._lock.release()
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    # internal helpers
+
+    def _request(self, req):
+        scheme, host, path, query, fragment = urlparse.urlsplit(
+            req.get_full_url())
+        if query:
+            path += "?" + query
+        key = scheme.lower(), host
+        headers = dict(req.header_items())
+        method = req.get_method()
+        idempotent = method in self.idempotent_methods
+        slot = self._slot(key)
+        slot.acquire()
+        try:
+            attempt = 0
+            while 1:
+                conn, reused = self._connection(key)
+                sent = False
+                try:
+                    conn.request(method, path or "/", req.get_data(),
+                                 headers)
+                    sent = True
+                    response = conn.getresponse()
+                    data = response.read()
+                except (httplib.HTTPException, socket.error), e:
+                    conn.close()
+                    if sent and not idempotent:
+                        # The server may have acted on the request.
+                        raise urllib2.URLError(e)
+                    if reused:
+                        # The server may have closed the idle
+                        # connection; that doesn't count as a failure.
+                        continue
+                    if attempt >= self.retries:
+                        raise urllib2.URLError(e)
+                else:
+                    if response.will_close:
+                        conn.close()
+                    else:
+                        self._release(key, conn)
+                    if (response.status < 500 or attempt >= self.retries
+                        or not idempotent):
+                        return (response.status, response.reason,
+                                response.msg, data)
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+        finally:
+            slot.release()
+
+    def _slot(self, key):
+        self._lock.acquire()
+        try:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = threading.Semaphore(self.maxconnections)
+                self._slots[key] = slot
+            return slot
+        finally:
+            self._lock.release()
+
+    def _connection(self, key):
+        self._lock.acquire()
+        try:
+            self.requests += 1
+            idle = self._idle.get(key)
+            while idle:
+                conn = idle.pop()
+                if _usable(conn):
+                    return conn, True
+                conn.close()
+            self.connections += 1
+        finally:
+            self._lock.release()
+        scheme, host = key
+        if scheme == "https":
+            factory = httplib.HTTPSConnection
+        else:
+            factory = httplib.HTTPConnection
+        if self.timeout is None:
+            return factory(host), False
+        else:
+            return factory(host, timeout=self.timeout), False
+
+    def _release(self, key, conn):
+        self._lock.acquire()
+        try:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxconnections:
+                idle.append(conn)
+                return
+        finally:
+            self._lock.release()
+        conn.close()
+
+
+def _usable(conn):
+    # An idle connection has nothing to read unless the server closed
+    # it; check before sending a request the server may not see.
+    sock = conn.sock
+    if sock is None:
+        return False
+    try:
+        readable = select.select([sock], [], [], 0)[0]
+    except (select.error, socket.error, ValueError):
+        return False
+    return not readable
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Compare loading remote configurations with and without HTTPTransport.
+
+usage:  bench_http.py [-i includes] [-l latency] [-r repeat]
+
+A local HTTP/1.1 server serves a configuration that includes the
+requested number of other resources.  Each new connection is delayed
+by `latency` milliseconds to stand in for TCP and TLS handshakes with
+a remote server.  The configuration is loaded using urllib2, using an
+HTTPTransport, and using an HTTPTransport with prefetching of
+includes.
+"""
+
+import BaseHTTPServer
+import getopt
+import SocketServer
+import sys
+import threading
+import time
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.loader
+import ZConfig.transport
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # Send each response in one piece; writing headers separately
+    # interacts badly with delayed ACKs on persistent connections.
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        time.sleep(self.server.latency)
+
+    def do_GET(self):
+        body = self.server.documents.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, documents, latency):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), Handler)
+        self.documents = documents
+        self.latency = latency
+        t = threading.Thread(target=self.serve_forever)
+        t.setDaemon(True)
+        t.start()
+
+    def url(self, path):
+        return "http://127.0.0.1:%d%s" % (self.server_address[1], path)
+
+
+def make_documents(nincludes):
+    documents = {}
+    L = []
+    for i in range(nincludes):
+        L.append("%%include part%d.conf" % i)
+        documents["/part%d.conf" % i] = "\n".join(
+            ["item part%d-%d" % (i, j) for j in range(20)]) + "\n"
+    documents["/main.conf"] = "\n".join(L) + "\n"
+    return documents
+
+
+def run(schema, url, repeat, transport=None, prefetch=0):
+    best = None
+    for i in range(repeat):
+        loader = ZConfig.loader.ConfigLoader(schema, prefetch=prefetch)
+        if transport is not None:
+            loader.transport = transport()
+        t0 = time.time()
+        loader.loadURL(url)
+        t = time.time() - t0
+        if loader.transport is not None:
+            loader.transport.close()
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts, args = getopt.getopt(args, "i:l:r:")
+    nincludes = 20
+    latency = 10
+    repeat = 3
+    for opt, arg in opts:
+        if opt == "-i":
+            nincludes = int(arg)
+        elif opt == "-l":
+            latency = float(arg)
+        elif opt == "-r":
+            repeat = int(arg)
+    schema = ZConfig.loadSchemaFile(StringIO(
+        "<schema><multikey name='item' attribute='items'/></schema>"))
+    server = Server(make_documents(nincludes), latency / 1000.0)
+    url = server.url("/main.conf")
+    print "%d includes, %g ms per connection; best of %d" % (
+        nincludes, latency, repeat)
+    plain = run(schema, url, repeat)
+    pooled = run(schema, url, repeat, ZConfig.transport.HTTPTransport)
+    prefetched = run(schema, url, repeat, ZConfig.transport.HTTPTransport, 4)
+    print "%-24s %8.3f sec" % ("urllib2", plain)
+    print "%-24s %8.3f sec" % ("HTTPTransport", pooled)
+    print "%-24s %8.3f sec" % ("HTTPTransport, prefetch", prefetched)
+    print "speedup: %.2fx, %.2fx" % (plain / pooled, plain / prefetched)
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
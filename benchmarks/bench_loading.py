@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Time the phases of loading schemas and configurations.
+
+usage:  bench_loading.py [-k keys] [-d depth] [-n sections] [-i includes]
+                         [-m imports] [-s substitutions] [-r repeat]
+                         [-o output]
+
+A synthetic schema and configuration are written to a temporary
+directory:
+
+  keys           number of keys in each section type and at the top level
+  depth          nesting depth of the section types
+  sections       number of top-level sections in the configuration
+  includes       number of resources included by the configuration; the
+                 sections are spread over them
+  imports        number of schema components imported by the schema,
+                 each used by one section per include
+  substitutions  number of values in each section using $ substitution
+
+These are timed separately, keeping the best and mean of `repeat` runs:
+
+  loadSchema     ZConfig.loadSchema() for the schema
+  loadConfig     ZConfig.loadConfig() for the configuration
+  parse          ZConfigParser.parse() for the configuration with the
+                 includes inlined, discarding the results
+  finish         BaseMatcher.finish() for all sections, including constuct()
+  constuct       BaseMatcher.constuct() for all sections
+  schemaless     ZConfig.schemaless.loadConfigFile() for the configuration
+                 with the includes inlined and the substitutions made,
+                 since includes and %define aren't supported
+
+The results are written as JSON to `output`, or to standard output, so
+they can be compared across releases.
+"""
+
+import getopt
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import json
+except ImportError:
+    # Python 2.5
+    import simplejson as json
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.cfgparser
+import ZConfig.loader
+import ZConfig.matcher
+import ZConfig.schemaless
+
+
+PACKAGE = "zconfigbench"
+
+# (data type, value) pairs used for keys, in turn
+KEYTYPES = [
+    ("string", "value-%d"),
+    ("integer", "%d"),
+    ("boolean", "on"),
+    ("float", "%d.5"),
+    ("identifier", "name_%d"),
+    ("port-number", "8%03d"),
+    ]
+
+
+def keytype(i):
+    return KEYTYPES[i % len(KEYTYPES)]
+
+
+def make_keys(nkeys, indent):
+    return ["%s<key name='key%d' datatype='%s'/>"
+            % (indent, i, keytype(i)[0]) for i in range(nkeys)]
+
+
+def make_value(i):
+    datatype, value = keytype(i)
+    if "%" in value:
+        value = value % (i % 1000)
+    return value
+
+
+def make_values(nkeys, nsubst, indent):
+    L = []
+    for i in range(nkeys):
+        if i < nsubst:
+            # replaced by the value defined by make_config()
+            L.append("%skey%d ${value%d}" % (indent, i, i))
+        else:
+            L.append("%skey%d %s" % (indent, i, make_value(i)))
+    return L
+
+
+def make_schema(params):
+    """Return {name: text} for the schema and its components."""
+    nkeys = params["keys"]
+    depth = params["depth"]
+    files = {}
+    L = ["<schema>"]
+    for i in range(params["imports"]):
+        L.append("  <import package='%s.component%d'/>" % (PACKAGE, i))
+        files[os.path.join(PACKAGE, "component%d" % i, "__init__.py")] = ""
+        files[os.path.join(PACKAGE, "component%d" % i, "component.xml")] = (
+            "<component>\n"
+            "  <sectiontype name='component%d'>\n%s\n"
+            "  </sectiontype>\n"
+            "</component>\n"
+            % (i, "\n".join(make_keys(nkeys, "    "))))
+    if params["imports"]:
+        files[os.path.join(PACKAGE, "__init__.py")] = ""
+    # types must be defined before they're used
+    for level in range(depth - 1, -1, -1):
+        L.append("  <sectiontype name='level%d'>" % level)
+        L.extend(make_keys(nkeys, "    "))
+        if level + 1 < depth:
+            L.append("    <multisection type='level%d' name='*'"
+                     " attribute='children'/>" % (level + 1))
+        L.append("  </sectiontype>")
+    L.extend(make_keys(nkeys, "  "))
+    if depth:
+        L.append("  <multisection type='level0' name='*'"
+                 " attribute='sections'/>")
+    for i in range(params["imports"]):
+        L.append("  <multisection type='component%d' name='*'"
+                 " attribute='components%d'/>" % (i, i))
+    L.append("</schema>")
+    files["schema.xml"] = "\n".join(L) + "\n"
+    return files
+
+
+def make_section(params, name, level, indent):
+    L = ["%s<level%d %s>" % (indent, level, name)]
+    L.extend(make_values(params["keys"], params["substitutions"],
+                         indent + "  "))
+    if level + 1 < params["depth"]:
+        L.extend(make_section(params, name + "-child", level + 1,
+                              indent + "  "))
+    L.append("%s</level%d>" % (indent, level))
+    return L
+
+
+def make_part(params, index, sections):
+    L = []
+    for i in sections:
+        if params["depth"]:
+            L.extend(make_section(params, "s%d" % i, 0, ""))
+    for j in range(params["imports"]):
+        L.append("<component%d c%d-%d>" % (j, j, index))
+        L.extend(make_values(params["keys"], params["substitutions"], "  "))
+        L.append("</component%d>" % j)
+    return L
+
+
+def make_config(params):
+    """Return ({name: text}, flat, plain) for the configuration.
+
+    `flat` is the configuration with the included resources inlined,
+    and `plain` is `flat` without substitutions.
+    """
+    files = {}
+    head = ["%%define value%d %s" % (i, make_value(i))
+            for i in range(params["substitutions"])]
+    head.extend(make_values(params["keys"], params["substitutions"], ""))
+    nparts = max(params["includes"], 1)
+    parts = []
+    for index in range(nparts):
+        sections = range(index, params["sections"], nparts)
+        parts.append(make_part(params, index, sections))
+    if params["includes"]:
+        L = list(head)
+        for index in range(nparts):
+            L.append("%%include part%d.conf" % index)
+            files["part%d.conf" % index] = "\n".join(parts[index]) + "\n"
+        files["main.conf"] = "\n".join(L) + "\n"
+    L = list(head)
+    for part in parts:
+        L.extend(part)
+    flat = "\n".join(L) + "\n"
+    if not params["includes"]:
+        files["main.conf"] = flat
+    plain = flat
+    if params["substitutions"]:
+        params = params.copy()
+        params["substitutions"] = 0
+        plain = make_config(params)[1]
+    return files, flat, plain
+
+
+def write_files(directory, files):
+    for name, text in files.items():
+        path = os.path.join(directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        f = open(path, "w")
+        f.write(text)
+        f.close()
+
+
+# Support for timing the matchers.
+
+class TimingMixin:
+
+    def finish(self):
+        t0 = time.time()
+        try:
+            return self.base.finish(self)
+        finally:
+            self.timer["finish"] += time.time() - t0
+
+    def constuct(self):
+        t0 = time.time()
+        try:
+            return self.base.constuct(self)
+        finally:
+            self.timer["constuct"] += time.time() - t0
+
+    def createChildMatcher(self, type, name):
+        sm = ZConfig.matcher.BaseMatcher.createChildMatcher(self, type, name)
+        matcher = TimingSectionMatcher(sm.info, sm.type, sm.name,
+                                       sm.handlers)
+        matcher.timer = self.timer
+        return matcher
+
+
+class TimingSectionMatcher(TimingMixin, ZConfig.matcher.SectionMatcher):
+    base = ZConfig.matcher.SectionMatcher
+
+
+class TimingSchemaMatcher(TimingMixin, ZConfig.matcher.SchemaMatcher):
+    base = ZConfig.matcher.SchemaMatcher
+
+
+class TimingConfigLoader(ZConfig.loader.ConfigLoader):
+
+    def __init__(self, schema, timer):
+        ZConfig.loader.ConfigLoader.__init__(self, schema)
+        self.timer = timer
+
+    def createSchemaMatcher(self):
+        matcher = TimingSchemaMatcher(self.schema)
+        matcher.timer = self.timer
+        return matcher
+
+
+# Support for timing the parser alone.
+
+class Section:
+    def addValue(self, key, value, position):
+        pass
+
+
+class Context:
+    def startSection(self, parent, type, name):
+        return parent
+
+    def endSection(self, parent, type, name, matcher):
+        pass
+
+
+def run(func, repeat):
+    times = []
+    for i in range(repeat):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return times
+
+
+def summarize(times):
+    return {"best": min(times),
+            "mean": sum(times) / len(times),
+            "times": times}
+
+
+def benchmark(directory, flat, plain, repeat):
+    results = {}
+    schema_path = os.path.join(directory, "schema.xml")
+    config_path = os.path.join(directory, "main.conf")
+
+    def load_schema():
+        ZConfig.loadSchema(schema_path)
+    results["loadSchema"] = run(load_schema, repeat)
+
+    schema = ZConfig.loadSchema(schema_path)
+    def load_config():
+        ZConfig.loadConfig(schema, config_path)
+    results["loadConfig"] = run(load_config, repeat)
+
+    def parse():
+        resource = ZConfig.loader.Resource(StringIO(flat), None)
+        ZConfig.cfgparser.ZConfigParser(resource, Context()).parse(Section())
+    results["parse"] = run(parse, repeat)
+
+    results["finish"] = []
+    results["constuct"] = []
+    for i in range(repeat):
+        timer = {"finish": 0.0, "constuct": 0.0}
+        TimingConfigLoader(schema, timer).loadURL(config_path)
+        results["finish"].append(timer["finish"])
+        results["constuct"].append(timer["constuct"])
+
+    def schemaless():
+        ZConfig.schemaless.loadConfigFile(StringIO(plain))
+    results["schemaless"] = run(schemaless, repeat)
+
+    for name, times in results.items():
+        results[name] = summarize(times)
+    return results
+
+
+def version():
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution("ZConfig").version
+    except Exception:
+        return None
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts, args = getopt.getopt(args, "d:i:k:m:n:o:r:s:")
+    params = {
+        "keys": 20,
+        "depth": 3,
+        "sections": 50,
+        "includes": 5,
+        "imports": 2,
+        "substitutions": 2,
+        }
+    names = {"-k": "keys", "-d": "depth", "-n": "sections",
+             "-i": "includes", "-m": "imports", "-s": "substitutions"}
+    repeat = 5
+    output = None
+    for opt, arg in opts:
+        if names.has_key(opt):
+            params[names[opt]] = int(arg)
+        elif opt == "-r":
+            repeat = int(arg)
+        elif opt == "-o":
+            output = arg
+    params["substitutions"] = min(params["substitutions"], params["keys"])
+    directory = tempfile.mkdtemp()
+    sys.path.insert(0, directory)
+    try:
+        write_files(directory, make_schema(params))
+        files, flat, plain = make_config(params)
+        write_files(directory, files)
+        results = benchmark(directory, flat, plain, repeat)
+    finally:
+        sys.path.remove(directory)
+        shutil.rmtree(directory)
+    report = {
+        "zconfig": version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "parameters": params,
+        "repeat": repeat,
+        "lines": flat.count("\n"),
+        "results": results,
+        }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output is None:
+        print text
+    else:
+        f = open(output, "w")
+        f.write(text + "\n")
+        f.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Compare the memory used by SectionValue and CompactSectionValue.
+
+usage:  bench_memory.py [-n sections] [-k keys]
+
+A configuration with the requested number of sections, each with the
+requested number of keys, is loaded once with each representation.
+The memory reported is the total size of all objects reachable from
+the configuration object that are not part of the schema.
+"""
+
+import getopt
+import gc
+import sys
+
+from StringIO import StringIO
+
+import ZConfig
+
+
+def make_schema(nkeys):
+    keys = "\n".join(["<key name='key%d' datatype='integer'/>" % i
+                      for i in range(nkeys)])
+    return ZConfig.loadSchemaFile(StringIO("""\
+        <schema>
+          <sectiontype name='item'>
+            %s
+          </sectiontype>
+          <multisection type='item' name='+' attribute='items'/>
+        </schema>
+        """ % keys))
+
+
+def make_config(nsections, nkeys):
+    L = []
+    for i in range(nsections):
+        L.append("<item item%d>" % i)
+        for j in range(nkeys):
+            L.append("  key%d %d" % (j, i + j))
+        L.append("</item>")
+    return "\n".join(L)
+
+
+def reachable(ob, exclude=None):
+    """Return a mapping of id() to objects reachable from `ob`."""
+    if exclude is None:
+        exclude = {}
+    seen = {}
+    stack = [ob]
+    while stack:
+        ob = stack.pop()
+        i = id(ob)
+        if seen.has_key(i) or exclude.has_key(i):
+            continue
+        if isinstance(ob, (type, type(sys), type(reachable))):
+            # classes, modules and functions are shared, not per-config
+            continue
+        seen[i] = ob
+        stack.extend(gc.get_referents(ob))
+    return seen
+
+
+def measure(schema, text, compact):
+    conf, handler = ZConfig.loadConfigFile(schema, StringIO(text),
+                                           compact=compact)
+    shared = reachable(schema)
+    total = 0
+    objects = reachable(conf, shared)
+    for ob in objects.values():
+        total += sys.getsizeof(ob)
+    return total, len(objects)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts, args = getopt.getopt(args, "n:k:")
+    nsections = 10000
+    nkeys = 10
+    for opt, arg in opts:
+        if opt == "-n":
+            nsections = int(arg)
+        elif opt == "-k":
+            nkeys = int(arg)
+    schema = make_schema(nkeys)
+    text = make_config(nsections, nkeys)
+    print "%d sections with %d keys each" % (nsections, nkeys)
+    results = {}
+    for compact in (False, True):
+        size, count = measure(schema, text, compact)
+        results[compact] = size
+        if compact:
+            name = "CompactSectionValue"
+        else:
+            name = "SectionValue"
+        print "%-20s %12d bytes %10d objects %8.1f bytes/section" % (
+            name, size, count, float(size) / nsections)
+    print "compact/default: %.2f" % (float(results[True]) / results[False])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Compare ZConfigParser with the previous line-at-a-time parser.
+
+usage:  bench_parser.py [-n lines] [-r repeat]
+
+A generated configuration is parsed using a context that discards the
+results, so only the cost of the parser itself is measured.  The
+ReadlineParser class below is the parse loop used by ZConfig 2.9.
+"""
+
+import getopt
+import sys
+import time
+
+from StringIO import StringIO
+
+import ZConfig
+import ZConfig.cfgparser
+import ZConfig.loader
+
+from ZConfig.cfgparser import _keyvalue_rx
+
+
+class Section:
+    def addValue(self, key, value, position):
+        pass
+
+
+class Context:
+    def startSection(self, parent, type, name):
+        return parent
+
+    def endSection(self, parent, type, name, matcher):
+        pass
+
+
+class ReadlineParser(ZConfig.cfgparser.ZConfigParser):
+    __slots__ = ()
+
+    def nextline(self):
+        line = self.file.readline()
+        if line:
+            self.lineno += 1
+            return False, line.strip()
+        else:
+            return True, None
+
+    def parse(self, section):
+        done, line = self.nextline()
+        while not done:
+            if line[:1] in ("", "#"):
+                # blank line or comment
+                pass
+
+            elif line[:2] == "</":
+                # section end
+                if line[-1] != ">":
+                    self.error("malformed section end")
+                section = self.end_section(section, line[2:-1])
+
+            elif line[0] == "<":
+                # section start
+                if line[-1] != ">":
+                    self.error("malformed section start")
+                section = self.start_section(section, line[1:-1])
+
+            elif line[0] == "%":
+                self.handle_directive(section, line[1:])
+
+            else:
+                self.handle_key_value(section, line)
+
+            done, line = self.nextline()
+
+        if self.stack:
+            self.error("unclosed sections not allowed")
+
+    def handle_key_value(self, section, rest):
+        m = _keyvalue_rx.match(rest)
+        if not m:
+            self.error("malformed configuration data")
+        key, value = m.group('key', 'value')
+        if not value:
+            value = ''
+        else:
+            value = self.replace(value)
+        try:
+            section.addValue(key, value, (self.lineno, None, self.url))
+        except ZConfig.ConfigurationError, e:
+            self.error(e[0])
+
+
+def make_config(nlines):
+    L = ["%define base /var/lib/app"]
+    i = 0
+    while len(L) < nlines:
+        L.append("<section s%d>" % i)
+        L.append("  # comment for section %d" % i)
+        for j in range(10):
+            L.append("  key%d value-%d-%d" % (j, i, j))
+        L.append("  path $base/s%d" % i)
+        L.append("")
+        L.append("</section>")
+        i += 1
+    return "\n".join(L) + "\n"
+
+
+def run(parser_class, text, repeat):
+    best = None
+    for i in range(repeat):
+        resource = ZConfig.loader.Resource(StringIO(text), None)
+        parser = parser_class(resource, Context())
+        t0 = time.time()
+        parser.parse(Section())
+        t = time.time() - t0
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts, args = getopt.getopt(args, "n:r:")
+    nlines = 200000
+    repeat = 5
+    for opt, arg in opts:
+        if opt == "-n":
+            nlines = int(arg)
+        elif opt == "-r":
+            repeat = int(arg)
+    text = make_config(nlines)
+    print "%d lines, %d bytes; best of %d" % (
+        text.count("\n"), len(text), repeat)
+    old = run(ReadlineParser, text, repeat)
+    new = run(ZConfig.cfgparser.ZConfigParser, text, repeat)
+    print "%-16s %8.3f sec" % ("readline loop", old)
+    print "%-16s %8.3f sec" % ("ZConfigParser", new)
+    print "speedup: %.2fx" % (old / new)
+
+
+if __name__ == "__main__":
+    main()